@@ -0,0 +1,83 @@
+"""Compara la memoria reservada por frame entre el camino antiguo y el actual.
+
+Camino antiguo: cap.read() reserva un frame nuevo, se copia para latest_frame
+y se serializa con tobytes() antes de escribirlo al pipe de ffmpeg.
+
+Camino actual: la fuente lee sobre un slot del buffer circular, la grabación
+copia a un buffer reutilizable de la cola y se escribe al pipe por el
+protocolo buffer; las fotos fijan el frame sin copiarlo.
+
+Uso:
+    python benchmarks/bench_frame_alloc.py --frames 300 --width 1280 --height 720
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.frame_buffer import FrameRingBuffer
+from services.frame_source import SyntheticFrameSource
+from services.record_queue import RecordQueue
+
+
+def measure(step, frames):
+    """Ejecuta step() por frame y devuelve (bytes reservados de media por frame, ms por frame)"""
+    step()  # calentamiento: reservas iniciales de pools y buffers
+    tracemalloc.start()
+    reserved = 0
+    start = time.perf_counter()
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        step()
+        _, peak = tracemalloc.get_traced_memory()
+        reserved += peak - base
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return reserved / frames, elapsed * 1000 / frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    args = parser.parse_args()
+
+    source = SyntheticFrameSource(args.width, args.height, fps=0).open()
+    sink = open(os.devnull, 'wb')
+
+    state = {}
+
+    def old_path():
+        ret, frame = source.read()
+        state['latest_frame'] = frame.copy()
+        sink.write(frame.tobytes())
+
+    frame_buffer = FrameRingBuffer(args.width, args.height)
+    record_queue = RecordQueue(args.width, args.height, capacity=4)
+    record_queue.start()
+
+    def new_path():
+        ret, frame = source.read(frame_buffer.begin_write())
+        frame_buffer.commit(frame)
+        record_queue.put(frame_buffer.latest().frame, 0)
+        index, pending, _ = record_queue.get()
+        sink.write(pending.data)
+        record_queue.release(index)
+        with frame_buffer.pin_latest() as frame_ref:
+            frame_ref.frame.sum(dtype='uint64')
+
+    frame_size = args.width * args.height * 3
+    print(f"Frame {args.width}x{args.height} BGR = {frame_size / 1e6:.2f} MB")
+    for name, step in (("antiguo", old_path), ("actual", new_path)):
+        reserved, ms = measure(step, args.frames)
+        print(f"{name:>8}: {reserved / 1e6:6.2f} MB reservados por frame "
+              f"({reserved / frame_size:.2f} frames), {ms:.2f} ms/frame")
+
+
+if __name__ == '__main__':
+    main()
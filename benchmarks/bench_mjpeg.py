@@ -0,0 +1,110 @@
+"""Compara el CPU por frame de la captura MJPEG sin decodificar con el camino BGR.
+
+Camino BGR (el de siempre): cada JPEG de la capturadora se decodifica a BGR
+al leerlo, el stream lo vuelve a codificar a JPEG y la puntuación de nitidez
+trabaja sobre el frame BGR.
+
+Camino MJPEG: el JPEG se guarda tal cual en el buffer, el nivel high lo
+reenvía sin tocarlo y la puntuación decodifica a 1/4 en gris. Con --record
+se decodifica además cada frame completo, como cuando se está grabando.
+
+Los frames se cargan en memoria antes de medir, así que no cuenta la lectura
+del archivo. La muestra se graba de la capturadora con:
+    ffmpeg -f v4l2 -input_format mjpeg -video_size 640x480 -i /dev/video0 -c copy -t 10 muestra.mjpeg
+
+Uso:
+    python benchmarks/bench_mjpeg.py --sample muestra.mjpeg --frames 300
+    python benchmarks/bench_mjpeg.py            # muestra sintética
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.frame_broadcaster import FrameBroadcaster
+from services.frame_buffer import FrameRingBuffer
+from services.frame_scorer import score_frame, score_jpeg
+from services.frame_source import SyntheticFrameSource
+from services.mjpeg import iter_jpeg_frames
+
+
+def write_synthetic_sample(path, frames, quality=85):
+    source = SyntheticFrameSource(fps=0).open()
+    with open(path, 'wb') as f:
+        for _ in range(frames):
+            _, frame = source.read()
+            _, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            f.write(data.tobytes())
+
+
+def measure(step, samples, frames):
+    """Ejecuta step(jpeg) para frames frames y devuelve (ms de CPU por frame, ms reales por frame)"""
+    for data in samples[:5]:
+        step(data)  # calentamiento
+    cpu, wall = time.process_time(), time.perf_counter()
+    for i in range(frames):
+        step(samples[i % len(samples)])
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return cpu / frames * 1000, wall / frames * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sample', nargs='*', default=[], help='archivos MJPEG grabados de la capturadora')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--record', action='store_true', help="decodifica también cada frame (grabación activa)")
+    args = parser.parse_args()
+    # Un solo hilo de OpenCV: se mide el coste por frame, no el paralelismo
+    cv2.setNumThreads(1)
+
+    paths = list(args.sample)
+    if not paths:
+        paths = [os.path.join(tempfile.mkdtemp(), 'sintetico.mjpeg')]
+        write_synthetic_sample(paths[0], 120)
+
+    for path in paths:
+        samples = list(iter_jpeg_frames(path))
+        if not samples:
+            print(f"{path}: sin frames JPEG")
+            continue
+        height, width = cv2.imdecode(np.frombuffer(samples[0], np.uint8), cv2.IMREAD_COLOR).shape[:2]
+        print(f"{os.path.basename(path)}: {len(samples)} frames {width}x{height}, "
+              f"{sum(map(len, samples)) // len(samples) // 1024} KB de media")
+
+        results = {}
+        for mode in ('bgr', 'mjpeg'):
+            frame_buffer = FrameRingBuffer(width, height)
+            broadcaster = FrameBroadcaster(frame_buffer)
+            # Un cliente en el nivel high sin calidad explícita (el caso habitual del visor)
+            broadcaster._join('high', None)
+
+            if mode == 'bgr':
+                def step(data):
+                    frame_buffer.write(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR))
+                    slot = frame_buffer.latest()
+                    broadcaster.publish(slot.frame, slot)
+                    score_frame(slot.frame)
+            else:
+                def step(data):
+                    frame_buffer.write_jpeg(data)
+                    slot = frame_buffer.latest(decode=args.record)
+                    broadcaster.publish(slot.frame, slot)
+                    score_jpeg(slot.jpeg)
+
+            results[mode] = measure(step, samples, args.frames)
+
+        for mode, label in (('bgr', 'decodificar + recodificar'), ('mjpeg', 'MJPEG sin decodificar')):
+            cpu_ms, wall_ms = results[mode]
+            print(f"  {label:<26} {cpu_ms:6.2f} ms CPU/frame  ({wall_ms:6.2f} ms reales)")
+        print(f"  ahorro de CPU: {100 * (1 - results['mjpeg'][0] / results['bgr'][0]):.0f}%"
+              + (" (con grabación activa)" if args.record else ""))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Mide el rendimiento del pipeline de video sin capturadora.
+
+Uso:
+    python benchmarks/bench_pipeline.py --source synthetic --seconds 10
+    python benchmarks/bench_pipeline.py --source file:/ruta/procedimiento.mp4 --clients 3
+
+Con --fps 0 la fuente entrega frames tan rápido como puede y se mide el
+máximo del pipeline (captura -> buffer -> stream/grabación/foto).
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.frame_broadcaster import FrameBroadcaster
+from services.frame_buffer import FrameRingBuffer
+from services.frame_source import create_frame_source
+from services.record_queue import RecordQueue
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source', default='synthetic')
+    parser.add_argument('--fps', type=float, default=0)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--clients', type=int, default=2)
+    parser.add_argument('--record', action='store_true', help="simula una grabación activa")
+    args = parser.parse_args()
+
+    source = create_frame_source(args.source, fps=args.fps).open()
+    frame_buffer = FrameRingBuffer(640, 480)
+    broadcaster = FrameBroadcaster(frame_buffer)
+    broadcaster.start()
+    record_queue = RecordQueue(640, 480)
+    stop = threading.Event()
+    counters = {"captured": 0, "recorded": 0, "snapshots": 0}
+    streamed = [0] * args.clients
+
+    def client(i):
+        for _ in broadcaster.subscribe(timeout=0.5):
+            streamed[i] += 1
+            if stop.is_set():
+                return
+
+    sink = open(os.devnull, 'wb')
+
+    def recorder():
+        while record_queue.active or record_queue.pending():
+            item = record_queue.get(timeout=0.5)
+            if item is not None:
+                index, frame, _ = item
+                sink.write(frame.data)
+                record_queue.release(index)
+                counters["recorded"] += 1
+
+    def snapshots():
+        while not stop.is_set():
+            frame_ref = frame_buffer.pin_latest()
+            if frame_ref is not None:
+                with frame_ref:
+                    cv2.imencode('.jpg', frame_ref.frame)
+                counters["snapshots"] += 1
+            time.sleep(0.5)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(args.clients)]
+    threads.append(threading.Thread(target=snapshots, daemon=True))
+    if args.record:
+        record_queue.start()
+        threads.append(threading.Thread(target=recorder, daemon=True))
+    for t in threads:
+        t.start()
+
+    start = time.monotonic()
+    while time.monotonic() - start < args.seconds:
+        ret, frame = source.read(frame_buffer.begin_write())
+        if not ret:
+            continue
+        timestamp = time.monotonic()
+        frame_buffer.commit(frame, timestamp)
+        record_queue.put(frame_buffer.latest().frame, timestamp)
+        counters["captured"] += 1
+    elapsed = time.monotonic() - start
+
+    stop.set()
+    record_queue.stop()
+    broadcaster.close()
+    source.release()
+
+    print(f"Fuente: {source}")
+    print(f"Captura: {counters['captured'] / elapsed:.1f} fps")
+    for i, count in enumerate(streamed):
+        print(f"Cliente {i}: {count / elapsed:.1f} fps")
+    if args.record:
+        stats = record_queue.stats()
+        print(f"Grabación: {counters['recorded'] / elapsed:.1f} fps, "
+              f"{stats['dropped']} descartados, máximo en cola {stats['high_water']}")
+    print(f"Fotos: {counters['snapshots']}")
+
+
+if __name__ == '__main__':
+    main()
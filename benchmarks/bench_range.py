@@ -0,0 +1,88 @@
+"""Compara servir un rango de un video cifrado con el camino antiguo y el actual.
+
+Camino antiguo: se descifra el .enc Fernet completo a un temporal y se lee
+de ahí el rango (lo que pasaba en cada salto del reproductor).
+
+Camino actual: contenedor por bloques, solo se descifran los bloques que
+cubren el rango pedido.
+
+Uso:
+    python benchmarks/bench_range.py --size-mb 200 --range-kb 1024 --seeks 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.crypto_container import ChunkedCipher
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=int, default=100)
+    parser.add_argument('--range-kb', type=int, default=1024)
+    parser.add_argument('--seeks', type=int, default=10)
+    args = parser.parse_args()
+
+    key = os.getenv("SECRET_KEY") or Fernet.generate_key().decode()
+    fernet = Fernet(key.encode())
+    cipher = ChunkedCipher(key)
+    size = args.size_mb * 1024 * 1024
+    length = args.range_kb * 1024
+    data = os.urandom(size)
+
+    workdir = tempfile.mkdtemp()
+    legacy_path = os.path.join(workdir, 'legacy.mp4.enc')
+    chunked_path = os.path.join(workdir, 'chunked.mp4.enc')
+    with open(legacy_path, 'wb') as f:
+        f.write(fernet.encrypt(data))
+    with open(chunked_path, 'wb') as f:
+        cipher.encrypt_bytes(data, f)
+    print(f"Tamaño en disco: Fernet {os.path.getsize(legacy_path) / 1e6:.1f} MB, "
+          f"por bloques {os.path.getsize(chunked_path) / 1e6:.1f} MB (original {size / 1e6:.1f} MB)")
+    del data
+
+    offsets = [random.randrange(0, size - length) for _ in range(args.seeks)]
+
+    def legacy_range(offset):
+        with open(legacy_path, 'rb') as f:
+            plain = fernet.decrypt(f.read())
+        temp_path = os.path.join(workdir, 'temp')
+        with open(temp_path, 'wb') as f:
+            f.write(plain)
+        with open(temp_path, 'rb') as f:
+            f.seek(offset)
+            result = f.read(length)
+        os.remove(temp_path)
+        return result
+
+    def chunked_range(offset):
+        return cipher.open_reader(chunked_path).read_range(offset, length)
+
+    for name, fn in (("Fernet + temporal", legacy_range), ("por bloques", chunked_range)):
+        start = time.perf_counter()
+        for offset in offsets:
+            fn(offset)
+        elapsed = (time.perf_counter() - start) / len(offsets)
+        print(f"{name:>18}: {elapsed * 1000:8.1f} ms por salto "
+              f"({length / elapsed / 1e6:8.1f} MB/s útiles)")
+
+    start = time.perf_counter()
+    for _ in cipher.open_reader(chunked_path).iter_range():
+        pass
+    elapsed = time.perf_counter() - start
+    print(f"Descifrado completo por bloques: {size / elapsed / 1e6:.1f} MB/s")
+
+    for path in (legacy_path, chunked_path):
+        os.remove(path)
+    os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Mide el rendimiento de la transcripción por lotes (segundos de audio por segundo real).
+
+Copia los WAV indicados (o genera audio sintético) a una carpeta temporal con
+estructura de sesiones y los transcribe con el pool de procesos usando el
+modelo incluido, para cada número de procesos pedido.
+
+Uso:
+    python benchmarks/bench_transcription.py --wav PROCEDURES/*/audio_*.wav --workers 1,2,4
+    python benchmarks/bench_transcription.py --synthetic 8 --seconds 60
+"""
+import argparse
+import math
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from services.transcription_jobs import TranscriptionJobs
+
+MODEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vosk-model-small-es-0.42"))
+
+
+def write_synthetic_wav(path, seconds, rate=16000):
+    # Tonos que cambian de frecuencia: el reconocedor tiene que decodificarlos igual que voz
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        frames = bytearray()
+        for i in range(int(seconds * rate)):
+            freq = 200 + 150 * math.sin(i / rate * 1.3)
+            frames += struct.pack('<h', int(8000 * math.sin(2 * math.pi * freq * i / rate)))
+        wf.writeframes(bytes(frames))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--wav', nargs='*', default=[])
+    parser.add_argument('--synthetic', type=int, default=4, help='archivos sintéticos si no se pasan WAV')
+    parser.add_argument('--seconds', type=float, default=30, help='duración de cada archivo sintético')
+    parser.add_argument('--workers', default=f"1,{os.cpu_count() or 1}")
+    args = parser.parse_args()
+
+    source_dir = tempfile.mkdtemp()
+    sources = list(args.wav)
+    if not sources:
+        for i in range(args.synthetic):
+            path = os.path.join(source_dir, f"audio_sintetico-{i:03d}.wav")
+            write_synthetic_wav(path, args.seconds)
+            sources.append(path)
+
+    for workers in sorted({int(w) for w in args.workers.split(',')}):
+        base = tempfile.mkdtemp()
+        session = os.path.join(base, "bench_20260101-000000")
+        os.makedirs(session)
+        paths = []
+        for i, source in enumerate(sources):
+            path = os.path.join(session, f"audio_{i:03d}.wav")
+            shutil.copyfile(source, path)
+            paths.append(path)
+
+        jobs = TranscriptionJobs(base, MODEL_PATH, workers=workers)
+        start = time.perf_counter()
+        jobs.submit(paths)
+        while True:
+            stats = jobs.stats()
+            if stats["counts"]["queued"] + stats["counts"]["running"] == 0:
+                break
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - start
+
+        # Incluye el arranque de los procesos y la carga del modelo en cada uno
+        print(f"{workers:>2} procesos: {stats['audio_seconds']:.0f}s de audio en {elapsed:.1f}s -> "
+              f"{stats['audio_seconds'] / elapsed:.2f} s audio/s (sin arranque "
+              f"{stats['audio_seconds_per_wall_second']}, por proceso {stats['realtime_factor_per_worker']}x), "
+              f"fallidos {stats['counts']['failed']}")
+        jobs.shutdown()
+        shutil.rmtree(base)
+
+    shutil.rmtree(source_dir)
+
+
+if __name__ == '__main__':
+    main()
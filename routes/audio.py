@@ -1,10 +1,10 @@
 import os
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def create_audio_blueprint(handler):
+def create_audio_blueprint(handler, jobs=None):
     audio = Blueprint('audio', __name__)
 
     @audio.route('/start', methods=['POST'])
@@ -35,6 +35,19 @@ def create_audio_blueprint(handler):
             handler.stop_audio_recording()
             print("✅ Grabación de audio detenida correctamente", flush=True)
 
+            # Con la transcripción en vivo solo falta el último fragmento
+            live = handler.finish_live_transcription()
+            if live is not None:
+                text, transcript_path, complete = live
+                print("✅ Transcripción en vivo cerrada", flush=True)
+                return jsonify({
+                    "message": "Grabación detenida y transcripción exitosa",
+                    "status": "success",
+                    "transcripcion": text,
+                    "transcription_file": os.path.basename(transcript_path),
+                    "completa": complete
+                })
+
             print("🧠 Transcribiendo audio...", flush=True)
             text = handler.transcribe_audio()
             print("✅ Transcripción completa obtenida", flush=True)
@@ -66,4 +79,46 @@ def create_audio_blueprint(handler):
             return jsonify({"error": str(e), "status": "error"}), 500
 
 
+    @audio.route('/jobs', methods=['POST'])
+    def create_jobs():
+        # {"archivos": ["carpeta/audio_x.wav", ...]}, {"carpeta": "x"} o {"pendientes": true}
+        if jobs is None:
+            return jsonify({"error": "Transcripción por lotes no disponible", "status": "error"}), 503
+        data = request.get_json(silent=True) or {}
+        base = os.path.realpath(jobs.base_folder)
+
+        if data.get('pendientes'):
+            paths = jobs.find_untranscribed()
+        elif data.get('carpeta'):
+            folder_path = os.path.realpath(os.path.join(base, data['carpeta']))
+            if not folder_path.startswith(base + os.sep) or not os.path.isdir(folder_path):
+                return jsonify({"error": "Carpeta no encontrada", "status": "error"}), 404
+            paths = [p for p in jobs.find_untranscribed() if os.path.dirname(p) == folder_path]
+        else:
+            paths = []
+            for name in data.get('archivos', []):
+                path = os.path.realpath(os.path.join(base, name))
+                if not path.startswith(base + os.sep) or not os.path.isfile(path):
+                    return jsonify({"error": f"No existe {name}", "status": "error"}), 404
+                paths.append(path)
+
+        if not paths:
+            return jsonify({"message": "No hay audios que transcribir", "jobs": []}), 200
+        job_ids = jobs.submit(paths)
+        return jsonify({"message": f"{len(job_ids)} transcripciones en cola", "jobs": job_ids}), 202
+
+    @audio.route('/jobs', methods=['GET'])
+    def list_jobs():
+        if jobs is None:
+            return jsonify({"error": "Transcripción por lotes no disponible", "status": "error"}), 503
+        return jsonify({"jobs": jobs.list(request.args.get('limit', 100, type=int)), "stats": jobs.stats()})
+
+    @audio.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        job = jobs.get(job_id) if jobs is not None else None
+        if job is None:
+            return jsonify({"error": "Trabajo no encontrado", "status": "error"}), 404
+        return jsonify(job)
+
+
     return audio
@@ -1,13 +1,20 @@
-from flask import Blueprint, render_template, send_file, abort, jsonify, request, send_from_directory
+from flask import Blueprint, render_template, send_file, abort, jsonify, request, send_from_directory, Response
 import os
 import locale
 from datetime import datetime
 from dotenv import load_dotenv
 import io
 import tempfile
-from xhtml2pdf import pisa
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import ClosingIterator
+from services import readiness
+from services.archive_export import iter_tar, iter_zip, session_entries, tar_size
+from services.catalog import ProcedureCatalog, mark_dirty
 from services.media_handler import MediaHandler
+from services.latest_capture import latest_capture
+from services.media_cache import media_cache
+from services.report_renderer import DONE, FAILED, ReportRenderer
+from services.thumbnailer import thumbnail_path
 from babel.dates import format_date
 
 # Cargar variables de entorno
@@ -20,6 +27,9 @@ IMAGE_BASE_FOLDER = os.path.join(os.getcwd(), 'PROCEDURES')
 
 media_handler = MediaHandler(IMAGE_BASE_FOLDER, is_for_image=True)
 
+# Miniaturas de las carpetas que ya existían antes de guardarse al capturar
+readiness.run_stage('thumbnails', lambda: media_handler.thumbnailer.backfill(IMAGE_BASE_FOLDER), required=False)
+
 def traducir_fecha(fecha_numerica):
     try:
         partes = fecha_numerica.split('-')
@@ -38,49 +48,119 @@ def traducir_fecha(fecha_numerica):
         return fecha_numerica
 
 
+# Índice persistente de sesiones: evita recorrer PROCEDURES en cada listado
+catalog = ProcedureCatalog(IMAGE_BASE_FOLDER, formatter=traducir_fecha)
+# El primer índice de un archivo grande se construye en segundo plano
+readiness.run_stage('catalog', lambda: catalog.refresh(force=True), required=False)
+
+# Reportes PDF en un pool de procesos (REPORT_WORKERS); /generar_pdf espera como mucho REPORT_WAIT_SECONDS
+report_renderer = ReportRenderer(IMAGE_BASE_FOLDER, workers=int(os.getenv("REPORT_WORKERS", "2")))
+REPORT_WAIT_SECONDS = float(os.getenv("REPORT_WAIT_SECONDS", "10"))
+
+
+def list_sessions_from_request():
+    """Consulta el catálogo con los filtros de la petición (page, per_page, desde, hasta, usuario)"""
+    page = request.args.get('page', type=int)
+    per_page = min(max(request.args.get('per_page', 50, type=int) or 50, 1), 500)
+    sessions, total = catalog.list_sessions(
+        page=page,
+        per_page=per_page,
+        desde=request.args.get('desde'),
+        hasta=request.args.get('hasta'),
+        usuario=request.args.get('usuario'),
+    )
+    return sessions, total, page, per_page
+
+
+def paginated(response, total, page, per_page):
+    """Añade las cabeceras de paginación sin cambiar el formato de la respuesta"""
+    response.headers['X-Total-Count'] = str(total)
+    if page is not None:
+        response.headers['X-Page'] = str(page)
+        response.headers['X-Per-Page'] = str(per_page)
+    response.headers['Access-Control-Expose-Headers'] = 'X-Total-Count, X-Page, X-Per-Page'
+    return response
+
+
+def send_decrypted(reader, mimetype):
+    """Responde con el contenido descifrado, atendiendo cabeceras Range (206 Partial Content).
+
+    Solo se descifran los bloques que cubren el rango pedido, así que saltar a
+    cualquier punto de un video largo no obliga a descifrarlo entero.
+    """
+    size = reader.size
+    start, end, status = 0, size, 200
+
+    byte_range = request.range
+    if byte_range is not None and len(byte_range.ranges) == 1:
+        requested = byte_range.range_for_length(size)
+        if requested is None:
+            if hasattr(reader, 'release'):
+                # No se envía nada: el contenido de la caché se libera ya
+                reader.release()
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            return response
+        start, end = requested
+        status = 206
+
+    body = reader.iter_range(start, end)
+    if hasattr(reader, 'release'):
+        # Contenido de la caché: se libera cuando termina de enviarse. Con
+        # direct_passthrough el servidor cierra el iterable y no la respuesta,
+        # así que call_on_close no llegaría a ejecutarse
+        body = ClosingIterator(body, reader.release)
+    response = Response(body, status=status, mimetype=mimetype, direct_passthrough=True)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Length'] = str(end - start)
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{end - 1}/{size}'
+    return response
+
+
 @gallery.route('/gallery')
 def gallery_menu():
-    # Listar todas las carpetas dentro de "images/"
-    folders = [f for f in os.listdir(IMAGE_BASE_FOLDER) if os.path.isdir(os.path.join(IMAGE_BASE_FOLDER, f))]
-    
-    if not folders:
+    # Carpetas del catálogo, de la más reciente a la más antigua
+    sessions, total, page, per_page = list_sessions_from_request()
+
+    if not sessions:
         return "No hay imágenes disponibles.", 404
 
-    # Convertir los nombres de carpeta a fechas legibles
-    translated_folders = [(folder, traducir_fecha(folder)) for folder in sorted(folders, reverse=True)]
-    
-    return render_template('gallery_menu.html', folders=translated_folders)
+    translated_folders = [(s['folder'], s['fecha_legible']) for s in sessions]
+
+    return render_template('gallery_menu.html', folders=translated_folders, total=total,
+                           page=page, per_page=per_page)
 
 
 @gallery.route('/galleryMedApp')
 def get_gallery():
     try:
-        folders = [f for f in os.listdir(IMAGE_BASE_FOLDER) 
-                  if os.path.isdir(os.path.join(IMAGE_BASE_FOLDER, f))]
-        
-        if not folders:
+        sessions, total, page, per_page = list_sessions_from_request()
+
+        if not sessions:
             return jsonify({"error": "No hay imágenes disponibles"}), 404
-        
+
         translated_folders = [{
-            "folder": folder,
-            "fecha_legible": traducir_fecha(folder)
-        } for folder in sorted(folders, reverse=True)]
-        
-        return jsonify(translated_folders)
+            "folder": s['folder'],
+            "fecha_legible": s['fecha_legible']
+        } for s in sessions]
+
+        return paginated(jsonify(translated_folders), total, page, per_page)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @gallery.route('/gallery/<folder>')
 def gallery_view(folder):
     # Asegurarse de que la carpeta existe
-    folder_path = os.path.join(IMAGE_BASE_FOLDER, folder)
-    if not os.path.exists(folder_path):
+    if not catalog.session_exists(folder):
         return f"La carpeta {folder} no existe.", 404
 
     # Listar imágenes (ahora sin .enc)
-    image_files = [img for img in os.listdir(folder_path) if img.endswith('.jpg')]
+    files = catalog.list_media(folder)
+    image_files = [f['name'].replace('.enc', '') for f in files if f['kind'] == 'image']
+    pdf_files = [f['name'].replace('.enc', '') for f in files if f['kind'] == 'pdf']
 
-    # Crear rutas dinámicas para visualizar
+    # Crear rutas dinámicas para visualizar (la cuadrícula solo carga miniaturas)
     image_paths = [f"/procedures/{folder}/{img}" for img in image_files]
     pdf_paths = [f"/procedures/{folder}/{pdf}" for pdf in pdf_files]
 
@@ -92,7 +172,8 @@ def serve_media(folder, filename):
     """Devuelve el archivo multimedia (jpg o mp4) directamente"""
     encrypted_filename = filename if filename.endswith('.enc') else filename + '.enc'
 
-    if filename.endswith('.pdf'):
+    if filename.endswith('.pdf') and not os.path.exists(os.path.join(IMAGE_BASE_FOLDER, folder, encrypted_filename)):
+        # Reportes generados antes de cifrarse
         encrypted_filename = filename
     file_path = os.path.join(IMAGE_BASE_FOLDER, folder, encrypted_filename)
 
@@ -102,31 +183,25 @@ def serve_media(folder, filename):
         abort(404, description="Archivo no encontrado")
 
     # Determinar el tipo MIME según la extensión
-    if filename.lower().endswith('.jpg'):
+    media_name = filename[:-len('.enc')] if filename.endswith('.enc') else filename
+    if media_name.lower().endswith('.jpg'):
         mimetype = 'image/jpeg'
-    elif filename.lower().endswith('.mp4'):
+    elif media_name.lower().endswith('.mp4'):
         mimetype = 'video/mp4'
-    elif filename.lower().endswith('.pdf'):
+    elif media_name.lower().endswith('.pdf'):
         mimetype = 'application/pdf'
     else:
         mimetype = 'application/octet-stream'
 
     if filename.endswith('.enc') or encrypted_filename.endswith('.enc'):
         try:
-            # Crear archivo temporal
-            temp_file = media_handler.decrypt_file(file_path)
-            
-            # Configurar respuesta para eliminar el temporal después
-            response = send_file(temp_file, mimetype=mimetype)
-            
-            @response.call_on_close
-            def remove_temp_file():
-                try:
-                    os.remove(temp_file)
-                except Exception as e:
-                    print(f"Error al eliminar archivo temporal {temp_file}: {e}")
-            
-            return response
+            if media_cache.fits(file_path):
+                # Fotos y PDFs: desde la caché en memoria, sin descifrar si ya está caliente
+                reader = media_handler.open_cached(file_path)
+            else:
+                # Videos: en streaming, solo el rango pedido, sin archivo temporal
+                reader = media_handler.open_encrypted(file_path)
+            return send_decrypted(reader, mimetype)
         except Exception as e:
             print(f"Error al desencriptar {file_path}: {e}")
             abort(500, description="Error al procesar el archivo")
@@ -138,95 +213,176 @@ def serve_media(folder, filename):
             return send_file(file_path, mimetype=mimetype)
         return send_file(file_path, mimetype=mimetype)
 
+@gallery.route('/export/<folder>')
+def export_session(folder):
+    """Descarga la sesión completa (?format=zip|tar), descifrada al vuelo"""
+    export_format = request.args.get('format', 'zip')
+    if export_format not in ('zip', 'tar'):
+        return jsonify({"error": "Formato no soportado, usa zip o tar"}), 400
+    if not catalog.session_exists(folder):
+        return jsonify({"error": f"La carpeta {folder} no existe."}), 404
+
+    folder_path = os.path.join(IMAGE_BASE_FOLDER, folder)
+    try:
+        entries = session_entries(media_handler, folder_path, [f['name'] for f in catalog.list_media(folder)])
+        size = tar_size(entries) if export_format == 'tar' else None
+    except Exception as e:
+        print(f"Error al preparar la exportación de {folder}: {e}")
+        return jsonify({"error": "Error al leer los archivos de la sesión"}), 500
+
+    if export_format == 'tar':
+        response = Response(iter_tar(entries), mimetype='application/x-tar', direct_passthrough=True)
+        # Con algún .enc antiguo (Fernet) el tamaño no se sabe sin descifrar: se manda sin Content-Length
+        if size is not None:
+            response.headers['Content-Length'] = str(size)
+    else:
+        response = Response(iter_zip(entries), mimetype='application/zip', direct_passthrough=True)
+    response.headers['Content-Disposition'] = f'attachment; filename="{folder}.{export_format}"'
+    return response
+
+
+@gallery.route('/thumbs/<folder>/<filename>')
+def serve_thumbnail(folder, filename):
+    """Devuelve la miniatura de una foto o el póster de un video (foto_x.jpg, video_x.mp4)"""
+    if '..' in folder or '..' in filename:
+        abort(400, description="Ruta no permitida")
+
+    encrypted_filename = filename if filename.endswith('.enc') else filename + '.enc'
+    media_path = os.path.join(IMAGE_BASE_FOLDER, folder, encrypted_filename)
+    if not os.path.exists(media_path):
+        abort(404, description="Archivo no encontrado")
+
+    thumb_path = thumbnail_path(media_path)
+    if not os.path.exists(thumb_path):
+        # Todavía no generada (en cola o archivo antiguo): se espera a que esté
+        try:
+            media_handler.thumbnailer.submit(media_path).result(timeout=15)
+        except Exception as e:
+            print(f"Error al generar miniatura de {media_path}: {e}")
+        if not os.path.exists(thumb_path):
+            abort(404, description="Miniatura no disponible")
+
+    stat = os.stat(thumb_path)
+    etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = send_decrypted(media_handler.open_cached(thumb_path), 'image/jpeg')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
 @gallery.route('/folders', methods=['GET'])
 def get_folders():
     try:
-        # Listar todas las carpetas dentro de "PROCEDURES/"
-        folders = [f for f in os.listdir(IMAGE_BASE_FOLDER) 
-                  if os.path.isdir(os.path.join(IMAGE_BASE_FOLDER, f))]
-        
-        if not folders:
-            return jsonify([])
-        
-        # Convertir los nombres de carpeta a fechas legibles
+        # Carpetas de PROCEDURES desde el catálogo (paginable y filtrable)
+        sessions, total, page, per_page = list_sessions_from_request()
+
         translated_folders = [{
-            "folder": folder,
-            "fecha_legible": traducir_fecha(folder)
-        } for folder in sorted(folders, reverse=True)]
-        
-        return jsonify(translated_folders)
-    
+            "folder": s['folder'],
+            "fecha_legible": s['fecha_legible']
+        } for s in sessions]
+
+        return paginated(jsonify(translated_folders), total, page, per_page)
+
     except Exception as e:
         print(f"Error al listar carpetas: {e}")
         return jsonify({"error": str(e)}), 500
 
 @gallery.route('/api/<folder>', methods=['GET'])
 def get_images_json(folder):
-    folder_path = os.path.join(IMAGE_BASE_FOLDER, folder)
-
-    if not os.path.exists(folder_path):
+    if not catalog.session_exists(folder):
         return jsonify({"error": f"La carpeta {folder} no existe."}), 404
 
     # Filtra las imágenes y videos encriptados (mostrar nombres sin .enc)
-    image_files = [img.replace('.enc', '') for img in os.listdir(folder_path) if img.endswith('.jpg.enc')]
-    video_files = [vid.replace('.enc', '') for vid in os.listdir(folder_path) if vid.endswith('.mp4.enc')]
-    pdf_files = [pdf for pdf in os.listdir(folder_path) if pdf.endswith('.pdf')]
+    files = catalog.list_media(folder)
+    image_files = [f['name'].replace('.enc', '') for f in files if f['kind'] == 'image']
+    video_files = [f['name'].replace('.enc', '') for f in files if f['kind'] == 'video']
+    pdf_files = [f['name'].replace('.enc', '') for f in files if f['kind'] == 'pdf']
+
+    # Miniaturas para la cuadrícula (pósters en el caso de los videos)
+    thumbnails = {name: f"/gallery/thumbs/{folder}/{name}" for name in image_files + video_files}
 
     return jsonify({
         "folder": folder,
         "images": image_files,
         "videos": video_files,
-        "pdfs": pdf_files
+        "pdfs": pdf_files,
+        "thumbnails": thumbnails,
+        "export": {fmt: f"/gallery/export/{folder}?format={fmt}" for fmt in ('zip', 'tar')}
     })
     
+def capture_headers(response, folder=None, filename=None):
+    if folder is not None:
+        response.headers['X-Folder-Name'] = folder
+        response.headers['X-File-Name'] = filename
+    response.headers['Access-Control-Expose-Headers'] = 'X-Folder-Name, X-File-Name, X-Capture-Seq, ETag'
+    response.headers['Content-Security-Policy'] = "default-src 'self'"
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
 @gallery.route('/take-photo', methods=['GET']) 
 def take_last_photo():
-    try:
-        # Obtener la carpeta más reciente por fecha
-        folders = sorted([
-            f for f in os.listdir(IMAGE_BASE_FOLDER)
-            if os.path.isdir(os.path.join(IMAGE_BASE_FOLDER, f))
-        ], reverse=True)
+    """Última foto capturada.
 
-        if not folders:
+    ?since=<seq> o If-None-Match: <etag> devuelven solo una foto más nueva
+    (304 si no la hay); con ?wait=<segundos> la petición espera a que llegue
+    una (long-poll) en lugar de que el cliente sondee.
+    """
+    try:
+        since = request.args.get('since', type=int)
+        if since is None:
+            etags = list(request.if_none_match)
+            since = max((latest_capture.find(etag) for etag in etags), default=0)
+        wait = min(max(request.args.get('wait', 0, type=float) or 0, 0), 30)
+
+        capture = latest_capture.latest()
+        if since or wait:
+            capture = latest_capture.wait_newer(since, timeout=wait)
+            if capture is None:
+                response = Response(status=304)
+                current = latest_capture.latest()
+                if current is not None:
+                    response.set_etag(current.etag)
+                    response.headers['X-Capture-Seq'] = str(current.seq)
+                return capture_headers(response)
+
+        sessions, _ = catalog.list_sessions(page=1, per_page=1)
+
+        if not sessions:
             return jsonify({"error": "No hay carpetas disponibles"}), 404
 
-        latest_folder = folders[0]
+        latest_folder = sessions[0]['folder']
+
+        # Solo si es de la sesión más reciente: nunca la foto del paciente anterior
+        if capture is not None and capture.folder == latest_folder:
+            # Publicada en memoria por el hilo de captura: sin disco ni descifrado
+            response = Response(capture.data, mimetype='image/jpeg')
+            response.set_etag(capture.etag)
+            response.headers['X-Capture-Seq'] = str(capture.seq)
+            response.headers['Cache-Control'] = 'no-cache'
+            return capture_headers(response, capture.folder, capture.filename)
+
+        # Sin capturas de esta sesión desde el arranque: la foto más reciente de su carpeta
         folder_path = os.path.join(IMAGE_BASE_FOLDER, latest_folder)
 
         # Obtener la imagen más reciente .jpg
-        images = sorted([
-            f for f in os.listdir(folder_path)
-            if f.endswith('.jpg.enc')
-        ], reverse=True)
+        images = catalog.list_media(latest_folder, kind='image')
 
         if not images:
             return jsonify({"error": "No hay imágenes en la carpeta"}), 404
 
-        latest_image = images[0]
+        latest_image = images[-1]['name']
         image_path = os.path.join(folder_path, latest_image)
 
-        # Desencriptar la imagen temporalmente
-        temp_file = media_handler.decrypt_file(image_path)
-
-        # Devolver tanto la imagen como los metadatos
+        # Desencriptar la imagen en memoria (o tomarla de la caché)
+        cached = media_handler.open_cached(image_path)
 
         print(f"[INFO] Foto capturada: carpeta = {latest_folder}, archivo = {latest_image}")
 
-        response = send_file(temp_file, mimetype='image/jpeg')
-        response.headers['X-Folder-Name'] = latest_folder
-        response.headers['X-File-Name'] = latest_image.replace('.enc', '')
-        response.headers['Access-Control-Expose-Headers'] = 'X-Folder-Name, X-File-Name'
-        response.headers['Content-Security-Policy'] = "default-src 'self'"
-        response.headers['Access-Control-Allow-Origin'] = '*'
-        # Configurar eliminación del archivo temporal después de enviar
-        @response.call_on_close
-        def remove_temp_file():
-            try:
-                os.remove(temp_file)
-            except Exception as e:
-                print(f"Error al eliminar archivo temporal {temp_file}: {e}")
-        return response
+        response = send_decrypted(cached, 'image/jpeg')
+        return capture_headers(response, latest_folder, latest_image.replace('.enc', ''))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -247,19 +403,42 @@ def generar_pdf():
     if not isinstance(html_content, str):
         return jsonify({'error': 'El contenido HTML debe ser una cadena'}), 400
 
-    pdf_path = os.path.join(IMAGE_BASE_FOLDER, session_folder, 'reporte.pdf')
+    if not catalog.session_exists(session_folder):
+        return jsonify({'error': f'La carpeta {session_folder} no existe.'}), 404
 
-    try:
-        with open(pdf_path, "wb") as pdf_file:
-            pisa_status = pisa.CreatePDF(html_content, dest=pdf_file)
+    # Se genera en otro proceso; si el HTML no cambió se devuelve el PDF ya generado
+    job = report_renderer.submit(html_content, session_folder)
+    job = report_renderer.wait(job['id'], REPORT_WAIT_SECONDS)
+    return report_response(job)
 
-        if pisa_status.err:
-            return jsonify({'error': 'Error al generar el PDF'}), 500
 
-        return jsonify({'pdf_path': pdf_path}), 200
+@gallery.route('/generar_pdf/<job_id>', methods=['GET'])
+def generar_pdf_status(job_id):
+    job = report_renderer.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return report_response(job)
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+
+def report_response(job):
+    """200 con la ruta del PDF, 500 si falló o 202 con la URL para consultar el estado"""
+    if job['status'] == DONE:
+        pdf_path = os.path.join(IMAGE_BASE_FOLDER, job['folder'], 'reporte.pdf.enc')
+        return jsonify({'pdf_path': pdf_path, 'pdf_url': job['pdf_url'], 'job': job}), 200
+    if job['status'] == FAILED:
+        return jsonify({'error': job['error'] or 'Error al generar el PDF', 'job': job}), 500
+    return jsonify({'message': 'Generando PDF', 'status_url': f"/gallery/generar_pdf/{job['id']}", 'job': job}), 202
+
+
+@gallery.route('/generar_pdf/stats', methods=['GET'])
+def generar_pdf_stats():
+    # Reportes generados, peticiones unidas a uno en curso y PDFs reutilizados
+    return jsonify(report_renderer.stats())
+
+@gallery.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    # Aciertos, fallos y expulsiones de la caché de multimedia descifrada
+    return jsonify(media_cache.stats())
 
 @gallery.route('/delete-image', methods=['DELETE'])
 def delete_image():
@@ -285,12 +464,19 @@ def delete_image():
         deleted_path = None
         if os.path.exists(encrypted_path):
             os.remove(encrypted_path)
+            media_cache.invalidate(encrypted_path)
+            thumb_path = thumbnail_path(encrypted_path)
+            if os.path.exists(thumb_path):
+                os.remove(thumb_path)
+                media_cache.invalidate(thumb_path)
             deleted_path = encrypted_path
         elif os.path.exists(normal_path):
             os.remove(normal_path)
             deleted_path = normal_path
         else:
             return jsonify({"error": "Archivo no encontrado"}), 404
+        mark_dirty(os.path.dirname(deleted_path))
+        latest_capture.forget(folder, filename)
 
         return jsonify({
             "success": True,
@@ -0,0 +1,18 @@
+from flask import Blueprint, jsonify
+
+from services import readiness
+
+health = Blueprint('health', __name__)
+
+
+@health.route('/live', methods=['GET'])
+def live():
+    # El servidor responde: no implica que cámara y modelo estén listos
+    return jsonify({"status": "ok"})
+
+
+@health.route('/ready', methods=['GET'])
+def ready():
+    # 200 cuando todos los subsistemas obligatorios arrancaron, 503 mientras tanto
+    is_ready, stages = readiness.snapshot()
+    return jsonify({"ready": is_ready, "stages": stages}), 200 if is_ready else 503
@@ -1,52 +1,133 @@
 import os
+import queue
 import threading
 import time
 from flask import Blueprint, jsonify, Response, request
 from dotenv import load_dotenv
 
+from services.frame_broadcaster import TIERS
+
 load_dotenv()
 recording_flag = threading.Event()
+MAX_BURST = int(os.getenv("MAX_BURST", "30"))
 
 import threading, time
 from flask import Blueprint, jsonify, Response
 
-def create_video_blueprint(handler):
+def create_video_blueprint(handler, frame_source=None):
     video = Blueprint('video', __name__)
 
+    # Permite sustituir la capturadora por otra fuente (archivo, patrón sintético)
+    if frame_source is not None:
+        handler.set_frame_source(frame_source)
+
     # 1) Captura de frames en hilo real
     threading.Thread(target=handler.capture_frames, daemon=True).start()
 
     @video.route('/video_feed')
     def video_feed():
-        return Response(handler.generate(),
+        # ?tier=high|medium|low&quality=1-95&fps=N&auto=0 para adaptar el stream al cliente
+        tier = request.args.get('tier', 'high')
+        if tier not in TIERS:
+            return jsonify({"message": f"Nivel desconocido: {tier}", "tiers": list(TIERS)}), 400
+        quality = request.args.get('quality', type=int)
+        max_fps = request.args.get('fps', type=float)
+        auto = request.args.get('auto', '1') not in ('0', 'false')
+
+        return Response(handler.generate(tier, quality, max_fps, auto),
                         mimetype='multipart/x-mixed-replace; boundary=frame')
 
+    @video.route('/stream_tiers', methods=['GET'])
+    def stream_tiers():
+        # Niveles disponibles para negociar el stream y clientes conectados por variante
+        return jsonify({
+            "tiers": {name: {"resolution": f"{w}x{h}", "quality": q} for name, (w, h, q) in TIERS.items()},
+            "active": handler.broadcaster.stats(),
+            # MJPEG: el nivel high sin calidad explícita reenvía el JPEG de la cámara;
+            # decoded_frames cuenta los frames que alguien necesitó decodificar
+            "capture": {
+                "compressed": bool(handler.frame_source and handler.frame_source.compressed),
+                "frames": handler.frame_buffer.seq,
+                "decoded_frames": handler.frame_buffer.decoded_frames,
+            },
+        })
+
     @video.route('/capture', methods=['POST'])
     def capture():
+        # {"burst": N, "interval_ms": X} captura N fotos en segundo plano (202)
+        data = request.get_json(silent=True) or {}
+        burst = data.get('burst')
+        if burst is not None:
+            try:
+                count = int(burst)
+                interval_ms = int(data.get('interval_ms', 200))
+            except (TypeError, ValueError):
+                return jsonify({"message": "burst e interval_ms deben ser enteros"}), 400
+            if not 1 <= count <= MAX_BURST or not 0 <= interval_ms <= 10000:
+                return jsonify({"message": f"burst debe estar entre 1 y {MAX_BURST} e interval_ms entre 0 y 10000"}), 400
+            if handler.session_folder is None:
+                return jsonify({"message": "No hay una sesión iniciada"}), 409
+
+            burst_id = handler.capture_burst(count, interval_ms)
+            return jsonify({
+                "message": f"Ráfaga de {count} fotos iniciada",
+                "burst_id": burst_id,
+                "status_url": f"/video/capture/burst/{burst_id}"
+            }), 202
+
+        # mode=best&window=N guarda el frame más nítido de los últimos N en vez del último
+        mode = request.args.get('mode', data.get('mode', 'latest'))
+        window = request.args.get('window', type=int) or data.get('window') or 5
+
         try:
-            frame = handler.latest_frame
-            if frame is None:
+            score = None
+            if mode == 'best':
+                frame_ref, score = handler.pin_best_frame(int(window))
+            else:
+                frame_ref = handler.pin_latest_frame()
+            if frame_ref is None:
                 return jsonify({"message": "Aún no hay frames disponibles para capturar"}), 500
 
-            filename, filepath = handler.save_snapshot(frame)
+            # Solo se codifica aquí; el cifrado y la escritura van en segundo plano
+            with frame_ref:
+                filename, filepath = handler.save_snapshot(frame_ref.frame)
 
             # Obtener la carpeta de la foto
             folder = os.path.basename(os.path.dirname(filepath))
             display_name = filename.replace('.enc', '')
 
-            print(f"📸 Imagen guardada como {display_name} en la carpeta {folder}")
+            print(f"📸 Imagen aceptada como {display_name} en la carpeta {folder}")
 
             # Devolver nombre de la carpeta y el archivo
-            return jsonify({
+            result = {
                 "message": f"Imagen guardada como {filename}",
                 "path": filepath,
                 "folder": folder,
                 "filename": filename
-            })
-
+            }
+            if score is not None:
+                result["score"] = {"value": round(score[0], 1), "sharpness": round(score[1], 1),
+                                   "brightness": round(score[2], 1), "clipped": round(score[3], 4)}
+                result["scoring"] = handler.frame_scorer.stats()
+            return jsonify(result)
+
+        except queue.Full:
+            return jsonify({"message": "Demasiadas fotos pendientes de guardar, inténtalo de nuevo"}), 503
         except Exception as e:
             print("❌ Error al capturar imagen:", e)
             return jsonify({"message": "Error interno al capturar imagen"}), 500
+
+    @video.route('/scoring_stats', methods=['GET'])
+    def scoring_stats():
+        # Coste por frame de la puntuación de nitidez (para comprobar que no baja los fps)
+        return jsonify(handler.frame_scorer.stats())
+
+    @video.route('/capture/burst/<burst_id>', methods=['GET'])
+    def burst_status(burst_id):
+        state = handler.burst_status(burst_id)
+        if state is None:
+            return jsonify({"message": "Ráfaga no encontrada"}), 404
+        return jsonify(state)
         
 
     @video.route('/start_recording', methods=['POST'])
@@ -57,6 +138,10 @@ def create_video_blueprint(handler):
 
         data = request.get_json()
         usuario = data.get('usuario', 'desconocido')
+        # "segmentado": true graba en segmentos encriptados al cerrarse (por defecto RECORDING_MODE)
+        segmented = data.get('segmentado')
+        # "audio": true graba el micrófono como pista del mismo MP4 (por defecto RECORD_AUDIO)
+        with_audio = data.get('audio')
         print(f"👤 Usuario recibido: {usuario}", flush=True)
         handler.start_session(usuario)
         recording_flag.set()
@@ -64,7 +149,7 @@ def create_video_blueprint(handler):
 
         # 2) Record video en hilo real
         threading.Thread(target=handler.record_video,
-                         args=(recording_flag,),
+                         args=(recording_flag, segmented, with_audio),
                          daemon=True).start()
         print("🎥 Hilo de grabación de video lanzado", flush=True)
 
@@ -101,6 +186,16 @@ def create_video_blueprint(handler):
             "transcription_file": "",
             "status":"success"}), 200
 
+    @video.route('/recording_stats', methods=['GET'])
+    def recording_stats():
+        # Contadores de la cola de grabación (descartes y máximo ocupado)
+        # y ritmo real de la grabación (fps conseguidos y jitter)
+        stats = handler.record_queue.stats()
+        stats["pacing"] = handler.pacing_stats()
+        # Silencio insertado, muestras recortadas y deriva máxima de la pista de audio
+        stats["av_sync"] = handler.av_sync_stats()
+        return jsonify(stats)
+
     return video
 
     @video.route('/shutdown', methods=['POST'])
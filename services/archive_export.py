@@ -0,0 +1,162 @@
+"""Exportación de una sesión completa como ZIP o TAR generado en streaming.
+
+Cada archivo se descifra por bloques mientras se escribe en el archivo
+comprimido, y lo escrito se entrega en cuanto está listo: la memoria usada
+no depende del tamaño de la sesión y no se crea ningún temporal.
+"""
+import io
+import os
+import tarfile
+import time
+import zipfile
+
+from services.crypto_container import plaintext_size
+
+BLOCK_SIZE = tarfile.BLOCKSIZE
+
+
+class ExportEntry:
+    """Un archivo a exportar: nombre dentro del archivo, fecha y cómo abrirlo.
+
+    open_reader() devuelve un lector con .size e iter_range(); se llama al
+    escribir la entrada. known_size() da el tamaño sin descifrar nada, o None
+    si no se puede saber sin descifrar (.enc antiguos en Fernet).
+    """
+
+    def __init__(self, arcname, mtime, open_reader, known_size=None):
+        self.arcname = arcname
+        self.mtime = mtime
+        self.open_reader = open_reader
+        self._known_size = known_size
+
+    def known_size(self):
+        return self._known_size() if self._known_size else None
+
+
+class _Sink(io.RawIOBase):
+    """Destino no posicionable para zipfile: acumula lo escrito hasta que se recoge"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(entries):
+    """Genera un ZIP sin compresión (los videos y fotos ya van comprimidos)"""
+    return (data for data in _zip_parts(entries) if data)
+
+
+def _zip_parts(entries):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for entry in entries:
+            yield from _zip_entry(archive, sink, entry)
+    yield sink.drain()
+
+
+def _zip_entry(archive, sink, entry):
+    # Sin tamaños: al no poder posicionarse, zipfile escribe tamaños y CRC en un
+    # descriptor tras los datos. ZIP64 siempre, porque un video puede pasar de 4 GiB
+    info = zipfile.ZipInfo(entry.arcname, time.localtime(entry.mtime)[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    reader = entry.open_reader()
+    with archive.open(info, 'w', force_zip64=True) as dst:
+        for data in reader.iter_range():
+            dst.write(data)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _tar_header(entry, size):
+    info = tarfile.TarInfo(entry.arcname)
+    info.size = size
+    info.mtime = int(entry.mtime)
+    info.mode = 0o644
+    return info.tobuf(format=tarfile.PAX_FORMAT)
+
+
+def iter_tar(entries):
+    """Genera un TAR (formato PAX) escribiendo a mano cabeceras y relleno"""
+    for entry in entries:
+        yield from _tar_entry(entry)
+    yield b'\0' * (2 * BLOCK_SIZE)
+
+
+def _tar_entry(entry):
+    # El lector vive solo mientras se escribe esta entrada
+    reader = entry.open_reader()
+    yield _tar_header(entry, reader.size)
+    written = 0
+    for data in reader.iter_range():
+        written += len(data)
+        yield data
+    if written != reader.size:
+        raise IOError(f"{entry.arcname}: se esperaban {reader.size} bytes y se leyeron {written}")
+    padding = -reader.size % BLOCK_SIZE
+    if padding:
+        yield b'\0' * padding
+
+
+def tar_size(entries):
+    """Tamaño exacto del TAR, para poder mandar Content-Length; None si algún tamaño no se sabe sin descifrar"""
+    total = 2 * BLOCK_SIZE
+    for entry in entries:
+        size = entry.known_size()
+        if size is None:
+            return None
+        total += len(_tar_header(entry, size)) + size + (-size % BLOCK_SIZE)
+    return total
+
+
+def session_entries(media_handler, folder_path, names):
+    """ExportEntry de los archivos de una sesión; los .enc se exportan descifrados y sin la extensión.
+
+    Aquí no se abre ningún archivo: cada lector se abre al escribir su entrada,
+    así que un .enc antiguo (Fernet), que se descifra entero en memoria, nunca
+    convive con otro.
+    """
+    entries = []
+    for name in names:
+        path = os.path.join(folder_path, name)
+        mtime = os.path.getmtime(path)
+        if name.endswith('.enc'):
+            entries.append(ExportEntry(name[:-len('.enc')], mtime,
+                                       lambda path=path: media_handler.open_encrypted(path),
+                                       lambda path=path: plaintext_size(path)))
+        else:
+            entries.append(ExportEntry(name, mtime, lambda path=path: _PlainReader(path),
+                                       lambda path=path: os.path.getsize(path)))
+    return entries
+
+
+class _PlainReader:
+    """Lector de un archivo sin cifrar con la misma interfaz que los de crypto_container"""
+
+    def __init__(self, path, chunk_size=64 * 1024):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.chunk_size = chunk_size
+
+    def iter_range(self):
+        with open(self.path, 'rb') as f:
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                yield data
@@ -0,0 +1,114 @@
+import os
+import queue
+import threading
+import time
+
+
+class AudioPipeWriter:
+    """Escribe PCM hacia ffmpeg (pipe:N) alineado con el reloj del video.
+
+    Video y audio usan time.monotonic() como reloj común. El instante 0 del
+    archivo es origin (por defecto, cuando se crea el escritor, justo antes de
+    lanzar ffmpeg); cada bloque de audio se coloca según su marca de tiempo:
+    si llega tarde se rellena con silencio y si se adelanta se recortan
+    muestras, así la deriva entre pistas nunca supera tolerance segundos.
+    Hasta que llega el primer bloque y siempre que el micrófono deja de
+    entregar datos se escribe silencio, para que ffmpeg no se quede esperando
+    a esta pista (ni al arrancar, cuando analiza sus entradas).
+    """
+
+    def __init__(self, fd, rate=16000, channels=1, sample_width=2, tolerance=0.04, latency=0.25,
+                 origin=None):
+        self._pipe = os.fdopen(fd, 'wb', buffering=0)
+        self.rate = rate
+        self.frame_bytes = channels * sample_width
+        self.tolerance = tolerance
+        self.latency = latency
+        self._queue = queue.Queue(maxsize=512)
+        self.origin = time.monotonic() if origin is None else origin
+        self._receiving = False
+        self._closing = threading.Event()
+        self._end = None
+        self._written = 0  # muestras escritas desde el origen
+        self.silence_samples = 0
+        self.trimmed_samples = 0
+        self.max_drift = 0.0
+        self._thread = threading.Thread(target=self._run, name='av-audio', daemon=True)
+        self._thread.start()
+
+    def push(self, data, captured_at):
+        """Entrega un bloque PCM; captured_at es cuándo terminó de capturarse"""
+        try:
+            self._queue.put_nowait((data, captured_at))
+        except queue.Full:
+            pass  # se cubrirá con silencio al alinear el siguiente bloque
+
+    def _write(self, data):
+        self._pipe.write(data)
+        self._written += len(data) // self.frame_bytes
+
+    def _pad_until(self, position):
+        missing = position - self._written
+        if missing > 0:
+            self.silence_samples += missing
+            self._write(b'\0' * (missing * self.frame_bytes))
+
+    def _align(self, data, captured_at):
+        samples = len(data) // self.frame_bytes
+        start = int(round((captured_at - self.origin) * self.rate)) - samples
+        if start + samples <= self._written:
+            return  # completamente anterior al origen o ya cubierto
+        drift = (start - self._written) / self.rate
+        self.max_drift = max(self.max_drift, abs(drift))
+        if drift > self.tolerance:
+            # Hueco (bloques perdidos o el reloj del audio va lento)
+            self._pad_until(start)
+        elif drift < -self.tolerance or start < 0:
+            # Solape: el audio va por delante del reloj común
+            skip = self._written - start
+            self.trimmed_samples += skip
+            data = data[skip * self.frame_bytes:]
+        self._write(data)
+
+    def _run(self):
+        try:
+            # ffmpeg no empieza a leer el video hasta que esta entrada tiene datos
+            self._pad_until(max(1, int((time.monotonic() - self.origin) * self.rate)))
+            while True:
+                try:
+                    data, captured_at = self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    if self._closing.is_set():
+                        if self._end is not None:
+                            # La pista de audio dura lo mismo que la de video
+                            self._pad_until(int(round((self._end - self.origin) * self.rate)))
+                        break
+                    # Sin audio: silencio para no bloquear a ffmpeg. Si el micrófono ya
+                    # entregaba datos se deja margen por si un bloque llega con retraso
+                    latency = self.latency if self._receiving else 0.0
+                    self._pad_until(int((time.monotonic() - self.origin - latency) * self.rate))
+                    continue
+                self._receiving = True
+                self._align(data, captured_at)
+        except (BrokenPipeError, OSError, ValueError):
+            pass  # ffmpeg terminó
+        finally:
+            try:
+                self._pipe.close()
+            except OSError:
+                pass
+
+    def close(self, end=None):
+        """Completa con silencio hasta end (reloj monotónico) y cierra la pista"""
+        self._end = end
+        self._closing.set()
+        self._thread.join(timeout=5)
+        return self.stats()
+
+    def stats(self):
+        return {
+            "samples": self._written,
+            "silence_ms": round(self.silence_samples / self.rate * 1000, 1),
+            "trimmed_ms": round(self.trimmed_samples / self.rate * 1000, 1),
+            "max_drift_ms": round(self.max_drift * 1000, 1),
+        }
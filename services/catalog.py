@@ -0,0 +1,185 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Carpetas de sesión: usuario_YYYYMMDD-HHMMSS o solo YYYYMMDD-HHMMSS
+SESSION_PATTERN = re.compile(r'^(?:(?P<usuario>.+)_)?(?P<fecha>\d{8})-(?P<hora>\d{6})$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    folder TEXT PRIMARY KEY,
+    usuario TEXT,
+    fecha TEXT,
+    started_at TEXT,
+    fecha_legible TEXT,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_started_at ON sessions (started_at);
+CREATE INDEX IF NOT EXISTS sessions_usuario ON sessions (usuario);
+CREATE TABLE IF NOT EXISTS media (
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (folder, name)
+);
+CREATE INDEX IF NOT EXISTS media_kind ON media (folder, kind);
+"""
+
+# Carpetas modificadas desde fuera (captura, grabación) pendientes de reindexar
+_dirty = set()
+_dirty_lock = threading.Lock()
+
+
+def mark_dirty(folder_path):
+    """Avisa al catálogo de que una carpeta de sesión cambió (se reindexa en la siguiente consulta)"""
+    with _dirty_lock:
+        _dirty.add(os.path.basename(os.path.normpath(folder_path)))
+
+
+def media_kind(name):
+    """Clasifica un archivo de sesión por su extensión, o None si no es multimedia"""
+    if name.endswith('.jpg.enc'):
+        return 'image'
+    if name.endswith('.mp4.enc'):
+        return 'video'
+    if name.endswith('.pdf') or name.endswith('.pdf.enc'):
+        return 'pdf'
+    if name.endswith('.txt') or name.endswith('.txt.enc'):
+        return 'transcript'
+    if name.endswith('.wav') or name.endswith('.wav.enc'):
+        return 'audio'
+    return None
+
+
+def parse_session_folder(folder):
+    """Devuelve (usuario, 'YYYYMMDD', 'YYYY-MM-DDTHH:MM:SS') o (None, None, None)"""
+    match = SESSION_PATTERN.match(folder)
+    if not match:
+        return None, None, None
+    fecha, hora = match.group('fecha'), match.group('hora')
+    started_at = f"{fecha[:4]}-{fecha[4:6]}-{fecha[6:]}T{hora[:2]}:{hora[2:4]}:{hora[4:]}"
+    return match.group('usuario'), fecha, started_at
+
+
+class ProcedureCatalog:
+    """Índice persistente (SQLite) de las sesiones de PROCEDURES y su multimedia.
+
+    Se actualiza de forma incremental: solo se vuelven a listar las carpetas
+    cuyo mtime cambió o que se marcaron con mark_dirty(), y como mucho una vez
+    cada min_refresh_interval segundos.
+    """
+
+    def __init__(self, base_folder, db_path=None, formatter=None, min_refresh_interval=1.0):
+        self.base_folder = base_folder
+        os.makedirs(base_folder, exist_ok=True)
+        self.db_path = db_path or os.path.join(base_folder, '.catalog.sqlite3')
+        self.formatter = formatter
+        self.min_refresh_interval = min_refresh_interval
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def refresh(self, force=False):
+        """Sincroniza el índice con el disco y devuelve cuántas carpetas se reindexaron"""
+        with _dirty_lock:
+            dirty = set(_dirty)
+            _dirty.clear()
+        now = time.monotonic()
+        if not force and not dirty and now - self._last_refresh < self.min_refresh_interval:
+            return 0
+
+        with self._lock:
+            self._last_refresh = now
+            stored = dict(self._db.execute("SELECT folder, mtime_ns FROM sessions"))
+            on_disk = {}
+            if os.path.isdir(self.base_folder):
+                with os.scandir(self.base_folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir() and not entry.name.startswith('.'):
+                            on_disk[entry.name] = entry.stat().st_mtime_ns
+
+            changed = [folder for folder, mtime in on_disk.items()
+                       if stored.get(folder) != mtime or folder in dirty]
+            removed = [folder for folder in stored if folder not in on_disk]
+
+            for folder in changed:
+                self._index_folder(folder, on_disk[folder])
+            for folder in removed:
+                self._db.execute("DELETE FROM sessions WHERE folder = ?", (folder,))
+                self._db.execute("DELETE FROM media WHERE folder = ?", (folder,))
+            if changed or removed:
+                self._db.commit()
+            return len(changed) + len(removed)
+
+    def _index_folder(self, folder, mtime_ns):
+        usuario, fecha, started_at = parse_session_folder(folder)
+        # La fecha legible se calcula una sola vez por carpeta, no en cada petición
+        fecha_legible = folder
+        if self.formatter:
+            fecha_legible = self.formatter(folder[len(usuario) + 1:] if usuario else folder)
+        self._db.execute(
+            "INSERT OR REPLACE INTO sessions (folder, usuario, fecha, started_at, fecha_legible, mtime_ns)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (folder, usuario, fecha, started_at, fecha_legible, mtime_ns))
+
+        rows = []
+        with os.scandir(os.path.join(self.base_folder, folder)) as entries:
+            for entry in entries:
+                kind = media_kind(entry.name)
+                if kind and entry.is_file():
+                    stat = entry.stat()
+                    rows.append((folder, entry.name, kind, stat.st_size, stat.st_mtime_ns))
+        self._db.execute("DELETE FROM media WHERE folder = ?", (folder,))
+        self._db.executemany("INSERT INTO media (folder, name, kind, size, mtime_ns) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def list_sessions(self, page=None, per_page=50, desde=None, hasta=None, usuario=None):
+        """Sesiones de la más reciente a la más antigua: (lista de dicts, total)
+
+        desde/hasta son fechas YYYYMMDD (o YYYY-MM-DD) inclusivas. Sin page se
+        devuelven todas.
+        """
+        self.refresh()
+        where, params = [], []
+        if desde:
+            where.append("fecha >= ?")
+            params.append(desde.replace('-', ''))
+        if hasta:
+            where.append("fecha <= ?")
+            params.append(hasta.replace('-', ''))
+        if usuario:
+            where.append("usuario = ?")
+            params.append(usuario)
+        clause = (" WHERE " + " AND ".join(where)) if where else ""
+
+        with self._lock:
+            total = self._db.execute("SELECT COUNT(*) FROM sessions" + clause, params).fetchone()[0]
+            query = ("SELECT folder, usuario, started_at, fecha_legible FROM sessions" + clause +
+                     " ORDER BY started_at IS NULL, started_at DESC, folder DESC")
+            if page is not None:
+                query += " LIMIT ? OFFSET ?"
+                params = params + [per_page, (max(page, 1) - 1) * per_page]
+            rows = [dict(row) for row in self._db.execute(query, params)]
+        return rows, total
+
+    def session_exists(self, folder):
+        self.refresh()
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM sessions WHERE folder = ?", (folder,)).fetchone() is not None
+
+    def list_media(self, folder, kind=None):
+        """Archivos de una sesión ordenados por nombre, opcionalmente de un solo tipo"""
+        self.refresh()
+        query = "SELECT name, kind, size, mtime_ns FROM media WHERE folder = ?"
+        params = [folder]
+        if kind:
+            query += " AND kind = ?"
+            params.append(kind)
+        with self._lock:
+            return [dict(row) for row in self._db.execute(query + " ORDER BY name", params)]
@@ -0,0 +1,224 @@
+"""Contenedor binario de cifrado por bloques para los archivos multimedia.
+
+Formato (versión 1):
+
+    cabecera (20 bytes): b'ECAM' | versión (1) | flags (1) | reservado (2)
+                         | tamaño de bloque (4, big endian) | prefijo de nonce (8)
+    bloques:             AES-256-GCM(bloque de texto plano) + etiqueta de 16 bytes
+
+Cada bloque usa como nonce el prefijo seguido del índice del bloque y se
+autentica junto con la cabecera, su índice y si es el último, así que no se
+pueden reordenar, mezclar entre archivos ni truncar sin que falle el
+descifrado. Como todos los bloques salvo el último tienen el mismo tamaño, se
+puede descifrar cualquier rango de bytes leyendo solo los bloques que lo cubren.
+
+Los archivos .enc antiguos (un único token Fernet en base64) se siguen
+pudiendo leer con LegacyFernetReader.
+"""
+import base64
+import os
+import struct
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+MAGIC = b'ECAM'
+VERSION = 1
+HEADER = struct.Struct('>4sBBHI8s')
+TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 64 * 1024
+_KDF_INFO = b'endoscopy-cam chunked-aead v1'
+
+
+def is_chunked_file(path):
+    """Indica si el archivo usa el contenedor por bloques (y no Fernet)"""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def plaintext_size(path):
+    """Tamaño descifrado según la cabecera, sin descifrar nada; None si es un .enc antiguo (Fernet)"""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if header[:len(MAGIC)] != MAGIC:
+        return None
+    if len(header) != HEADER.size:
+        raise ValueError(f"Cabecera incompleta en {path}")
+    chunk_size = HEADER.unpack(header)[4]
+    body = os.path.getsize(path) - HEADER.size
+    size = body - max(1, -(-body // (chunk_size + TAG_SIZE))) * TAG_SIZE
+    if size < 0:
+        raise ValueError(f"Archivo cifrado truncado: {path}")
+    return size
+
+
+class ChunkedCipher:
+    """Cifra y descifra archivos por bloques con memoria constante"""
+
+    def __init__(self, secret_key, chunk_size=DEFAULT_CHUNK_SIZE):
+        if isinstance(secret_key, str):
+            secret_key = secret_key.encode()
+        # La clave Fernet del entorno se deriva a una clave AES-256 propia del formato
+        key_material = base64.urlsafe_b64decode(secret_key)
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=_KDF_INFO).derive(key_material)
+        self._aead = AESGCM(key)
+        self.chunk_size = chunk_size
+
+    def open_writer(self, dst):
+        """Devuelve un escritor que cifra lo que se le escribe sobre el archivo dst"""
+        return EncryptingWriter(self._aead, dst, self.chunk_size)
+
+    def encrypt_stream(self, src, dst):
+        """Cifra el contenido del archivo src sobre dst, bloque a bloque"""
+        writer = self.open_writer(dst)
+        while True:
+            data = src.read(self.chunk_size)
+            if not data:
+                break
+            writer.write(data)
+        writer.close()
+        return writer.size
+
+    def encrypt_bytes(self, data, dst):
+        """Cifra datos que ya están en memoria (fotos) sobre el archivo dst"""
+        writer = self.open_writer(dst)
+        writer.write(data)
+        writer.close()
+        return writer.size
+
+    def open_reader(self, path):
+        return ChunkedReader(self._aead, path)
+
+    def decrypt_stream(self, path, dst):
+        """Descifra el archivo path sobre el archivo dst, bloque a bloque"""
+        for data in self.open_reader(path).iter_range():
+            dst.write(data)
+
+
+def _nonce(prefix, index):
+    return prefix + struct.pack('>I', index)
+
+
+def _aad(header, index, final):
+    return header + struct.pack('>IB', index, 1 if final else 0)
+
+
+class EncryptingWriter:
+    """Escritor en streaming: acumula hasta un bloque y lo cifra al completarse.
+
+    El último bloque se marca como final al cerrar, por eso siempre se guarda
+    un bloque completo pendiente hasta saber si viene otro detrás.
+    """
+
+    def __init__(self, aead, dst, chunk_size):
+        self._aead = aead
+        self._dst = dst
+        self.chunk_size = chunk_size
+        self._prefix = os.urandom(8)
+        self._header = HEADER.pack(MAGIC, VERSION, 0, 0, chunk_size, self._prefix)
+        self._buffer = bytearray()
+        self._index = 0
+        self.size = 0
+        dst.write(self._header)
+
+    def _flush_chunk(self, data, final):
+        self._dst.write(self._aead.encrypt(_nonce(self._prefix, self._index), bytes(data),
+                                           _aad(self._header, self._index, final)))
+        self._index += 1
+
+    def write(self, data):
+        self._buffer += data
+        self.size += len(data)
+        # Se deja siempre al menos un byte pendiente: el bloque final se cifra en close()
+        if len(self._buffer) > self.chunk_size:
+            pos = 0
+            with memoryview(self._buffer) as view:
+                while len(view) - pos > self.chunk_size:
+                    self._flush_chunk(view[pos:pos + self.chunk_size], False)
+                    pos += self.chunk_size
+            del self._buffer[:pos]
+        return len(data)
+
+    def close(self):
+        if self._buffer is None:
+            return
+        self._flush_chunk(self._buffer, True)
+        self._buffer = None
+
+
+class ChunkedReader:
+    """Lector de un archivo cifrado por bloques que descifra rangos bajo demanda"""
+
+    def __init__(self, aead, path):
+        self._aead = aead
+        self.path = path
+        with open(path, 'rb') as f:
+            self._header = f.read(HEADER.size)
+        if len(self._header) != HEADER.size:
+            raise ValueError(f"Cabecera incompleta en {path}")
+        magic, version, _, _, self.chunk_size, self._prefix = HEADER.unpack(self._header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Formato de cifrado no soportado en {path}")
+
+        record = self.chunk_size + TAG_SIZE
+        body = os.path.getsize(path) - HEADER.size
+        self.chunks = max(1, -(-body // record))
+        self.size = body - self.chunks * TAG_SIZE
+        if self.size < 0:
+            raise ValueError(f"Archivo cifrado truncado: {path}")
+
+    def iter_range(self, start=0, end=None):
+        """Genera el texto plano de [start, end) descifrando solo los bloques necesarios"""
+        if end is None or end > self.size:
+            end = self.size
+        if start >= end:
+            if self.size == 0:
+                # Archivo vacío: se valida igualmente el bloque final
+                for _ in self._decrypt_chunks(0, 0):
+                    pass
+            return
+
+        first = start // self.chunk_size
+        last = (end - 1) // self.chunk_size
+        offset = first * self.chunk_size
+        for data in self._decrypt_chunks(first, last):
+            lo = max(start - offset, 0)
+            hi = min(end - offset, len(data))
+            offset += len(data)
+            yield data[lo:hi] if (lo, hi) != (0, len(data)) else data
+
+    def read_range(self, start, length):
+        return b''.join(self.iter_range(start, start + length))
+
+    def _decrypt_chunks(self, first, last):
+        record = self.chunk_size + TAG_SIZE
+        with open(self.path, 'rb') as f:
+            f.seek(HEADER.size + first * record)
+            for index in range(first, last + 1):
+                final = index == self.chunks - 1
+                data = f.read(record)
+                yield self._aead.decrypt(_nonce(self._prefix, index), data,
+                                         _aad(self._header, index, final))
+
+
+class LegacyFernetReader:
+    """Misma interfaz que ChunkedReader para archivos .enc antiguos en Fernet.
+
+    Fernet no permite descifrar parcialmente, así que se descifra todo al abrir.
+    """
+
+    def __init__(self, fernet, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._data = fernet.decrypt(f.read())
+        self.size = len(self._data)
+
+    def iter_range(self, start=0, end=None):
+        if end is None or end > self.size:
+            end = self.size
+        if start < end:
+            yield self._data[start:end]
+
+    def read_range(self, start, length):
+        return b''.join(self.iter_range(start, start + length))
@@ -0,0 +1,28 @@
+import threading
+
+# Bus de eventos mínimo entre servicios y rutas (por ejemplo, para reenviarlos por SocketIO)
+_listeners = {}
+_lock = threading.Lock()
+
+
+def subscribe(event, callback):
+    """Registra callback(payload) para el evento indicado"""
+    with _lock:
+        _listeners.setdefault(event, []).append(callback)
+
+
+def unsubscribe(event, callback):
+    with _lock:
+        if callback in _listeners.get(event, []):
+            _listeners[event].remove(callback)
+
+
+def publish(event, payload):
+    """Avisa a los suscriptores; un suscriptor que falla no afecta a los demás"""
+    with _lock:
+        callbacks = list(_listeners.get(event, []))
+    for callback in callbacks:
+        try:
+            callback(payload)
+        except Exception as e:
+            print(f"⚠️ Error en suscriptor de '{event}': {e}", flush=True)
@@ -0,0 +1,219 @@
+import threading
+import time
+
+import cv2
+
+from services.mjpeg import ensure_huffman_tables
+
+# Niveles del stream: nombre -> (ancho, alto, calidad JPEG por defecto)
+TIERS = {
+    'high': (640, 480, 95),
+    'medium': (480, 360, 80),
+    'low': (320, 240, 65),
+}
+TIER_ORDER = ('high', 'medium', 'low')
+
+# Si entregar un frame al cliente tarda más que esto varias veces seguidas,
+# su socket está saturado y se baja un nivel
+SLOW_WRITE_SECONDS = 0.2
+SLOW_WRITES_TO_DOWNGRADE = 5
+# Tras este tiempo sin escrituras lentas se intenta volver al nivel pedido
+RECOVER_SECONDS = 30
+
+
+def normalize_quality(quality):
+    """Redondea la calidad a múltiplos de 5 para que los clientes compartan variantes"""
+    if quality is None:
+        return None
+    return max(10, min(95, int(round(int(quality) / 5.0)) * 5))
+
+
+class _Variant:
+    """Una combinación nivel/calidad: se codifica una vez por frame para todos sus clientes"""
+
+    def __init__(self, tier, quality):
+        self.tier = tier
+        self.width, self.height, default_quality = TIERS[tier]
+        self.quality = default_quality if quality is None else quality
+        # Sin calidad explícita, a resolución completa se reenvía el JPEG de la cámara tal cual
+        self.accepts_source_jpeg = quality is None
+        self.passthrough = False
+        self.subscribers = 0
+        self.seq = 0
+        self.chunk = None
+        self.resized = None
+
+
+class FrameBroadcaster:
+    """Codifica cada frame a JPEG una sola vez por variante y lo reparte a todos los clientes"""
+
+    def __init__(self, frame_buffer=None):
+        self.frame_buffer = frame_buffer
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._variants = {}
+        self._closed = False
+        self._thread = None
+
+    @property
+    def subscribers(self):
+        return sum(variant.subscribers for variant in self._variants.values())
+
+    def stats(self):
+        with self._cond:
+            return [{
+                "tier": variant.tier,
+                "quality": variant.quality,
+                "resolution": f"{variant.width}x{variant.height}",
+                "subscribers": variant.subscribers,
+                "passthrough": variant.passthrough,
+            } for variant in self._variants.values() if variant.subscribers]
+
+    def publish(self, frame, slot=None):
+        """Codifica el frame para cada variante con clientes y despierta a los suscriptores.
+
+        Si el slot trae el JPEG de la cámara (MJPEG), las variantes a resolución
+        completa lo reenvían sin decodificar ni recodificar; el frame solo se
+        decodifica si alguna variante necesita redimensionar o cambiar la calidad.
+        """
+        with self._cond:
+            variants = [variant for variant in self._variants.values() if variant.subscribers]
+        if not variants:
+            return False
+
+        encoded = []
+        height, width = frame.shape[:2]
+        source_jpeg = slot.jpeg if slot is not None else None
+        decoded = source_jpeg is None
+        for variant in variants:
+            variant.passthrough = (source_jpeg is not None and variant.accepts_source_jpeg
+                                   and (variant.width, variant.height) == (width, height))
+            if variant.passthrough:
+                encoded.append((variant, ensure_huffman_tables(source_jpeg)))
+                continue
+            if not decoded:
+                self.frame_buffer.decode(slot)
+                decoded = True
+            image = frame
+            if (variant.width, variant.height) != (width, height):
+                variant.resized = cv2.resize(frame, (variant.width, variant.height),
+                                             dst=variant.resized, interpolation=cv2.INTER_AREA)
+                image = variant.resized
+            ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, variant.quality])
+            if ret:
+                encoded.append((variant, buffer.tobytes()))
+
+        # El slot pudo sobreescribirse mientras se codificaba
+        if slot is not None and not self.frame_buffer.is_valid(slot):
+            return False
+
+        with self._cond:
+            self._seq += 1
+            for variant, buffer in encoded:
+                variant.seq = self._seq
+                variant.chunk = (b'--frame\r\n'
+                                 b'Content-Type: image/jpeg\r\n\r\n' + buffer + b'\r\n')
+            self._cond.notify_all()
+        return bool(encoded)
+
+    def start(self):
+        """Lanza el hilo codificador que lee del buffer de frames"""
+        if self._thread is None and self.frame_buffer is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        cursor = 0
+        while not self._closed:
+            # Sin clientes no se codifica nada: se espera a que llegue uno
+            with self._cond:
+                self._cond.wait_for(lambda: self.subscribers > 0 or self._closed)
+            # Sin decodificar: con MJPEG puede que ningún cliente necesite los píxeles
+            slot = self.frame_buffer.wait_latest(cursor, timeout=1.0, decode=False)
+            if slot is None:
+                continue
+            cursor = slot.seq
+            self.publish(slot.frame, slot)
+
+    def _join(self, tier, quality):
+        with self._cond:
+            key = (tier, quality)
+            if key not in self._variants:
+                self._variants[key] = _Variant(tier, quality)
+            variant = self._variants[key]
+            variant.subscribers += 1
+            self._cond.notify_all()
+            return variant
+
+    def _leave(self, variant):
+        with self._cond:
+            variant.subscribers -= 1
+
+    def subscribe(self, tier='high', quality=None, max_fps=None, auto=True, timeout=5.0):
+        """Generador por cliente con su propio cursor.
+
+        Si el cliente se atrasa, salta directamente al frame más reciente en
+        lugar de consumir los intermedios, así un cliente lento no frena al resto.
+        Con auto=True baja de nivel cuando entregarle los frames se vuelve lento
+        (el socket no se vacía) y vuelve a subir cuando se recupera.
+        """
+        if tier not in TIERS:
+            raise ValueError(f"Nivel de stream desconocido: {tier}")
+        quality = normalize_quality(quality)
+        requested = TIER_ORDER.index(tier)
+        level = requested
+        variant = self._join(tier, quality)
+        cursor = variant.seq
+        last_sent = 0.0
+        slow_writes = 0
+        last_slow = time.monotonic()
+        try:
+            while True:
+                with self._cond:
+                    ready = self._cond.wait_for(lambda: variant.seq > cursor or self._closed, timeout)
+                    if self._closed:
+                        return
+                    if not ready:
+                        continue
+
+                if max_fps:
+                    wait = last_sent + 1.0 / max_fps - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+
+                with self._cond:
+                    cursor = variant.seq
+                    chunk = variant.chunk
+
+                last_sent = time.monotonic()
+                yield chunk
+                write_time = time.monotonic() - last_sent
+                if not auto:
+                    continue
+
+                new_level = level
+                if write_time > SLOW_WRITE_SECONDS:
+                    slow_writes += 1
+                    last_slow = time.monotonic()
+                    if slow_writes >= SLOW_WRITES_TO_DOWNGRADE and level < len(TIER_ORDER) - 1:
+                        new_level = level + 1
+                else:
+                    slow_writes = 0
+                    if level > requested and time.monotonic() - last_slow > RECOVER_SECONDS:
+                        new_level = level - 1
+
+                if new_level != level:
+                    print(f"📶 Cliente de stream: {TIER_ORDER[level]} -> {TIER_ORDER[new_level]}", flush=True)
+                    self._leave(variant)
+                    level = new_level
+                    variant = self._join(TIER_ORDER[level], quality)
+                    cursor = variant.seq
+                    slow_writes = 0
+                    last_slow = time.monotonic()
+        finally:
+            self._leave(variant)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
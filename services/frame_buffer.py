@@ -0,0 +1,252 @@
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Vista de un slot del buffer: número de secuencia, instante de captura, frame
+# y, si la cámara entrega MJPEG, el JPEG original (el frame se decodifica bajo demanda)
+FrameSlot = namedtuple('FrameSlot', ['seq', 'timestamp', 'frame', 'jpeg'], defaults=(None,))
+
+
+class FramePool:
+    """Conjunto de buffers de frame reutilizables para no reservar memoria por frame"""
+
+    def __init__(self, shape, dtype=np.uint8, size=0):
+        self.shape = shape
+        self.dtype = dtype
+        self._free = [np.zeros(shape, dtype=dtype) for _ in range(size)]
+        self._lock = threading.Lock()
+        self.allocated = size
+
+    def acquire(self):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.allocated += 1
+        return np.zeros(self.shape, dtype=self.dtype)
+
+    def release(self, buffer):
+        with self._lock:
+            self._free.append(buffer)
+
+
+class FrameRef:
+    """Referencia inmutable a un frame del buffer.
+
+    Mientras no se libere, la captura no vuelve a escribir sobre ese buffer
+    (usa otro del pool), así que el frame se puede leer sin copiarlo.
+    """
+
+    def __init__(self, seq, timestamp, buffer, owner):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.frame = buffer.view()
+        self.frame.flags.writeable = False
+        self._buffer = buffer
+        self._owner = owner
+
+    def release(self):
+        if self._owner is not None:
+            self._owner._unpin(self._buffer)
+            self._owner = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class FrameRingBuffer:
+    """Buffer circular preasignado de frames BGR con notificación por condición.
+
+    Un único hilo escribe (la captura) y cualquier número de consumidores
+    esperan sin sondeo a que llegue un frame nuevo. Los slots se reutilizan,
+    así que quien lea un frame debe comprobar con is_valid() que no se
+    sobreescribió mientras lo usaba, o fijarlo con pin_latest().
+
+    Con una cámara MJPEG la captura solo guarda el JPEG (write_jpeg) y los
+    píxeles se decodifican la primera vez que alguien los pide, una sola vez
+    por frame; quien solo necesita el JPEG pide el slot con decode=False.
+    """
+
+    def __init__(self, width=640, height=480, capacity=8):
+        self.width = width
+        self.height = height
+        self.capacity = capacity
+        self.pool = FramePool((height, width, 3), size=capacity)
+        self._frames = [self.pool.acquire() for _ in range(capacity)]
+        self._pins = {}
+        self._seqs = [0] * capacity
+        self._timestamps = [0.0] * capacity
+        self._jpegs = [None] * capacity
+        # Secuencia cuyos píxeles contiene cada buffer (los de MJPEG se rellenan al decodificar)
+        self._decoded = {}
+        self._decode_lock = threading.Lock()
+        self.decoded_frames = 0
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @property
+    def seq(self):
+        """Secuencia del último frame escrito (0 si todavía no hay ninguno)"""
+        return self._seq
+
+    def begin_write(self):
+        """Devuelve el buffer donde se escribirá el siguiente frame.
+
+        La fuente puede leer directamente sobre él (cap.read(buffer)) y luego
+        llamar a commit(); así el frame no se copia de un buffer a otro.
+        """
+        index = (self._seq + 1) % self.capacity
+        with self._cond:
+            # Se invalida el slot mientras se sobreescribe
+            self._seqs[index] = 0
+            if id(self._frames[index]) in self._pins:
+                # Alguien tiene fijado este frame: se usa otro buffer del pool
+                self._frames[index] = self.pool.acquire()
+            return self._frames[index]
+
+    def write(self, frame, timestamp=None):
+        """Copia el frame en el siguiente slot (redimensionando si hace falta)"""
+        self.begin_write()
+        return self.commit(frame, timestamp)
+
+    def commit(self, frame, timestamp=None):
+        """Publica el frame escrito en el buffer de begin_write()"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        seq = self._seq + 1
+        index = seq % self.capacity
+        slot = self._frames[index]
+
+        if frame.shape[:2] != (self.height, self.width):
+            cv2.resize(frame, (self.width, self.height), dst=slot, interpolation=cv2.INTER_AREA)
+        elif not np.shares_memory(frame, slot):
+            np.copyto(slot, frame)
+
+        with self._cond:
+            self._seqs[index] = seq
+            self._timestamps[index] = timestamp
+            self._jpegs[index] = None
+            self._decoded[id(slot)] = seq
+            self._seq = seq
+            self._cond.notify_all()
+        return seq
+
+    def write_jpeg(self, data, timestamp=None):
+        """Publica un frame comprimido sin decodificarlo"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.begin_write()
+        seq = self._seq + 1
+        index = seq % self.capacity
+        with self._cond:
+            self._seqs[index] = seq
+            self._timestamps[index] = timestamp
+            self._jpegs[index] = data
+            self._seq = seq
+            self._cond.notify_all()
+        return seq
+
+    def decode(self, slot, buffer=None):
+        """Asegura que el buffer del slot tiene los píxeles de su JPEG y devuelve el slot"""
+        if slot is None or slot.jpeg is None:
+            return slot
+        pinned = buffer is not None
+        buffer = slot.frame if buffer is None else buffer
+        with self._decode_lock:
+            if not pinned and not self.is_valid(slot):
+                # Ya hay otro frame en el slot: no se pisan sus píxeles (is_valid() fallará al consumidor)
+                return slot
+            if self._decoded.get(id(buffer)) != slot.seq:
+                frame = cv2.imdecode(np.frombuffer(slot.jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    raise ValueError(f"JPEG no válido en el frame {slot.seq}")
+                if frame.shape[:2] != (self.height, self.width):
+                    cv2.resize(frame, (self.width, self.height), dst=buffer, interpolation=cv2.INTER_AREA)
+                else:
+                    np.copyto(buffer, frame)
+                self._decoded[id(buffer)] = slot.seq
+                self.decoded_frames += 1
+        return slot
+
+    def _slot(self, seq):
+        index = seq % self.capacity
+        if seq <= 0 or self._seqs[index] != seq:
+            return None
+        return FrameSlot(seq, self._timestamps[index], self._frames[index], self._jpegs[index])
+
+    def _wait(self, after_seq, timeout):
+        return self._cond.wait_for(lambda: self._seq > after_seq or self._closed, timeout) and not self._closed
+
+    def pin_latest(self):
+        """Fija el último frame y devuelve un FrameRef de solo lectura (o None)"""
+        return self.pin(self._seq)
+
+    def pin(self, seq):
+        """Fija el frame con esa secuencia si sigue en el anillo (o devuelve None)"""
+        with self._cond:
+            slot = self._slot(seq)
+            if slot is None:
+                return None
+            buffer = self._frames[slot.seq % self.capacity]
+            self._pins[id(buffer)] = self._pins.get(id(buffer), 0) + 1
+        # Ya fijado: la captura no reutiliza este buffer mientras se decodifica
+        frame_ref = FrameRef(slot.seq, slot.timestamp, buffer, self)
+        try:
+            self.decode(slot, buffer)
+        except Exception:
+            frame_ref.release()
+            raise
+        return frame_ref
+
+    def _unpin(self, buffer):
+        with self._cond:
+            count = self._pins.pop(id(buffer)) - 1
+            if count:
+                self._pins[id(buffer)] = count
+            elif not any(frame is buffer for frame in self._frames):
+                # Ya fue sustituido en el anillo: vuelve al pool
+                self._decoded.pop(id(buffer), None)
+                self.pool.release(buffer)
+
+    def latest(self, decode=True):
+        """Último frame disponible, o None si aún no se ha capturado ninguno"""
+        with self._cond:
+            slot = self._slot(self._seq)
+        return self.decode(slot) if decode else slot
+
+    def wait_latest(self, after_seq, timeout=None, decode=True):
+        """Espera un frame posterior a after_seq y devuelve el más reciente"""
+        with self._cond:
+            if not self._wait(after_seq, timeout):
+                return None
+            slot = self._slot(self._seq)
+        return self.decode(slot) if decode else slot
+
+    def wait_next(self, after_seq, timeout=None, decode=True):
+        """Espera y devuelve el frame siguiente a after_seq.
+
+        Si el consumidor se atrasó más que la capacidad del buffer, salta al
+        frame más antiguo que todavía no está a punto de sobreescribirse.
+        """
+        with self._cond:
+            if not self._wait(after_seq, timeout):
+                return None
+            oldest = max(1, self._seq - self.capacity + 2)
+            slot = self._slot(max(after_seq + 1, oldest))
+        return self.decode(slot) if decode else slot
+
+    def is_valid(self, slot):
+        """Indica si el slot sigue conteniendo el frame con esa secuencia"""
+        return self._seqs[slot.seq % self.capacity] == slot.seq
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,126 @@
+import math
+import subprocess
+
+CFR = 'cfr'
+VFR = 'vfr'
+
+
+_fps_mode_supported = None
+
+
+def ffmpeg_supports_fps_mode():
+    """Indica si el ffmpeg instalado entiende -fps_mode (desde 5.1; antes solo -vsync)"""
+    global _fps_mode_supported
+    if _fps_mode_supported is None:
+        try:
+            result = subprocess.run(['ffmpeg', '-hide_banner', '-h', 'long'],
+                                    capture_output=True, text=True, timeout=10)
+            _fps_mode_supported = '-fps_mode' in result.stdout
+        except (OSError, subprocess.SubprocessError):
+            _fps_mode_supported = False
+    return _fps_mode_supported
+
+
+class FramePacer:
+    """Ajusta los frames capturados a una tasa constante según su timestamp de captura.
+
+    push() indica cuántas veces hay que escribir el frame anterior antes del
+    actual (para rellenar huecos) o si el actual sobra y se descarta. También
+    lleva las estadísticas de la grabación: fps real de captura y jitter.
+    Con origin (cfr) el t=0 del video es ese instante y no el primer frame:
+    el primer frame se repite para cubrir lo que tarde en llegar.
+    """
+
+    def __init__(self, target_fps=24, mode=CFR, origin=None):
+        if mode not in (CFR, VFR):
+            raise ValueError(f"Modo de fps no válido: {mode}")
+        self.target_fps = target_fps
+        self.mode = mode
+        self._origin = origin
+        self._first = None
+        self._last = None
+        self._written = 0
+        self.frames_in = 0
+        self.duplicated = 0
+        self.dropped = 0
+        # Media y varianza en línea (Welford) de los intervalos entre capturas
+        self._intervals = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._max_interval = 0.0
+
+    @property
+    def origin(self):
+        """El t=0 del video: origin o, si no se indicó, el primer frame (None si aún no hay frames)"""
+        return self._first if self._origin is None else self._origin
+
+    def push(self, timestamp):
+        """Registra un frame y devuelve (repeticiones_del_anterior, escribir_actual)"""
+        self.frames_in += 1
+        if self._first is None:
+            self._first = self._last = timestamp
+            if self._origin is None or self.mode == VFR:
+                self._written = 1
+                return 0, True
+            # Repeticiones del propio primer frame desde origin
+            self._written = max(1, int(round((timestamp - self._origin) * self.target_fps)) + 1)
+            self.duplicated += self._written - 1
+            return self._written - 1, True
+
+        interval = timestamp - self._last
+        self._last = timestamp
+        self._intervals += 1
+        delta = interval - self._mean
+        self._mean += delta / self._intervals
+        self._m2 += delta * (interval - self._mean)
+        self._max_interval = max(self._max_interval, interval)
+
+        if self.mode == VFR:
+            # Se escriben todos: cada uno lleva su timestamp de captura (ver mkv_stream)
+            self._written += 1
+            return 0, True
+
+        # Frames de salida que deberían existir hasta este instante
+        due = int(round((timestamp - self.origin) * self.target_fps)) + 1
+        if due <= self._written:
+            self.dropped += 1
+            return 0, False
+        repeats = due - self._written - 1
+        self.duplicated += repeats
+        self._written = due
+        return repeats, True
+
+    def ffmpeg_input_args(self, resolution):
+        """Opciones de entrada de ffmpeg según el modo.
+
+        cfr: frames BGR24 crudos, numerados a la tasa objetivo. vfr: Matroska
+        (MatroskaFrameWriter), que lleva tamaño, formato y timestamp de cada frame.
+        """
+        if self.mode == VFR:
+            return ['-f', 'matroska']
+        return ['-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', resolution, '-r', str(self.target_fps)]
+
+    def ffmpeg_output_args(self):
+        if self.mode == VFR:
+            # -vsync está obsoleto en los ffmpeg nuevos, pero es lo único que entienden los anteriores a 5.1
+            fps_mode = ['-fps_mode', 'vfr'] if ffmpeg_supports_fps_mode() else ['-vsync', 'vfr']
+            # Sin base de tiempo en ms el codificador redondea los timestamps a la tasa que adivina
+            return fps_mode + ['-enc_time_base:v', '1:1000']
+        return []
+
+    def stats(self):
+        duration = (self._last - self._first) if self._first is not None else 0.0
+        jitter = math.sqrt(self._m2 / self._intervals) if self._intervals > 1 else 0.0
+        return {
+            "mode": self.mode,
+            "target_fps": self.target_fps,
+            "duration_s": round(duration, 3),
+            "frames_in": self.frames_in,
+            "frames_out": self._written,
+            "duplicated": self.duplicated,
+            "dropped": self.dropped,
+            "capture_fps": round(self._intervals / duration, 2) if duration > 0 else 0.0,
+            "mean_interval_ms": round(self._mean * 1000, 2),
+            "jitter_ms": round(jitter * 1000, 2),
+            "max_interval_ms": round(self._max_interval * 1000, 2),
+        }
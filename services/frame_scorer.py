@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Resolución a la que se puntúa: suficiente para distinguir desenfoque y ~20x menos píxeles
+SCORE_WIDTH = 160
+SCORE_HEIGHT = 120
+# Píxeles por debajo/encima de estos valores se consideran sub/sobreexpuestos
+DARK_LEVEL = 16
+BRIGHT_LEVEL = 240
+
+
+def score_frame(frame):
+    """Devuelve (puntuación, nitidez, brillo medio, fracción de píxeles saturados).
+
+    La nitidez es la varianza del laplaciano sobre el frame reducido en gris; se
+    penaliza con la fracción de píxeles quemados o negros.
+    """
+    small = cv2.resize(frame, (SCORE_WIDTH, SCORE_HEIGHT), interpolation=cv2.INTER_AREA)
+    return score_gray(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+
+
+def score_jpeg(data):
+    """Igual que score_frame pero desde el JPEG: se decodifica a 1/4 y en gris, sin pasar por BGR"""
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if gray is None:
+        return 0.0, 0.0, 0.0, 1.0  # JPEG corrupto: nunca será el mejor frame
+    if gray.shape != (SCORE_HEIGHT, SCORE_WIDTH):
+        gray = cv2.resize(gray, (SCORE_WIDTH, SCORE_HEIGHT), interpolation=cv2.INTER_AREA)
+    return score_gray(gray)
+
+
+def score_gray(gray):
+    _, stddev = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S, ksize=3))
+    sharpness = float(stddev[0, 0]) ** 2
+    brightness = float(cv2.mean(gray)[0])
+    clipped = (cv2.countNonZero(cv2.inRange(gray, 0, DARK_LEVEL)) +
+               cv2.countNonZero(cv2.inRange(gray, BRIGHT_LEVEL, 255))) / gray.size
+    return sharpness * (1.0 - clipped), sharpness, brightness, clipped
+
+
+class FrameScorer:
+    """Puntúa en su propio hilo cada frame que entra en el buffer.
+
+    Así, al capturar en modo "mejor frame" las puntuaciones ya están calculadas
+    y solo hay que elegir la más alta entre los últimos frames del anillo.
+    """
+
+    def __init__(self, frame_buffer):
+        self.frame_buffer = frame_buffer
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.frames_scored = 0
+        self.frames_skipped = 0
+        self.avg_cost_ms = 0.0
+        self.max_cost_ms = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='frame-scorer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        last_seq = 0
+        while True:
+            slot = self.frame_buffer.wait_next(last_seq, timeout=1.0, decode=False)
+            if slot is None:
+                continue
+            if slot.seq > last_seq + 1:
+                # Si el hilo se atrasa se saltan frames en vez de frenar la captura
+                self.frames_skipped += slot.seq - last_seq - 1
+            last_seq = slot.seq
+
+            start = time.perf_counter()
+            score = score_jpeg(slot.jpeg) if slot.jpeg is not None else score_frame(slot.frame)
+            cost_ms = (time.perf_counter() - start) * 1000
+            if not self.frame_buffer.is_valid(slot):
+                continue  # se sobreescribió mientras se puntuaba
+
+            with self._lock:
+                self._scores[slot.seq] = score
+                while len(self._scores) > self.frame_buffer.capacity:
+                    self._scores.popitem(last=False)
+                self.frames_scored += 1
+                self.avg_cost_ms = cost_ms if self.frames_scored == 1 else self.avg_cost_ms * 0.95 + cost_ms * 0.05
+                self.max_cost_ms = max(self.max_cost_ms, cost_ms)
+
+    def pin_best(self, window):
+        """Fija el frame mejor puntuado entre los últimos window frames.
+
+        Devuelve (FrameRef, puntuación) o (None, None) si no hay ninguno puntuado.
+        """
+        newest = self.frame_buffer.seq
+        with self._lock:
+            candidates = sorted(((score, seq) for seq, score in self._scores.items()
+                                 if seq > newest - window), reverse=True)
+        for score, seq in candidates:
+            frame_ref = self.frame_buffer.pin(seq)
+            if frame_ref is not None:
+                return frame_ref, score
+        return None, None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "frames_scored": self.frames_scored,
+                "frames_skipped": self.frames_skipped,
+                "avg_cost_ms": round(self.avg_cost_ms, 3),
+                "max_cost_ms": round(self.max_cost_ms, 3),
+                "score_resolution": f"{SCORE_WIDTH}x{SCORE_HEIGHT}",
+            }
@@ -0,0 +1,322 @@
+import os
+import time
+
+os.environ["OPENCV_LOG_LEVEL"] = "ERROR"
+import cv2
+import numpy as np
+
+from services.mjpeg import iter_jpeg_frames
+
+_capture_device = False  # Variable global para almacenar el dispositivo de captura
+
+def find_capture_device():
+    global _capture_device
+    if _capture_device is not False:
+        print("⚠️ Dispositivo de captura ya inicializado. Reutilizando...", flush=True)
+        return _capture_device
+
+    for i in range(4):
+        cap = cv2.VideoCapture(i, cv2.CAP_V4L2)
+        if cap.isOpened():
+            print(f"Dispositivo de video encontrado en /dev/video{i}", flush=True)
+            _capture_device = True  # Almacena el dispositivo para reutilizarlo
+            return cap
+    raise RuntimeError("No se encontró una capturadora de video disponible.")
+
+
+def warmup_camera(cap, warmup_frames=60, stable_frames=5, tolerance=2.0):
+    """Lee frames hasta que la imagen se estabiliza (o hasta warmup_frames como máximo).
+
+    Se considera estable cuando stable_frames frames válidos seguidos tienen un
+    brillo medio que no varía más de tolerance niveles: la exposición
+    automática ya se asentó. read() bloquea al ritmo de la cámara, no hace
+    falta dormir entre lecturas.
+    """
+    print("⏳ Esperando a que la cámara se estabilice...", flush=True)
+    start = time.monotonic()
+    previous = None
+    stable = 0
+    for i in range(warmup_frames):
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            previous, stable = None, 0
+            continue
+        small = cv2.resize(frame, (80, 60), interpolation=cv2.INTER_AREA)
+        brightness = float(cv2.mean(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))[0])
+        if previous is not None and abs(brightness - previous) <= tolerance:
+            stable += 1
+        else:
+            stable = 0
+        previous = brightness
+        if stable >= stable_frames:
+            print(f"✅ Cámara estabilizada en {i + 1} frames ({time.monotonic() - start:.2f}s)", flush=True)
+            return i + 1
+    print(f"⚠️ La cámara no se estabilizó en {warmup_frames} frames ({time.monotonic() - start:.2f}s)", flush=True)
+    return warmup_frames
+
+
+class FrameSource:
+    """Interfaz común de las fuentes de frames BGR.
+
+    Las fuentes que no son una cámara real respetan el fps configurado para
+    simular el ritmo de captura; con fps=0 entregan frames tan rápido como
+    puedan, útil para medir el rendimiento del pipeline.
+    """
+
+    name = 'base'
+    # True si la fuente entrega JPEG (read_jpeg) y los píxeles se decodifican solo cuando hacen falta
+    compressed = False
+
+    def __init__(self, width=640, height=480, fps=30):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self._next_deadline = None
+
+    def open(self):
+        raise NotImplementedError
+
+    def is_opened(self):
+        raise NotImplementedError
+
+    def read(self, out=None):
+        """Devuelve (ret, frame) igual que cv2.VideoCapture.read().
+
+        Si se pasa out y el tamaño coincide, el frame se escribe en ese buffer
+        en lugar de reservar uno nuevo.
+        """
+        raise NotImplementedError
+
+    def read_jpeg(self):
+        """Devuelve (ret, bytes) con el frame comprimido tal como lo entrega la fuente"""
+        raise NotImplementedError
+
+    def _decode_into(self, data, out=None):
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            return False, None
+        if frame.shape[:2] != (self.height, self.width):
+            return True, cv2.resize(frame, (self.width, self.height), dst=out, interpolation=cv2.INTER_AREA)
+        if out is not None and out.shape == frame.shape:
+            np.copyto(out, frame)
+            return True, out
+        return True, frame
+
+    def release(self):
+        pass
+
+    def _pace(self):
+        # Duerme hasta el instante del siguiente frame según el fps
+        if not self.fps:
+            return
+        interval = 1.0 / self.fps
+        now = time.monotonic()
+        if self._next_deadline is None or now - self._next_deadline > interval:
+            self._next_deadline = now
+        elif self._next_deadline > now:
+            time.sleep(self._next_deadline - now)
+        self._next_deadline += interval
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.width}x{self.height}@{self.fps}>"
+
+
+class V4L2FrameSource(FrameSource):
+    """Capturadora de video real por V4L2 (/dev/video0-3).
+
+    Con mjpeg=True se pide MJPG a la capturadora y se desactiva la conversión
+    a BGR de OpenCV: read_jpeg() entrega el JPEG de la cámara sin decodificar.
+    Si el dispositivo no acepta MJPG a la resolución pedida se sigue en BGR.
+    """
+
+    name = 'v4l2'
+
+    def __init__(self, width=640, height=480, fps=None, warmup_frames=60, mjpeg=False):
+        super().__init__(width, height, fps)
+        self.warmup_frames = warmup_frames
+        self.mjpeg = mjpeg
+        self.cap = None
+
+    def open(self):
+        self.cap = find_capture_device()
+        if self.mjpeg:
+            # El formato se pide antes que la resolución: algunos dispositivos solo dan 640x480 en MJPG
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        if self.fps:
+            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
+        # El calentamiento mide el brillo: todavía con frames decodificados
+        warmup_camera(self.cap, self.warmup_frames)
+        if self.mjpeg:
+            self.compressed = self._enable_passthrough()
+        return self
+
+    def _enable_passthrough(self):
+        fourcc = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if fourcc != cv2.VideoWriter_fourcc(*'MJPG') or size != (self.width, self.height):
+            print(f"⚠️ La capturadora no entrega MJPG a {self.width}x{self.height}; se captura en BGR", flush=True)
+            return False
+        if not self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+            print("⚠️ No se pudo desactivar la conversión a BGR; se captura en BGR", flush=True)
+            return False
+        print("✅ Captura MJPEG sin decodificar", flush=True)
+        return True
+
+    def is_opened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read_jpeg(self):
+        ret, data = self.cap.read()
+        if not ret or data is None:
+            return False, None
+        return True, data.tobytes()
+
+    def read(self, out=None):
+        # La cámara marca el ritmo: read() bloquea hasta el siguiente frame
+        if self.compressed:
+            ret, data = self.read_jpeg()
+            return self._decode_into(data, out) if ret else (False, None)
+        return self.cap.read(out)
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class VideoFileFrameSource(FrameSource):
+    """Reproduce un archivo de video en bucle como si fuera la cámara"""
+
+    name = 'file'
+
+    def __init__(self, path, width=640, height=480, fps=None, loop=True):
+        super().__init__(width, height, fps)
+        self.path = path
+        self.loop = loop
+        self.cap = None
+
+    def open(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"No existe el archivo de video: {self.path}")
+        self.cap = cv2.VideoCapture(self.path)
+        if self.fps is None:
+            self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+        return self
+
+    def is_opened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self, out=None):
+        self._pace()
+        ret, frame = self.cap.read(out)
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(out)
+        if ret and frame.shape[:2] != (self.height, self.width):
+            frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        return ret, frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class MjpegFileFrameSource(FrameSource):
+    """Reproduce en bucle un archivo MJPEG crudo (grabado de la capturadora) como si fuera la cámara MJPEG"""
+
+    name = 'mjpeg'
+    compressed = True
+
+    def __init__(self, path, width=640, height=480, fps=30, loop=True):
+        super().__init__(width, height, fps)
+        self.path = path
+        self.loop = loop
+        self._frames = None
+
+    def open(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"No existe el archivo MJPEG: {self.path}")
+        self._frames = iter_jpeg_frames(self.path)
+        return self
+
+    def is_opened(self):
+        return self._frames is not None
+
+    def read_jpeg(self):
+        self._pace()
+        data = next(self._frames, None)
+        if data is None and self.loop:
+            self._frames = iter_jpeg_frames(self.path)
+            data = next(self._frames, None)
+        return data is not None, data
+
+    def read(self, out=None):
+        ret, data = self.read_jpeg()
+        return self._decode_into(data, out) if ret else (False, None)
+
+    def release(self):
+        self._frames = None
+
+
+class SyntheticFrameSource(FrameSource):
+    """Patrón sintético (barras de color, barra móvil y contador) sin hardware"""
+
+    name = 'synthetic'
+
+    def __init__(self, width=640, height=480, fps=30):
+        super().__init__(width, height, fps)
+        self._background = None
+        self._count = 0
+
+    def open(self):
+        colors = np.array([
+            (255, 255, 255), (0, 255, 255), (255, 255, 0), (0, 255, 0),
+            (255, 0, 255), (0, 0, 255), (255, 0, 0), (0, 0, 0),
+        ], dtype=np.uint8)
+        bars = np.repeat(colors, -(-self.width // len(colors)), axis=0)[:self.width]
+        self._background = np.ascontiguousarray(np.broadcast_to(bars, (self.height, self.width, 3)))
+        self._count = 0
+        return self
+
+    def is_opened(self):
+        return self._background is not None
+
+    def read(self, out=None):
+        self._pace()
+        if out is not None and out.shape == self._background.shape:
+            frame = out
+            np.copyto(frame, self._background)
+        else:
+            frame = self._background.copy()
+        x = (self._count * 8) % self.width
+        frame[:, x:x + 16] = 128
+        cv2.putText(frame, str(self._count), (20, self.height - 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+        self._count += 1
+        return True, frame
+
+    def release(self):
+        self._background = None
+
+
+def create_frame_source(spec=None, width=640, height=480, fps=None):
+    """Crea una fuente a partir de una especificación tipo 'v4l2', 'synthetic', 'file:/ruta.mp4'
+    o 'mjpeg:/ruta.mjpeg'.
+
+    Sin especificación se usa la variable de entorno FRAME_SOURCE (por defecto v4l2).
+    Con CAPTURE_MJPEG=1 la capturadora V4L2 entrega MJPEG sin decodificar.
+    """
+    spec = spec or os.getenv("FRAME_SOURCE", "v4l2")
+    if fps is None and os.getenv("FRAME_FPS"):
+        fps = float(os.getenv("FRAME_FPS"))
+
+    if spec == 'v4l2':
+        return V4L2FrameSource(width, height, fps, mjpeg=os.getenv("CAPTURE_MJPEG", "0") == "1")
+    if spec == 'synthetic':
+        return SyntheticFrameSource(width, height, 30 if fps is None else fps)
+    if spec.startswith('file:'):
+        return VideoFileFrameSource(spec[len('file:'):], width, height, fps)
+    if spec.startswith('mjpeg:'):
+        return MjpegFileFrameSource(spec[len('mjpeg:'):], width, height, 30 if fps is None else fps)
+    raise ValueError(f"Fuente de frames desconocida: {spec}")
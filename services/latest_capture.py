@@ -0,0 +1,89 @@
+import threading
+import time
+
+from services import events
+
+
+class Capture:
+    """Última foto capturada: metadatos y JPEG en claro, solo en memoria"""
+
+    __slots__ = ('seq', 'etag', 'folder', 'filename', 'timestamp', 'data')
+
+    def __init__(self, seq, etag, folder, filename, timestamp, data):
+        self.seq = seq
+        self.etag = etag
+        self.folder = folder
+        self.filename = filename
+        self.timestamp = timestamp
+        self.data = data
+
+    def metadata(self):
+        return {
+            "seq": self.seq,
+            "etag": self.etag,
+            "folder": self.folder,
+            "filename": self.filename,
+            "timestamp": self.timestamp,
+            "size": len(self.data),
+        }
+
+
+class LatestCapture:
+    """Publica la última captura para que los clientes no tengan que buscarla en disco.
+
+    Cada captura tiene un número de secuencia (cursor 'since') y un ETag que
+    incluye un identificador de arranque, así un ETag de antes de reiniciar
+    nunca coincide con uno nuevo.
+    """
+
+    def __init__(self):
+        self._boot = f"{int(time.time() * 1000):x}"
+        self._seq = 0
+        self._latest = None
+        self._cond = threading.Condition()
+
+    def publish(self, folder, filename, data, timestamp=None):
+        with self._cond:
+            self._seq += 1
+            capture = Capture(self._seq, f"{self._boot}-{self._seq}", folder, filename,
+                              timestamp or time.time(), bytes(data))
+            self._latest = capture
+            self._cond.notify_all()
+        events.publish('capture', capture)
+        return capture
+
+    def latest(self):
+        with self._cond:
+            return self._latest
+
+    def find(self, etag):
+        """Convierte un ETag en cursor (0 si no es de este arranque)"""
+        if etag and etag.startswith(self._boot + '-'):
+            try:
+                return int(etag[len(self._boot) + 1:])
+            except ValueError:
+                pass
+        return 0
+
+    def wait_newer(self, since=0, timeout=None):
+        """Espera una captura con seq > since; devuelve None si vence el tiempo"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._latest is not None and self._latest.seq > since, timeout)
+            if self._latest is not None and self._latest.seq > since:
+                return self._latest
+            return None
+
+    def clear(self):
+        """Olvida la última captura al empezar otra sesión: no debe mostrarse la del paciente anterior"""
+        with self._cond:
+            self._latest = None
+
+    def forget(self, folder, filename):
+        """Olvida la captura si se borró el archivo"""
+        with self._cond:
+            if self._latest is not None and (self._latest.folder, self._latest.filename) == (folder, filename):
+                self._latest = None
+
+
+# Compartido entre el manejador que captura y las rutas de la galería
+latest_capture = LatestCapture()
@@ -0,0 +1,114 @@
+import json
+import os
+import queue
+import threading
+import time
+
+from vosk import KaldiRecognizer
+
+from services import events
+
+
+class LiveTranscriber:
+    """Transcribe el audio mientras se graba.
+
+    El hilo de grabación entrega cada bloque con feed() y un hilo propio lo pasa
+    al reconocedor. Los resultados parciales y finales se publican en el bus de
+    eventos ('transcription') y cada frase final se añade al archivo de
+    transcripción en cuanto se reconoce, así que al parar solo falta el último
+    fragmento.
+    """
+
+    def __init__(self, model, rate, transcript_path, max_pending=2000):
+        self.model = model
+        self.rate = rate
+        self.transcript_path = transcript_path
+        self.source = os.path.basename(transcript_path)
+        self.folder = os.path.basename(os.path.dirname(transcript_path))
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._segments = []
+        self._last_partial = ""
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='live-transcriber', daemon=True)
+        self._thread.start()
+
+    @property
+    def text(self):
+        return " ".join(self._segments)
+
+    @property
+    def complete(self):
+        """True si ya se procesó todo el audio y no se descartó ningún bloque"""
+        return not self._thread.is_alive() and self.dropped == 0
+
+    def feed(self, data):
+        """Entrega un bloque PCM; nunca bloquea al hilo que graba"""
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            # El reconocedor va muy atrasado: el WAV sigue completo y se puede retranscribir
+            self.dropped += 1
+
+    def finish(self, timeout=5.0):
+        """Cierra la entrada y espera (como mucho timeout) a que termine el reconocimiento.
+
+        Si el reconocedor va tan atrasado que la marca de fin no cabe en la cola
+        a tiempo, se descartan los bloques más antiguos para hacerle sitio: parar
+        la grabación nunca se queda colgado.
+        """
+        start = time.monotonic()
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(None)
+                    break
+                except queue.Full:
+                    continue
+        if timeout is not None:
+            timeout = max(0.0, timeout - (time.monotonic() - start))
+        self._thread.join(timeout)
+        return self.text
+
+    def _publish(self, kind, text):
+        events.publish('transcription', {
+            "type": kind,
+            "text": text,
+            "folder": self.folder,
+            "file": self.source,
+        })
+
+    def _append(self, text):
+        self._segments.append(text)
+        with open(self.transcript_path, 'a', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"🗣️ Fragmento reconocido: \"{text}\"", flush=True)
+        self._publish('final', text)
+
+    def _run(self):
+        recognizer = KaldiRecognizer(self.model, self.rate)
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if recognizer.AcceptWaveform(data):
+                text = json.loads(recognizer.Result()).get("text", "").strip()
+                self._last_partial = ""
+                if text:
+                    self._append(text)
+            else:
+                partial = json.loads(recognizer.PartialResult()).get("partial", "").strip()
+                if partial and partial != self._last_partial:
+                    self._last_partial = partial
+                    self._publish('partial', partial)
+
+        text = json.loads(recognizer.FinalResult()).get("text", "").strip()
+        if text:
+            self._append(text)
+        print(f"✅ Transcripción en vivo terminada: {len(self._segments)} fragmentos", flush=True)
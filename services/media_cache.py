@@ -0,0 +1,146 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class CachedMedia:
+    """Contenido descifrado en memoria con la misma interfaz de lectura que los .enc.
+
+    Hay que llamar a release() cuando se termine de usar, para que la caché
+    pueda borrar (y poner a cero) el buffer si se expulsa mientras se sirve.
+    """
+
+    def __init__(self, key, data):
+        self.key = key
+        self.data = data
+        self.size = len(data)
+        self.readers = 0
+        self.evicted = False
+        self._cache = None
+
+    def iter_range(self, start=0, end=None):
+        if end is None or end > self.size:
+            end = self.size
+        if start < end:
+            yield memoryview(self.data)[start:end]
+
+    def read_range(self, start, length):
+        return bytes(self.data[start:start + length])
+
+    def release(self):
+        if self._cache is not None:
+            self._cache._release(self)
+
+
+class DecryptedMediaCache:
+    """Caché LRU de archivos descifrados con un presupuesto de memoria en bytes.
+
+    La clave incluye mtime y tamaño del .enc, así que un archivo reescrito no
+    devuelve datos viejos. Con zero_on_evict los buffers expulsados se
+    sobreescriben con ceros antes de soltarlos.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_item_bytes=8 * 1024 * 1024, zero_on_evict=False):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.zero_on_evict = zero_on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def fits(self, path):
+        """Indica si merece la pena cachear el archivo (los videos grandes van por rangos)"""
+        return os.path.getsize(path) <= self.max_item_bytes
+
+    def acquire(self, path, loader):
+        """Devuelve un CachedMedia del archivo; loader(path) lo descifra si no está en caché"""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                entry.readers += 1
+                return entry
+            self.misses += 1
+
+        entry = CachedMedia(key, loader(path))
+        entry._cache = self
+        entry.readers = 1
+        if entry.size > self.max_item_bytes:
+            # No cabe en la caché: se usa una vez y se suelta
+            entry.evicted = True
+            return entry
+
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                # Otro hilo lo descifró a la vez: se usa el que ya está cacheado
+                existing.readers += 1
+                entry.readers = 0
+                self._discard(entry)
+                return existing
+            # Versiones anteriores del mismo archivo ya no sirven
+            for old_key in [k for k in self._entries if k[0] == key[0]]:
+                self._evict(old_key)
+            self._entries[key] = entry
+            self.current_bytes += entry.size
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                self._evict(next(iter(self._entries)))
+        return entry
+
+    def invalidate(self, path):
+        """Expulsa cualquier versión cacheada del archivo (por ejemplo al borrarlo)"""
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                self._evict(key)
+
+    def _evict(self, key):
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+        self.evictions += 1
+        entry.evicted = True
+        if entry.readers == 0:
+            self._discard(entry)
+
+    def _release(self, entry):
+        with self._lock:
+            entry.readers -= 1
+            if entry.evicted and entry.readers == 0:
+                self._discard(entry)
+
+    def _discard(self, entry):
+        if self.zero_on_evict and entry.data is not None and entry.size:
+            np.frombuffer(entry.data, dtype=np.uint8)[:] = 0
+        entry.data = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "max_item_bytes": self.max_item_bytes,
+                "zero_on_evict": self.zero_on_evict,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Caché compartida por todas las rutas que sirven multimedia descifrada
+media_cache = DecryptedMediaCache(
+    max_bytes=int(os.getenv("MEDIA_CACHE_MB", "64")) * 1024 * 1024,
+    max_item_bytes=int(os.getenv("MEDIA_CACHE_ITEM_MB", "8")) * 1024 * 1024,
+    zero_on_evict=os.getenv("MEDIA_CACHE_ZERO_ON_EVICT", "0") == "1",
+)
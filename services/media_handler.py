@@ -4,7 +4,6 @@ import threading
 import subprocess
 import wave
 import json
-import queue
 import pyaudio
 os.environ["OPENCV_LOG_LEVEL"] = "ERROR"
 import cv2
@@ -12,64 +11,121 @@ from cryptography.fernet import Fernet
 from vosk import Model, KaldiRecognizer
 from dotenv import load_dotenv
 import tempfile
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from services import readiness
+from services.av_sync import AudioPipeWriter
+from services.catalog import mark_dirty
+from services.crypto_container import ChunkedCipher, LegacyFernetReader, is_chunked_file
+from services.frame_broadcaster import FrameBroadcaster
+from services.frame_buffer import FrameRingBuffer
+from services.frame_scorer import FrameScorer
+from services.frame_source import create_frame_source
+from services.latest_capture import latest_capture
+from services.live_transcriber import LiveTranscriber
+from services.media_cache import media_cache
+from services.thumbnailer import Thumbnailer
+from services.frame_pacer import FramePacer, CFR, VFR
+from services.mkv_stream import MatroskaFrameWriter
+from services.snapshot_writer import SnapshotWriter
+from services.record_queue import RecordQueue, DROP_OLDEST
 
 load_dotenv()
 
-_capture_device = False  # Variable global para almacenar el dispositivo de captura
-
-def find_capture_device():
-    global _capture_device
-    if _capture_device is not False:
-        print("⚠️ Dispositivo de captura ya inicializado. Reutilizando...", flush=True)
-        return _capture_device
-
-    for i in range(4):
-        cap = cv2.VideoCapture(i, cv2.CAP_V4L2)
-        if cap.isOpened():
-            print(f"Dispositivo de video encontrado en /dev/video{i}", flush=True)
-            _capture_device = True  # Almacena el dispositivo para reutilizarlo
-            return cap
-    raise RuntimeError("No se encontró una capturadora de video disponible.")
-
-
-def warmup_camera(cap, warmup_frames=60):  # prueba con 60
-    print("⏳ Esperando a que la cámara se estabilice...")
-    for i in range(warmup_frames):
-        ret, frame = cap.read()
-        if not ret:
-            print(f"Frame {i} no válido")
-        else:
-            print(f"Frame {i} OK")
-        time.sleep(0.1)  # más delay, le das más chance al driver
-    print("✅ Cámara estabilizada.")
-
+# Frecuencia del audio que va dentro del video (la misma que usa Vosk)
+AV_AUDIO_RATE = 16000
 
 class MediaHandler:
-    def __init__(self, base_folder, is_for_image=False):
+    def __init__(self, base_folder, is_for_image=False, frame_source=None):
         self.base_folder = base_folder
+        self.frame_source = None
         self.session_folder = None
         self.video_process = None
         self.audio_green_thread = None
         self.audio_stop_event = None
         self.audio_path = None
-        self.record_queue = queue.Queue()
-        self.stream_queue = queue.Queue(maxsize=10)
-        self.latest_frame = None
+        self.live_transcriber = None
+        self.live_transcription = os.getenv("LIVE_TRANSCRIPTION", "1") == "1"
+        # FRAME_BUFFER_SIZE frames recientes: también es la ventana máxima del modo "mejor frame"
+        self.frame_buffer = FrameRingBuffer(640, 480, capacity=int(os.getenv("FRAME_BUFFER_SIZE", "8")))
+        self.frame_scorer = FrameScorer(self.frame_buffer)
+        self.broadcaster = FrameBroadcaster(self.frame_buffer)
+        # Cola acotada hacia ffmpeg: solo acepta frames mientras se graba
+        self.record_queue = RecordQueue(
+            640, 480,
+            capacity=int(os.getenv("RECORD_QUEUE_SIZE", "48")),
+            policy=os.getenv("RECORD_DROP_POLICY", DROP_OLDEST),
+        )
+        # Tasa de la grabación: cfr duplica/descarta frames para clavar RECORD_FPS,
+        # vfr deja que ffmpeg use la marca de tiempo real de cada frame
+        self.record_fps = int(os.getenv("RECORD_FPS", "24"))
+        self.record_fps_mode = os.getenv("RECORD_FPS_MODE", CFR)
+        self.pacer = None
+        # Modo segmentado: archivos de RECORD_SEGMENT_SECONDS que se encriptan al cerrarse
+        self.segmented_recording = os.getenv("RECORDING_MODE", "single") == "segmented"
+        self.segment_seconds = int(os.getenv("RECORD_SEGMENT_SECONDS", "60"))
+        # RECORD_AUDIO=1 graba el micrófono como pista del mismo MP4 (una sola pasada de ffmpeg)
+        self.record_audio = os.getenv("RECORD_AUDIO", "0") == "1"
+        self.av_writer = None
 
         self.secret_key = os.getenv("SECRET_KEY")
         if not self.secret_key:
             raise ValueError("SECRET_KEY no está definida en el entorno.")
         self.cipher = Fernet(self.secret_key.encode())
-
-        model_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vosk-model-small-es-0.42"))
-        self.model = Model(model_path)
+        # Los archivos nuevos se cifran por bloques; Fernet queda para leer los antiguos
+        self.chunked_cipher = ChunkedCipher(self.secret_key)
+        # Miniaturas de fotos y pósters de videos, en segundo plano
+        self.thumbnailer = Thumbnailer(self)
+        # Fotos: se cifran y guardan fuera del hilo de la petición
+        self.snapshot_writer = SnapshotWriter(self.chunked_cipher, on_saved=self._snapshot_saved)
+        self._snapshot_lock = threading.Lock()
+        self._last_snapshot_name = None
+        self._snapshot_counter = 0
+        self.bursts = OrderedDict()
+
+        # El modelo Vosk se carga bajo demanda: el manejador de la galería nunca lo necesita
+        self.model_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "vosk-model-small-es-0.42"))
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.frame_source_ready = threading.Event()
 
         if not is_for_image:
-            self.cap = find_capture_device()
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            warmup_camera(self.cap)
-            print("✅ Dispositivo de captura de video inicializado correctamente", flush=True)
+            # Cámara y modelo arrancan en segundo plano para que Flask abra el puerto enseguida;
+            # /health/ready informa de cuándo terminan
+            readiness.run_stage('camera', lambda: self._init_frame_source(frame_source))
+            readiness.run_stage('vosk_model', self.load_model)
+
+    @property
+    def model(self):
+        """Modelo Vosk; si aún se está cargando en segundo plano, espera a que termine"""
+        with self._model_lock:
+            if self._model is None:
+                self._model = Model(self.model_path)
+            return self._model
+
+    def load_model(self):
+        return self.model
+
+    def _init_frame_source(self, frame_source=None):
+        # V4L2 por defecto; FRAME_SOURCE=synthetic o file:/ruta.mp4 para equipos sin capturadora
+        frame_source = frame_source or create_frame_source()
+        if self.frame_source is not None:
+            return  # ya se asignó otra fuente explícitamente mientras tanto
+        self.set_frame_source(frame_source)
+
+    def set_frame_source(self, frame_source):
+        """Cambia la fuente de frames (V4L2, archivo de video o patrón sintético)"""
+        if frame_source is self.frame_source:
+            return
+        if not frame_source.is_opened():
+            frame_source.open()
+        if self.frame_source is not None:
+            self.frame_source.release()
+        self.frame_source = frame_source
+        self.frame_source_ready.set()
+        print(f"✅ Fuente de video inicializada correctamente: {frame_source}", flush=True)
 
     def start_session(self,usuario=None):
         if usuario == None:
@@ -78,6 +134,9 @@ class MediaHandler:
         else:
             self.session_folder = os.path.join(self.base_folder, usuario+"_"+time.strftime("%Y%m%d-%H%M%S"))
         os.makedirs(self.session_folder, exist_ok=True)
+        # La sesión nueva pasa a ser la más reciente del catálogo y la última captura ya no vale
+        mark_dirty(self.session_folder)
+        latest_capture.clear()
         print(f"Carpeta de sesión creada: {self.session_folder}", flush=True)
 
     def start_audio_recording(self):
@@ -89,10 +148,18 @@ class MediaHandler:
         CHUNK = 1024
 
         # Preparamos ruta de salida
-        audio_filename = f"audio_{time.strftime('%Y%m%d-%H%M%S')}.wav"
+        timestamp = time.strftime('%Y%m%d-%H%M%S')
+        audio_filename = f"audio_{timestamp}.wav"
         self.audio_path = os.path.join(self.session_folder, audio_filename)
         print(f"🎙️ Archivo de audio: {self.audio_path}", flush=True)
 
+        # Transcripción en vivo: se reconoce mientras se graba y se va escribiendo
+        self.live_transcriber = None
+        if self.live_transcription:
+            transcript_path = os.path.join(self.session_folder, f"transcripcion_{timestamp}.txt")
+            self.live_transcriber = LiveTranscriber(self.model, RATE, transcript_path)
+        live_transcriber = self.live_transcriber
+
         audio_interface = pyaudio.PyAudio()
 
         try:
@@ -119,6 +186,8 @@ class MediaHandler:
                         try:
                             data = audio_stream.read(CHUNK, exception_on_overflow=False)
                             wf.writeframes(data)
+                            if live_transcriber is not None:
+                                live_transcriber.feed(data)
                         except Exception as e:
                             print(f"⚠️ Error leyendo audio: {e}", flush=True)
                             break
@@ -139,6 +208,9 @@ class MediaHandler:
         except Exception as e:
             print(f"❌ Error en start_audio_recording: {e}", flush=True)
             audio_interface.terminate()
+            if live_transcriber is not None:
+                live_transcriber.finish()
+                self.live_transcriber = None
 
 
     def stop_audio_recording(self):
@@ -150,30 +222,143 @@ class MediaHandler:
         else:
             print("⚠️ No hay hilo de audio activo o ya terminó", flush=True)
 
+    def finish_live_transcription(self, timeout=5.0):
+        """Cierra la transcripción en vivo: (texto, ruta del .txt, completa) o None si no había.
+
+        Solo queda por reconocer lo que el hilo no llegó a procesar, así que
+        normalmente termina enseguida; si vence timeout se devuelve lo que haya
+        y el resto se sigue añadiendo al archivo en segundo plano.
+        """
+        transcriber = self.live_transcriber
+        if transcriber is None:
+            return None
+        text = transcriber.finish(timeout)
+        return text, transcriber.transcript_path, transcriber.complete
+
+
+    def _watch_segments(self, list_path, done_event):
+        """Encripta cada segmento en cuanto ffmpeg lo cierra y lo apunta en la lista"""
+        folder = os.path.dirname(list_path)
+        processed = 0
+        while True:
+            finished = done_event.is_set()
+            lines = []
+            if os.path.exists(list_path):
+                with open(list_path, 'r', encoding='utf-8') as f:
+                    # Solo líneas completas: ffmpeg puede estar escribiendo la siguiente
+                    lines = [line for line in f.read().splitlines(keepends=True) if line.endswith('\n')]
+            for line in lines[processed:]:
+                segment_path = os.path.join(folder, os.path.basename(line.split(',')[0]))
+                try:
+                    encrypted_path = self.encrypt_file(segment_path)
+                    print(f"✅ Segmento encriptado: {os.path.basename(encrypted_path)}", flush=True)
+                    self.thumbnailer.submit_video(encrypted_path)
+                except Exception as e:
+                    print(f"❌ Error encriptando segmento {segment_path}: {e}", flush=True)
+            processed = len(lines)
+            if finished:
+                break
+            done_event.wait(0.5)
+
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+    def _start_av_audio(self, writer, transcriber, stop_event, rate, chunk):
+        """Abre el micrófono y entrega cada bloque, con su marca de tiempo, a la pista de audio del video"""
+        audio_interface = pyaudio.PyAudio()
+        try:
+            stream = audio_interface.open(format=pyaudio.paInt16, channels=1, rate=rate,
+                                          input=True, frames_per_buffer=chunk)
+        except Exception:
+            audio_interface.terminate()
+            raise
 
-    def record_video(self, recording_flag):
+        def capture():
+            try:
+                while not stop_event.is_set():
+                    data = stream.read(chunk, exception_on_overflow=False)
+                    writer.push(data, time.monotonic())
+                    if transcriber is not None:
+                        transcriber.feed(data)
+            except Exception as e:
+                # El escritor sigue rellenando con silencio: el video no se corta
+                print(f"⚠️ Error leyendo audio: {e}", flush=True)
+            finally:
+                stream.stop_stream()
+                stream.close()
+                audio_interface.terminate()
+
+        thread = threading.Thread(target=capture, name='av-mic', daemon=True)
+        thread.start()
+        return thread
+
+    def record_video(self, recording_flag, segmented=None, with_audio=None):
         print("🎥 Iniciando record_video()", flush=True)
-        width = 640
-        height = 480
+        width = self.frame_buffer.width
+        height = self.frame_buffer.height
         resolution = f"{width}x{height}"
-
-        video_filename = f"video_{time.strftime('%Y%m%d-%H%M%S')}.mp4"
-        video_path = os.path.join(self.session_folder, video_filename)
+        if segmented is None:
+            segmented = self.segmented_recording
+
+        base_name = f"video_{time.strftime('%Y%m%d-%H%M%S')}"
+        if segmented:
+            # Segmentos MP4 independientes: cada uno se puede reproducir en cuanto se cierra
+            video_path = os.path.join(self.session_folder, base_name + "_parte%03d.mp4")
+            list_path = os.path.join(self.session_folder, f".{base_name}_segmentos.csv")
+            output_args = [
+                '-force_key_frames', f'expr:gte(t,n_forced*{self.segment_seconds})',
+                '-f', 'segment',
+                '-segment_time', str(self.segment_seconds),
+                '-segment_format', 'mp4',
+                '-segment_format_options', 'movflags=+faststart',
+                '-reset_timestamps', '1',
+                '-segment_list', list_path,
+                '-segment_list_type', 'csv',
+            ]
+        else:
+            video_path = os.path.join(self.session_folder, base_name + ".mp4")
+            output_args = ['-movflags', '+faststart']
         print(f"🎥 Archivo de video: {video_path}", flush=True)
 
+        if with_audio is None:
+            with_audio = self.record_audio
+
+        # Pista de audio en el mismo ffmpeg: PCM por una tubería aparte (pipe:N)
+        audio_input_args, audio_output_args, pass_fds = [], [], ()
+        audio_read_fd = audio_writer = None
+        if with_audio:
+            audio_read_fd, audio_write_fd = os.pipe()
+            # El escritor empieza a mandar silencio ya: su creación es el t=0 de ambas pistas
+            audio_writer = AudioPipeWriter(audio_write_fd, rate=AV_AUDIO_RATE)
+            # PCM crudo: no hay nada que analizar, ffmpeg no debe esperar a acumular datos
+            audio_input_args = ['-thread_queue_size', '512', '-probesize', '32', '-analyzeduration', '0',
+                                '-f', 's16le', '-ar', str(AV_AUDIO_RATE), '-ac', '1', '-i', f'pipe:{audio_read_fd}']
+            audio_output_args = ['-c:a', 'aac', '-b:a', '96k']
+            pass_fds = (audio_read_fd,)
+        self.av_writer = audio_writer
+
+        # Ajusta el ritmo de captura a la tasa del video usando los timestamps.
+        # Con audio se fuerza cfr: la posición de cada frame y de cada muestra
+        # sale del mismo reloj, sin depender de las marcas de tiempo de ffmpeg
+        if audio_writer is not None:
+            pacer = FramePacer(self.record_fps, CFR, origin=audio_writer.origin)
+        else:
+            pacer = FramePacer(self.record_fps, self.record_fps_mode)
+        self.pacer = pacer
+
         command = [
             'ffmpeg',
             '-y',
-            '-f', 'rawvideo',
-            '-pix_fmt', 'bgr24',
-            '-s', resolution,
-            '-r', '24',
+            *pacer.ffmpeg_input_args(resolution),
             '-i', '-',
+            *audio_input_args,
             '-c:v', 'libx264',
             '-preset', 'fast',
             '-pix_fmt', 'yuv420p',
             '-profile:v', 'baseline',
-            '-movflags', '+faststart',
+            *pacer.ffmpeg_output_args(),
+            *audio_output_args,
+            *output_args,
             '-loglevel', 'error',
             video_path
         ]
@@ -182,27 +367,101 @@ class MediaHandler:
             command,
             stdin=subprocess.PIPE,
             stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
+            stderr=subprocess.DEVNULL,
+            pass_fds=pass_fds
         )
         print("✅ FFmpeg lanzado", flush=True)
+        # vfr: cada frame va a ffmpeg con su instante de captura
+        vfr_writer = MatroskaFrameWriter(self.video_process.stdin, width, height) if pacer.mode == VFR else None
+
+        audio_stop = threading.Event()
+        audio_thread = None
+        av_transcriber = None
+        if audio_writer is not None:
+            os.close(audio_read_fd)  # solo lo usa ffmpeg
+            if self.live_transcription:
+                av_transcriber = LiveTranscriber(
+                    self.model, AV_AUDIO_RATE,
+                    os.path.join(self.session_folder, base_name.replace('video_', 'transcripcion_') + ".txt"))
+            try:
+                audio_thread = self._start_av_audio(audio_writer, av_transcriber, audio_stop, AV_AUDIO_RATE, 1024)
+                print("🎙️ Audio del video en la misma pasada de ffmpeg", flush=True)
+            except Exception as e:
+                # Sin micrófono la pista de audio queda en silencio
+                print(f"⚠️ No se pudo abrir el micrófono: {e}", flush=True)
+
+        segments_done = threading.Event()
+        watcher = None
+        if segmented:
+            watcher = threading.Thread(target=self._watch_segments, args=(list_path, segments_done), daemon=True)
+            watcher.start()
 
         frame_count = 0
+        previous = None
+        self.record_queue.start()
         try:
-            while recording_flag.is_set() or not self.record_queue.empty():
-                if not self.record_queue.empty():
-                    frame = self.record_queue.get()
-                    try:
-                        self.video_process.stdin.write(frame.tobytes())
-                        frame_count += 1
-                        if frame_count % 30 == 0:
-                            print(f"🎞️ Frames grabados: {frame_count}", flush=True)
-                    except Exception as e:
-                        print(f"❌ Error escribiendo frame: {e}", flush=True)
+            while True:
+                if not recording_flag.is_set() and self.record_queue.active:
+                    # No se aceptan más frames, solo se vacía lo pendiente
+                    self.record_queue.stop()
+
+                item = self.record_queue.get(timeout=0.5)
+                if item is None:
+                    if not self.record_queue.active:
                         break
-                else:
-                    time.sleep(0.01)
+                    continue
+
+                index, frame, timestamp = item
+                repeats, keep = pacer.push(timestamp)
+                if not keep:
+                    # Llegó antes de su turno: sobra para la tasa objetivo
+                    self.record_queue.release(index)
+                    continue
 
+                try:
+                    # Se escribe el buffer tal cual (protocolo buffer), sin tobytes().
+                    # Si hubo un hueco se repite el frame anterior hasta cubrirlo
+                    # (el primero se repite a sí mismo desde el origen)
+                    if vfr_writer is not None:
+                        vfr_writer.write(frame.data, timestamp - pacer.origin)
+                    else:
+                        filler = frame if previous is None else previous[1]
+                        for _ in range(repeats):
+                            self.video_process.stdin.write(filler.data)
+                        self.video_process.stdin.write(frame.data)
+                except Exception as e:
+                    print(f"❌ Error escribiendo frame: {e}", flush=True)
+                    self.record_queue.release(index)
+                    break
+
+                if (frame_count + repeats + 1) // 30 > frame_count // 30:
+                    print(f"🎞️ Frames grabados: {frame_count + repeats + 1}", flush=True)
+                frame_count += repeats + 1
+                if previous is not None:
+                    self.record_queue.release(previous[0])
+                previous = (index, frame)
+
+            if previous is not None:
+                self.record_queue.release(previous[0])
+            self.record_queue.stop()
+            stats = self.record_queue.stats()
+            print(f"📊 Cola de grabación: {stats['dropped']} frames descartados, "
+                  f"máximo {stats['high_water']}/{stats['capacity']} en cola", flush=True)
+            pacing = pacer.stats()
+            print(f"📊 Ritmo de grabación: captura a {pacing['capture_fps']} fps "
+                  f"(objetivo {pacing['target_fps']}), jitter {pacing['jitter_ms']} ms, "
+                  f"{pacing['duplicated']} duplicados, {pacing['dropped']} descartados", flush=True)
             print(f"🛑 Finalizando grabación de video ({frame_count} frames)...", flush=True)
+            if audio_writer is not None:
+                audio_stop.set()
+                if audio_thread is not None:
+                    audio_thread.join(timeout=2)
+                end = pacer.origin + frame_count / self.record_fps if pacer.origin is not None else None
+                sync = audio_writer.close(end)
+                print(f"📊 Audio: {sync['silence_ms']} ms de silencio insertado, {sync['trimmed_ms']} ms recortados, "
+                      f"deriva máxima {sync['max_drift_ms']} ms", flush=True)
+                if av_transcriber is not None:
+                    av_transcriber.finish(timeout=5)
             try:
                 self.video_process.stdin.close()
             except Exception:
@@ -210,64 +469,98 @@ class MediaHandler:
 
             self.video_process.wait(timeout=10)
             print(f"✅ FFmpeg finalizado con código {self.video_process.returncode}", flush=True)
-            
-            # Encriptar el video después de grabarlo
-            encrypted_path = self.encrypt_file(video_path)
-            print(f"✅ Video encriptado guardado en: {encrypted_path}", flush=True)
-            
+
+            if not segmented:
+                # Encriptar el video después de grabarlo
+                encrypted_path = self.encrypt_file(video_path)
+                print(f"✅ Video encriptado guardado en: {encrypted_path}", flush=True)
+                self.thumbnailer.submit_video(encrypted_path)
+
         except Exception as e:
             print(f"❌ Error en grabación de video: {e}", flush=True)
             if self.video_process:
                 self.video_process.kill()
 
         finally:
+            self.record_queue.stop()
+            audio_stop.set()
+            if audio_writer is not None:
+                audio_writer.close()
             self.video_process = None
+            if watcher is not None:
+                # Solo queda por encriptar el último segmento
+                segments_done.set()
+                watcher.join()
+
+    def pacing_stats(self):
+        """Estadísticas de ritmo de la grabación en curso o de la última"""
+        return self.pacer.stats() if self.pacer is not None else None
+
+    def av_sync_stats(self):
+        """Alineación de la pista de audio de la grabación en curso o de la última (o None)"""
+        return self.av_writer.stats() if self.av_writer is not None else None
 
     def capture_frames(self):
         print("🎥 Iniciando captura de frames...", flush=True)
-        if not self.cap.isOpened():
+        # La cámara se abre en segundo plano: se espera a que esté lista
+        while not self.frame_source_ready.wait(1.0):
+            if readiness.state('camera') == readiness.FAILED:
+                break
+        if self.frame_source is None or not self.frame_source.is_opened():
             print("❌ No se pudo abrir la cámara.", flush=True)
             return
 
-        # Define la resolución máxima permitida
-        max_width = 640
-        max_height = 480
+        # El hilo codificador del stream lee del buffer, no de la captura
+        self.broadcaster.start()
+        # Puntuación de nitidez en su propio hilo, para elegir el mejor frame al capturar
+        self.frame_scorer.start()
 
         while True:
-            ret, frame = self.cap.read()
-            if not ret:
-                continue
+            # read() bloquea hasta el siguiente frame, no hace falta dormir.
+            # Se lee directamente sobre el slot del buffer para no copiar el frame
+            if self.frame_source.compressed:
+                # MJPEG: se guarda el JPEG tal cual; se decodifica solo si alguien pide los píxeles
+                ret, data = self.frame_source.read_jpeg()
+                timestamp = time.monotonic()
+                if not ret:
+                    time.sleep(0.01)
+                    continue
+                self.frame_buffer.write_jpeg(data, timestamp)
+            else:
+                ret, frame = self.frame_source.read(self.frame_buffer.begin_write())
+                timestamp = time.monotonic()
+                if not ret:
+                    time.sleep(0.01)
+                    continue
 
-            # Redimensionar si es necesario
-            height, width = frame.shape[:2]
-            if width > max_width or height > max_height:
-                frame = cv2.resize(frame, (max_width, max_height), interpolation=cv2.INTER_AREA)
+                # El buffer redimensiona a 640x480 si hace falta
+                self.frame_buffer.commit(frame, timestamp)
+            if self.record_queue.active:
+                self.record_queue.put(self.frame_buffer.latest().frame, timestamp)
 
-            if self.stream_queue.full():
-                self.stream_queue.get()
-            self.stream_queue.put(frame)
-            self.record_queue.put(frame)
-            self.latest_frame = frame.copy()
+    def pin_latest_frame(self):
+        """Devuelve un FrameRef de solo lectura al último frame (hay que liberarlo), o None"""
+        return self.frame_buffer.pin_latest()
 
-            time.sleep(0.01)
+    def pin_best_frame(self, window):
+        """Fija el frame más nítido de los últimos window: (FrameRef, puntuación) o (None, None)"""
+        window = max(1, min(window, self.frame_buffer.capacity - 1))
+        return self.frame_scorer.pin_best(window)
 
-    def generate(self):
-        while True:
-            if not self.stream_queue.empty():
-                frame = self.stream_queue.get()
-                ret, buffer = cv2.imencode('.jpg', frame)
-                if not ret:
-                    continue
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-            else:
-                time.sleep(0.01)
+    def generate(self, tier='high', quality=None, max_fps=None, auto=True):
+        # Cada cliente lleva su propio cursor sobre el broadcaster
+        return self.broadcaster.subscribe(tier, quality, max_fps, auto)
 
     def transcribe_audio(self):
         print("🧠 Iniciando transcripción de audio...", flush=True)
         if not self.audio_path or not os.path.exists(self.audio_path):
             raise FileNotFoundError("❌ No se encontró el archivo de audio para transcribir.")
 
+        # Si la transcripción en vivo procesó todo el audio no hace falta releer el WAV
+        transcriber = self.live_transcriber
+        if transcriber is not None and transcriber.complete:
+            return transcriber.text
+
         wf = wave.open(self.audio_path, "rb")
         rec = KaldiRecognizer(self.model, wf.getframerate())
         text = ""
@@ -307,57 +600,146 @@ class MediaHandler:
         return path_txt
     
     def encrypt_file(self, input_path, output_path=None):
-        """Encripta un archivo y devuelve la ruta del archivo encriptado"""
+        """Encripta un archivo por bloques (memoria constante) y devuelve la ruta del archivo encriptado"""
         if output_path is None:
             output_path = input_path + '.enc'
-            
-        with open(input_path, 'rb') as f:
-            data = f.read()
-        
-        encrypted_data = self.cipher.encrypt(data)
-        
-        with open(output_path, 'wb') as f:
-            f.write(encrypted_data)
-            
+
+        # Se escribe con otro nombre y se renombra al final para que nunca
+        # aparezca en la galería un .enc a medio escribir
+        partial_path = output_path + '.part'
+        with open(input_path, 'rb') as src, open(partial_path, 'wb') as dst:
+            self.chunked_cipher.encrypt_stream(src, dst)
+        os.replace(partial_path, output_path)
+        mark_dirty(os.path.dirname(output_path))
+
         # Eliminar el archivo original
         os.remove(input_path)
-        
+
         return output_path
 
+    def open_encrypted(self, input_path):
+        """Abre un .enc para leer rangos descifrados (formato por bloques o Fernet antiguo)"""
+        try:
+            if is_chunked_file(input_path):
+                return self.chunked_cipher.open_reader(input_path)
+            return LegacyFernetReader(self.cipher, input_path)
+        except Exception as e:
+            print(f"Error al desencriptar {input_path}: {e}")
+            raise
+
+    def decrypt_to_memory(self, input_path):
+        """Desencripta un archivo completo a un bytearray, sin pasar por disco"""
+        reader = self.open_encrypted(input_path)
+        data = bytearray(reader.size)
+        pos = 0
+        for chunk in reader.iter_range():
+            data[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+        return data
+
+    def open_cached(self, input_path):
+        """Devuelve el contenido desencriptado desde la caché en memoria (liberar con release())"""
+        return media_cache.acquire(input_path, self.decrypt_to_memory)
+
     def decrypt_file(self, input_path, output_path=None):
-        """Desencripta un archivo y devuelve los datos desencriptados"""
+        """Desencripta un archivo y devuelve la ruta del archivo desencriptado"""
         if output_path is None:
             # Modo temporal: crea un archivo temporal
             output_path = tempfile.NamedTemporaryFile(delete=False).name
-            
-        with open(input_path, 'rb') as f:
-            encrypted_data = f.read()
-        
+
+        reader = self.open_encrypted(input_path)
         try:
-            decrypted_data = self.cipher.decrypt(encrypted_data)
+            with open(output_path, 'wb') as f:
+                for data in reader.iter_range():
+                    f.write(data)
         except Exception as e:
             print(f"Error al desencriptar {input_path}: {e}")
             raise
-            
-        with open(output_path, 'wb') as f:
-            f.write(decrypted_data)
-            
+
         return output_path
-    
-    def save_snapshot(self, frame):
-        """Guarda una imagen encriptada"""
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        filename = f"foto_{timestamp}.jpg"
-        temp_path = os.path.join(self.session_folder, filename)
-        
-        # Guardar temporalmente sin encriptar
-        cv2.imwrite(temp_path, frame)
-        
-        # Encriptar y eliminar original
-        encrypted_path = self.encrypt_file(temp_path)
-        encrypted_filename = os.path.basename(encrypted_path)
-        
-        print(f"✅ Imagen encriptada guardada como: {encrypted_filename}", flush=True)
-        return encrypted_filename, encrypted_path
+
+    def _snapshot_filename(self):
+        # Microsegundos y, si coinciden, un contador: dos fotos nunca comparten nombre
+        name = "foto_" + datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        with self._snapshot_lock:
+            if name == self._last_snapshot_name:
+                self._snapshot_counter += 1
+            else:
+                self._last_snapshot_name = name
+                self._snapshot_counter = 0
+            if self._snapshot_counter:
+                name += f"_{self._snapshot_counter}"
+        return name + ".jpg"
+
+    def _snapshot_saved(self, encrypted_path, jpeg):
+        folder_path, name = os.path.split(encrypted_path)
+        mark_dirty(folder_path)
+        # Se publica ya en disco, así quien la reciba puede pedir el archivo a la galería;
+        # los clientes que esperan la última foto la reciben sin leer el disco
+        latest_capture.publish(os.path.basename(folder_path), name[:-len('.enc')], jpeg)
+        self.thumbnailer.submit_jpeg(encrypted_path, jpeg)
+        print(f"✅ Imagen encriptada guardada como: {os.path.basename(encrypted_path)}", flush=True)
+
+    def save_snapshot(self, frame, wait=False):
+        """Codifica la imagen en memoria y la encola para guardarla encriptada.
+
+        Devuelve (nombre .enc, ruta) en cuanto la foto está aceptada; con wait=True
+        espera además a que esté en disco.
+        """
+        filename = self._snapshot_filename()
+        encrypted_path = os.path.join(self.session_folder, filename + '.enc')
+
+        # Se codifica una sola vez en memoria: el mismo JPEG se guarda y se publica
+        ret, buffer = cv2.imencode('.jpg', frame)
+        if not ret:
+            raise RuntimeError("No se pudo codificar la imagen")
+        jpeg = buffer.tobytes()
+
+        # Al terminar de guardarse, _snapshot_saved la publica como última captura
+        future = self.snapshot_writer.submit(encrypted_path, jpeg)
+        if wait:
+            future.result()
+        return filename + '.enc', encrypted_path
+
+    def capture_burst(self, count, interval_ms):
+        """Lanza una ráfaga de count fotos separadas interval_ms y devuelve su id"""
+        burst_id = uuid.uuid4().hex[:12]
+        state = {"id": burst_id, "requested": count, "interval_ms": interval_ms,
+                 "files": [], "errors": 0, "done": False}
+        with self._snapshot_lock:
+            self.bursts[burst_id] = state
+            while len(self.bursts) > 16:
+                self.bursts.popitem(last=False)
+        threading.Thread(target=self._run_burst, args=(state,), daemon=True).start()
+        return burst_id
+
+    def _run_burst(self, state):
+        interval = state["interval_ms"] / 1000
+        next_shot = time.monotonic()
+        last_seq = 0
+        for _ in range(state["requested"]):
+            delay = next_shot - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_shot += interval
+            # Nunca se guarda dos veces el mismo frame: si no llegó uno nuevo se espera
+            if self.frame_buffer.wait_latest(last_seq, timeout=1.0) is None:
+                state["errors"] += 1
+                continue
+            frame_ref = self.pin_latest_frame()
+            try:
+                with frame_ref:
+                    last_seq = frame_ref.seq
+                    filename, _ = self.save_snapshot(frame_ref.frame)
+                state["files"].append(filename)
+            except Exception as e:
+                state["errors"] += 1
+                print(f"❌ Error en ráfaga {state['id']}: {e}", flush=True)
+        state["done"] = True
+        print(f"📸 Ráfaga {state['id']}: {len(state['files'])}/{state['requested']} fotos", flush=True)
+
+    def burst_status(self, burst_id):
+        state = self.bursts.get(burst_id)
+        return dict(state, files=list(state["files"])) if state else None
 
 
@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+DHT = 0xC4
+SOS = 0xDA
+
+
+def _header_segments(data):
+    """Recorre los segmentos de la cabecera JPEG: (marcador, inicio) hasta SOS incluido"""
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1  # byte de relleno
+            continue
+        yield marker, i
+        if marker == SOS:
+            return
+        i += 2 + int.from_bytes(data[i + 2:i + 4], 'big')
+
+
+def _standard_huffman_tables():
+    # libjpeg usa las tablas estándar (anexo K) si no se optimiza: se extraen de un JPEG cualquiera
+    ok, sample = cv2.imencode('.jpg', np.zeros((8, 8, 3), np.uint8), [cv2.IMWRITE_JPEG_OPTIMIZE, 0])
+    sample = sample.tobytes()
+    segments = list(_header_segments(sample))
+    tables = b''
+    for (marker, start), (_, end) in zip(segments, segments[1:]):
+        if marker == DHT:
+            tables += sample[start:end]
+    return tables
+
+
+_STANDARD_DHT = _standard_huffman_tables()
+
+
+def ensure_huffman_tables(data):
+    """Añade las tablas Huffman estándar si el JPEG no las trae.
+
+    Muchas capturadoras UVC las omiten en MJPEG (se sobreentienden); OpenCV lo
+    decodifica igual, pero algunos navegadores no muestran el frame.
+    """
+    for marker, start in _header_segments(data):
+        if marker == DHT:
+            return data
+        if marker == SOS:
+            return data[:start] + _STANDARD_DHT + data[start:]
+    return data
+
+
+def iter_jpeg_frames(path, chunk_size=1024 * 1024):
+    """Recorre los frames de un archivo MJPEG crudo (JPEG concatenados, p. ej. ffmpeg -f mjpeg)"""
+    pending = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            pending += chunk
+            while True:
+                start = pending.find(SOI)
+                if start < 0:
+                    pending = pending[-1:]
+                    break
+                end = pending.find(EOI, start + 2)
+                if end < 0:
+                    pending = pending[start:]
+                    break
+                yield pending[start:end + 2]
+                pending = pending[end + 2:]
@@ -0,0 +1,90 @@
+"""Matroska mínimo en streaming para mandar frames crudos a ffmpeg con su timestamp.
+
+Por una tubería rawvideo ffmpeg solo puede numerar los frames (o ponerles la
+hora a la que los lee); envueltos en Matroska cada frame lleva el instante en
+que se capturó, con precisión de milisegundo. Solo se escribe lo que necesita
+el demuxer de ffmpeg: cabecera, una pista V_UNCOMPRESSED y clusters de
+tamaño desconocido con un SimpleBlock por frame.
+"""
+import struct
+
+EBML = b'\x1a\x45\xdf\xa3'
+SEGMENT = b'\x18\x53\x80\x67'
+INFO = b'\x15\x49\xa9\x66'
+TRACKS = b'\x16\x54\xae\x6b'
+TRACK_ENTRY = b'\xae'
+VIDEO = b'\xe0'
+CLUSTER = b'\x1f\x43\xb6\x75'
+CLUSTER_TIMESTAMP = b'\xe7'
+SIMPLE_BLOCK = b'\xa3'
+
+UNKNOWN_SIZE = b'\x01\xff\xff\xff\xff\xff\xff\xff'
+# El timestamp de cada bloque es un int16 relativo al cluster
+MAX_BLOCK_OFFSET_MS = 32767
+
+
+def _size(n):
+    length = 1
+    while n >= (1 << (7 * length)) - 1:
+        length += 1
+    return (n | (1 << (7 * length))).to_bytes(length, 'big')
+
+
+def _element(element_id, payload):
+    return element_id + _size(len(payload)) + payload
+
+
+def _uint(element_id, value):
+    return _element(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big'))
+
+
+def _header(width, height, pix_fmt_tag):
+    ebml = _element(EBML, b''.join([
+        _uint(b'\x42\x86', 1),            # EBMLVersion
+        _uint(b'\x42\xf7', 1),            # EBMLReadVersion
+        _uint(b'\x42\xf2', 4),            # EBMLMaxIDLength
+        _uint(b'\x42\xf3', 8),            # EBMLMaxSizeLength
+        _element(b'\x42\x82', b'matroska'),
+        _uint(b'\x42\x87', 4),            # DocTypeVersion
+        _uint(b'\x42\x85', 2),            # DocTypeReadVersion
+    ]))
+    info = _element(INFO, b''.join([
+        _uint(b'\x2a\xd7\xb1', 1000000),  # TimestampScale: milisegundos
+        _element(b'\x4d\x80', b'endoscopy-cam'),
+        _element(b'\x57\x41', b'endoscopy-cam'),
+    ]))
+    track = _element(TRACK_ENTRY, b''.join([
+        _uint(b'\xd7', 1),                # TrackNumber
+        _uint(b'\x73\xc5', 1),            # TrackUID
+        _uint(b'\x83', 1),                # TrackType: video
+        _element(b'\x86', b'V_UNCOMPRESSED'),
+        _element(VIDEO, b''.join([
+            _uint(b'\xb0', width),
+            _uint(b'\xba', height),
+            _element(b'\x2e\xb5\x24', pix_fmt_tag),  # ColourSpace: FourCC del formato de píxel
+        ])),
+    ]))
+    return ebml + SEGMENT + UNKNOWN_SIZE + info + _element(TRACKS, track)
+
+
+class MatroskaFrameWriter:
+    """Escribe frames BGR24 con su timestamp (segundos desde el inicio del video)"""
+
+    def __init__(self, dst, width, height):
+        self._dst = dst
+        self._dst.write(_header(width, height, b'BGR\x18'))
+        self._cluster_ms = None
+        self._last_ms = -1
+
+    def write(self, data, timestamp):
+        # Estrictamente creciente: dos frames en el mismo milisegundo no se pisan
+        ms = max(int(round(timestamp * 1000)), self._last_ms + 1)
+        self._last_ms = ms
+        if self._cluster_ms is None or ms - self._cluster_ms > MAX_BLOCK_OFFSET_MS:
+            self._cluster_ms = ms
+            self._dst.write(CLUSTER + UNKNOWN_SIZE + _uint(CLUSTER_TIMESTAMP, ms))
+        block = b'\x81' + struct.pack('>hB', ms - self._cluster_ms, 0x80)  # pista 1, clave
+        # nbytes y no len(): el buffer de un frame de numpy tiene tantas "filas" como alto la imagen
+        self._dst.write(SIMPLE_BLOCK + _size(len(block) + memoryview(data).nbytes) + block)
+        # El frame se escribe tal cual, sin copiarlo
+        self._dst.write(data)
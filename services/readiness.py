@@ -0,0 +1,72 @@
+import threading
+import time
+
+# Estado de arranque de cada subsistema; /health/ready lo consulta
+PENDING = 'pending'
+STARTING = 'starting'
+READY = 'ready'
+FAILED = 'failed'
+
+_stages = {}
+_cond = threading.Condition()
+
+
+def register(name, required=True):
+    """Da de alta un subsistema pendiente de arrancar"""
+    with _cond:
+        _stages.setdefault(name, {"state": PENDING, "required": required, "error": None,
+                                  "started_at": None, "seconds": None})
+
+
+def set_state(name, state, error=None):
+    with _cond:
+        stage = _stages.setdefault(name, {"state": PENDING, "required": True, "error": None,
+                                          "started_at": None, "seconds": None})
+        if state == STARTING:
+            stage["started_at"] = time.monotonic()
+        elif state in (READY, FAILED) and stage["started_at"] is not None:
+            stage["seconds"] = round(time.monotonic() - stage["started_at"], 3)
+        stage["state"] = state
+        stage["error"] = error
+        _cond.notify_all()
+
+
+def run_stage(name, fn, required=True):
+    """Ejecuta fn en un hilo propio y va marcando el estado del subsistema"""
+    register(name, required)
+
+    def run():
+        set_state(name, STARTING)
+        try:
+            fn()
+        except Exception as e:
+            print(f"❌ Falló el arranque de {name}: {e}", flush=True)
+            set_state(name, FAILED, str(e))
+        else:
+            print(f"✅ {name} listo", flush=True)
+            set_state(name, READY)
+
+    thread = threading.Thread(target=run, name=f'init-{name}', daemon=True)
+    thread.start()
+    return thread
+
+
+def wait(name, timeout=None):
+    """Espera a que el subsistema termine de arrancar y devuelve su estado final"""
+    with _cond:
+        _cond.wait_for(lambda: _stages.get(name, {}).get("state") in (READY, FAILED), timeout)
+        return _stages.get(name, {}).get("state", PENDING)
+
+
+def state(name):
+    with _cond:
+        return _stages.get(name, {}).get("state", PENDING)
+
+
+def snapshot():
+    """(listo, estado de cada subsistema): listo si todos los obligatorios están READY"""
+    with _cond:
+        stages = {name: {key: value for key, value in stage.items() if key != "started_at"}
+                  for name, stage in _stages.items()}
+    ready = all(stage["state"] == READY for stage in stages.values() if stage["required"])
+    return ready, stages
@@ -0,0 +1,125 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+BLOCK = 'block'
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class RecordQueue:
+    """Cola acotada de frames hacia el grabador con política de descarte explícita.
+
+    Solo acepta frames mientras hay una grabación activa. Los frames se copian
+    en un conjunto fijo de buffers preasignados, así que la memoria no crece
+    aunque ffmpeg se quede atrás. Cuando no quedan buffers libres se aplica la
+    política: descartar el más antiguo, descartar el nuevo o bloquear la captura.
+    """
+
+    def __init__(self, width=640, height=480, capacity=48, policy=DROP_OLDEST, block_timeout=1.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Política de descarte no válida: {policy}")
+        self.width = width
+        self.height = height
+        self.capacity = capacity
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self._buffers = None
+        self._free = deque()
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._active = False
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.accepted = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    @property
+    def active(self):
+        return self._active
+
+    def start(self):
+        """Empieza a aceptar frames (y reserva los buffers la primera vez)"""
+        with self._cond:
+            if self._buffers is None:
+                self._buffers = np.zeros((self.capacity, self.height, self.width, 3), dtype=np.uint8)
+            self._free = deque(range(self.capacity))
+            self._pending.clear()
+            self._reset_counters()
+            self._active = True
+
+    def stop(self):
+        """Deja de aceptar frames; los pendientes se pueden seguir leyendo"""
+        with self._cond:
+            self._active = False
+            self._cond.notify_all()
+
+    def put(self, frame, timestamp):
+        """Encola una copia del frame. Devuelve False si no se aceptó"""
+        if not self._active:
+            return False
+
+        with self._cond:
+            if not self._free:
+                if self.policy == DROP_OLDEST and self._pending:
+                    index, _ = self._pending.popleft()
+                    self._free.append(index)
+                    self.dropped += 1
+                elif self.policy == BLOCK:
+                    self._cond.wait_for(lambda: self._free or not self._active, self.block_timeout)
+                    if not self._free:
+                        self.dropped += 1
+                        return False
+                else:
+                    self.dropped += 1
+                    return False
+            if not self._active:
+                return False
+            index = self._free.popleft()
+
+        # El buffer está reservado para este frame, se copia fuera del lock
+        np.copyto(self._buffers[index], frame)
+
+        with self._cond:
+            self._pending.append((index, timestamp))
+            self.accepted += 1
+            self.high_water = max(self.high_water, len(self._pending))
+            self._cond.notify_all()
+        return True
+
+    def get(self, timeout=None):
+        """Devuelve (índice, frame, timestamp) o None si no llegó nada.
+
+        El frame es una vista del buffer interno; hay que devolverlo con
+        release(índice) cuando ya se haya escrito.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._pending or not self._active, timeout):
+                return None
+            if not self._pending:
+                return None
+            index, timestamp = self._pending.popleft()
+            return index, self._buffers[index], timestamp
+
+    def release(self, index):
+        with self._cond:
+            self._free.append(index)
+            self._cond.notify_all()
+
+    def pending(self):
+        return len(self._pending)
+
+    def stats(self):
+        return {
+            "active": self._active,
+            "policy": self.policy,
+            "capacity": self.capacity,
+            "pending": len(self._pending),
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "high_water": self.high_water,
+        }
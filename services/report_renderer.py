@@ -0,0 +1,282 @@
+"""Generación de reportes PDF en segundo plano.
+
+xhtml2pdf es Python puro y tarda segundos con muchas imágenes, así que se
+ejecuta en un pool de procesos en vez de en el hilo de la petición. Las
+peticiones con el mismo HTML para la misma sesión se unen al trabajo en curso
+o, si el PDF ya existe con ese contenido, se devuelve sin volver a generarlo.
+Los reportes de una misma sesión se generan de uno en uno para que el PDF y
+su hash siempre correspondan al mismo HTML.
+Las imágenes del procedimiento se descifran en memoria y se incrustan como
+data URI; el PDF se escribe cifrado igual que el resto de archivos.
+"""
+import base64
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from urllib.parse import unquote, urlparse
+
+from services import events
+from services.catalog import mark_dirty
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+REPORT_NAME = 'reporte.pdf'
+HASH_NAME = '.reporte.sha256'
+
+# /gallery/procedures/<carpeta>/<archivo> (con o sin host) -> archivo cifrado de la sesión
+_MEDIA_URL = re.compile(r'/procedures/([^/]+)/([^/]+)$')
+_MIMETYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png'}
+
+
+def content_hash(html):
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+
+def _read_decrypted(path):
+    from services.crypto_container import ChunkedCipher, LegacyFernetReader, is_chunked_file
+    if is_chunked_file(path):
+        reader = ChunkedCipher(os.environ["SECRET_KEY"]).open_reader(path)
+    else:
+        from cryptography.fernet import Fernet
+        reader = LegacyFernetReader(Fernet(os.environ["SECRET_KEY"].encode()), path)
+    return b''.join(reader.iter_range())
+
+
+def _render(html, digest, base_folder, output_path):
+    """Se ejecuta en el proceso trabajador: genera el PDF cifrado y devuelve (bytes, imágenes, segundos)"""
+    from xhtml2pdf import pisa
+    from services.crypto_container import ChunkedCipher
+
+    start = time.perf_counter()
+    resolved = {}
+
+    def link_callback(uri, rel):
+        match = _MEDIA_URL.search(unquote(urlparse(uri).path))
+        if match is None:
+            return uri
+        folder, filename = match.groups()
+        if '..' in folder or '..' in filename:
+            return uri
+        name = filename[:-len('.enc')] if filename.endswith('.enc') else filename
+        mimetype = _MIMETYPES.get(os.path.splitext(name)[1].lower())
+        path = os.path.join(base_folder, folder, name + '.enc')
+        if mimetype is None or not os.path.exists(path):
+            return uri
+        if path not in resolved:
+            data = base64.b64encode(_read_decrypted(path)).decode('ascii')
+            resolved[path] = f"data:{mimetype};base64,{data}"
+        return resolved[path]
+
+    pdf = io.BytesIO()
+    status = pisa.CreatePDF(html, dest=pdf, link_callback=link_callback)
+    if status.err:
+        raise RuntimeError(f"xhtml2pdf devolvió {status.err} errores")
+
+    partial_path = output_path + '.part'
+    with open(partial_path, 'wb') as f:
+        ChunkedCipher(os.environ["SECRET_KEY"]).encrypt_bytes(pdf.getvalue(), f)
+
+    # El hash se quita antes de sustituir el PDF y se escribe después: si el
+    # proceso muere entre medias no queda un hash que no corresponda al PDF
+    hash_path = os.path.join(os.path.dirname(output_path), HASH_NAME)
+    if os.path.exists(hash_path):
+        os.remove(hash_path)
+    os.replace(partial_path, output_path)
+    with open(hash_path + '.part', 'w') as f:
+        f.write(digest)
+    os.replace(hash_path + '.part', hash_path)
+    return len(pdf.getvalue()), len(resolved), time.perf_counter() - start
+
+
+class ReportRenderer:
+    """Cola de reportes PDF sobre un pool de procesos, sin repetir trabajos iguales"""
+
+    def __init__(self, base_folder, workers=2, keep_jobs=200):
+        self.base_folder = base_folder
+        self.workers = workers
+        self.keep_jobs = keep_jobs
+        self._pool = None
+        self._cond = threading.Condition()
+        self._jobs = OrderedDict()
+        self._inflight = {}  # (carpeta, hash) -> job_id
+        self._busy_folders = set()
+        self._waiting = {}  # carpeta -> cola de (trabajo, html) a la espera del reporte en curso
+        self.rendered = 0
+        self.deduplicated = 0
+        self.cache_hits = 0
+
+    def _ensure_pool(self):
+        if self._pool is None:
+            # spawn: el servidor tiene hilos y hacer fork con ellos no es seguro
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def _replace_pool(self, broken):
+        """Sustituye el pool si un proceso murió (OOM, señal): si no, ningún reporte más se generaría"""
+        with self._cond:
+            if self._pool is broken:
+                print("⚠️ Un proceso de reportes terminó de forma inesperada; se recrea el pool", flush=True)
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            return self._ensure_pool()
+
+    def _new_job(self, folder, digest, status):
+        job = {"id": uuid.uuid4().hex[:12], "folder": folder, "hash": digest, "status": status,
+               "pdf_url": f"/gallery/procedures/{folder}/{REPORT_NAME}", "cached": False,
+               "error": None, "created_at": time.time(), "seconds": None}
+        self._jobs[job["id"]] = job
+        while len(self._jobs) > self.keep_jobs:
+            self._jobs.popitem(last=False)
+        return job
+
+    def _cached(self, folder_path, digest):
+        try:
+            with open(os.path.join(folder_path, HASH_NAME)) as f:
+                stored = f.read().strip()
+        except OSError:
+            return False
+        return stored == digest and os.path.exists(os.path.join(folder_path, REPORT_NAME + '.enc'))
+
+    def submit(self, html, folder):
+        """Encola el reporte de la sesión y devuelve su trabajo (ya terminado si el PDF está al día)"""
+        digest = content_hash(html)
+        folder_path = os.path.join(self.base_folder, folder)
+        with self._cond:
+            job_id = self._inflight.get((folder, digest))
+            if job_id is not None and job_id in self._jobs:
+                self.deduplicated += 1
+                return dict(self._jobs[job_id])
+
+            if folder not in self._busy_folders and self._cached(folder_path, digest):
+                self.cache_hits += 1
+                job = self._new_job(folder, digest, DONE)
+                job["cached"] = True
+                job["seconds"] = 0.0
+                return dict(job)
+
+            job = self._new_job(folder, digest, QUEUED)
+            self._inflight[(folder, digest)] = job["id"]
+            failed = []
+            if folder in self._busy_folders:
+                # Otro reporte de la sesión en curso: este se genera cuando termine
+                self._waiting.setdefault(folder, deque()).append((job, html))
+            else:
+                failed = self._start(job, html)
+            result = dict(job)
+        for failed_job in failed:
+            events.publish('report', failed_job)
+        return result
+
+    def _start(self, job, html):
+        """Lanza el trabajo en el pool; si no lo acepta, lo da por fallido y sigue con el siguiente de la sesión.
+
+        Se llama con self._cond tomado y devuelve los trabajos fallidos, para avisar fuera del lock.
+        """
+        failed = []
+        while True:
+            self._busy_folders.add(job["folder"])
+            job["status"] = RUNNING
+            job["started_at"] = time.time()
+            output_path = os.path.join(self.base_folder, job["folder"], REPORT_NAME + '.enc')
+            try:
+                pool, future = self._submit(html, job["hash"], self.base_folder, output_path)
+            except Exception as e:
+                print(f"❌ No se pudo lanzar el reporte de {job['folder']}: {e}", flush=True)
+                failed.append(self._settle(job, FAILED, str(e) or type(e).__name__, None))
+                waiting = self._next_waiting(job["folder"])
+                if waiting is None:
+                    return failed
+                job, html = waiting
+                continue
+            future.add_done_callback(lambda f, job=job, pool=pool: self._finished(job, f, pool))
+            return failed
+
+    def _submit(self, *args):
+        pool = self._ensure_pool()
+        try:
+            return pool, pool.submit(_render, *args)
+        except BrokenExecutor:
+            # El trabajo aún no empezó: se reintenta una vez en un pool nuevo
+            pool = self._replace_pool(pool)
+            return pool, pool.submit(_render, *args)
+
+    def _settle(self, job, status, error, seconds):
+        # Se llama con self._cond tomado: cierra el trabajo y libera su sesión
+        job["status"] = status
+        job["error"] = error
+        job["seconds"] = round(seconds, 3) if seconds is not None else None
+        if status == DONE:
+            self.rendered += 1
+        self._inflight.pop((job["folder"], job["hash"]), None)
+        self._busy_folders.discard(job["folder"])
+        self._cond.notify_all()
+        return dict(job)
+
+    def _next_waiting(self, folder):
+        waiting = self._waiting.get(folder)
+        if not waiting:
+            return None
+        next_job = waiting.popleft()
+        if not waiting:
+            del self._waiting[folder]
+        return next_job
+
+    def _finished(self, job, future, pool):
+        folder_path = os.path.join(self.base_folder, job["folder"])
+        try:
+            size, images, seconds = future.result()
+            # El reporte en claro de versiones anteriores ya no hace falta
+            legacy_path = os.path.join(folder_path, REPORT_NAME)
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+            mark_dirty(folder_path)
+            status, error = DONE, None
+            print(f"✅ Reporte PDF generado en {job['folder']}: {size} bytes, {images} imágenes "
+                  f"en {seconds:.1f}s", flush=True)
+        except Exception as e:
+            status, error, seconds = FAILED, str(e) or type(e).__name__, None
+            print(f"❌ Error generando el reporte de {job['folder']}: {e}", flush=True)
+            if isinstance(e, BrokenExecutor):
+                self._replace_pool(pool)
+
+        with self._cond:
+            results = [self._settle(job, status, error, seconds)]
+            waiting = self._next_waiting(job["folder"])
+            if waiting is not None:
+                results += self._start(*waiting)
+        for result in results:
+            events.publish('report', result)
+
+    def wait(self, job_id, timeout):
+        """Espera (como mucho timeout segundos) a que el trabajo termine y devuelve su estado"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._jobs.get(job_id, {}).get("status", DONE) in (DONE, FAILED), timeout)
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def get(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "running": len(self._busy_folders),
+                "queued": sum(len(waiting) for waiting in self._waiting.values()),
+                "rendered": self.rendered,
+                "deduplicated": self.deduplicated,
+                "cache_hits": self.cache_hits,
+            }
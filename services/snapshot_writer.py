@@ -0,0 +1,68 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class SnapshotWriter:
+    """Cifra y guarda las fotos en un hilo aparte.
+
+    La petición solo codifica el JPEG en memoria y lo encola. El JPEG se cifra
+    directamente sobre un .part que se renombra al terminar, así que la foto
+    nunca queda en claro en disco.
+    """
+
+    def __init__(self, cipher, max_pending=32, on_saved=None):
+        self.cipher = cipher
+        self.on_saved = on_saved
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.saved = 0
+        self.failed = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='snapshots', daemon=True)
+                self._thread.start()
+
+    def submit(self, path, data, timeout=2.0):
+        """Encola el JPEG para guardarlo cifrado en path; devuelve un Future con la ruta.
+
+        Lanza queue.Full si el disco no da abasto y la cola sigue llena tras timeout.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((path, data, future), timeout=timeout)
+        return future
+
+    def _run(self):
+        while True:
+            path, data, future = self._queue.get()
+            try:
+                partial_path = path + '.part'
+                with open(partial_path, 'wb') as f:
+                    self.cipher.encrypt_bytes(data, f)
+                os.replace(partial_path, path)
+                self.saved += 1
+                future.set_result(path)
+                if self.on_saved is not None:
+                    self.on_saved(path, data)
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Error guardando {path}: {e}", flush=True)
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Espera a que se hayan guardado todas las fotos encoladas"""
+        self._queue.join()
+
+    def stats(self):
+        return {"pending": self.pending(), "saved": self.saved, "failed": self.failed}
@@ -0,0 +1,148 @@
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+THUMB_FOLDER = '.thumbs'
+THUMB_WIDTH = 320
+THUMB_QUALITY = 75
+
+
+def thumbnail_path(media_path):
+    """Ruta de la miniatura cifrada de una foto o video: <sesión>/.thumbs/<nombre>.jpg.enc"""
+    folder, name = os.path.split(media_path)
+    if name.endswith('.enc'):
+        name = name[:-len('.enc')]
+    if not name.endswith('.jpg'):
+        name += '.jpg'
+    return os.path.join(folder, THUMB_FOLDER, name + '.enc')
+
+
+def _resize(image):
+    height, width = image.shape[:2]
+    if width <= THUMB_WIDTH:
+        return image
+    size = (THUMB_WIDTH, max(1, round(height * THUMB_WIDTH / width)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+class Thumbnailer:
+    """Genera en segundo plano miniaturas cifradas de fotos y pósters de videos"""
+
+    def __init__(self, media_handler, workers=2):
+        self.media_handler = media_handler
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbs')
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, media_path, fn, *args):
+        with self._lock:
+            future = self._pending.get(media_path)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._run, media_path, fn, *args)
+            self._pending[media_path] = future
+            return future
+
+    def _run(self, media_path, fn, *args):
+        try:
+            image = fn(*args)
+            if image is None:
+                print(f"⚠️ No se pudo generar la miniatura de {media_path}", flush=True)
+                return None
+            return self._save(media_path, image)
+        except Exception as e:
+            print(f"❌ Error generando miniatura de {media_path}: {e}", flush=True)
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(media_path, None)
+
+    def _save(self, media_path, image):
+        ret, buffer = cv2.imencode('.jpg', _resize(image), [cv2.IMWRITE_JPEG_QUALITY, THUMB_QUALITY])
+        if not ret:
+            return None
+        path = thumbnail_path(media_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = path + '.part'
+        with open(partial_path, 'wb') as f:
+            self.media_handler.chunked_cipher.encrypt_bytes(buffer.tobytes(), f)
+        os.replace(partial_path, path)
+        return path
+
+    def submit_jpeg(self, media_path, data):
+        """Miniatura a partir del JPEG en claro que ya está en memoria"""
+        return self._submit(media_path, self._decode_jpeg, data)
+
+    def submit_image(self, media_path):
+        """Miniatura de una foto ya guardada y cifrada"""
+        return self._submit(media_path, self._decode_image, media_path)
+
+    def submit_video(self, media_path):
+        """Póster (primer frame) de un video ya guardado y cifrado"""
+        return self._submit(media_path, self._extract_poster, media_path)
+
+    def submit(self, media_path):
+        if media_path.endswith('.mp4.enc'):
+            return self.submit_video(media_path)
+        return self.submit_image(media_path)
+
+    def _decode_image(self, media_path):
+        return self._decode_jpeg(self.media_handler.decrypt_to_memory(media_path))
+
+    def _decode_jpeg(self, data):
+        # Se decodifica a la mitad de resolución directamente, es más rápido
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+
+    def _extract_poster(self, media_path):
+        # ffmpeg lee el video descifrado por su stdin: no queda nada en claro en disco.
+        # Con +faststart el moov va al principio y basta con descifrar los primeros bloques
+        process = subprocess.Popen(
+            ['ffmpeg', '-loglevel', 'error', '-i', 'pipe:0', '-frames:v', '1',
+             '-f', 'image2pipe', '-vcodec', 'mjpeg', 'pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+
+        def feed():
+            try:
+                for data in self.media_handler.open_encrypted(media_path).iter_range():
+                    process.stdin.write(data)
+            except (BrokenPipeError, OSError):
+                pass  # ffmpeg ya tiene su frame y cerró la entrada
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        output = process.stdout.read()
+        process.wait()
+        feeder.join()
+        if not output:
+            return None
+        return cv2.imdecode(np.frombuffer(output, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def backfill(self, base_folder):
+        """Encola miniaturas de todas las fotos y videos que aún no la tienen"""
+        if not os.path.isdir(base_folder):
+            return 0
+        count = 0
+        for folder in os.listdir(base_folder):
+            folder_path = os.path.join(base_folder, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for name in os.listdir(folder_path):
+                if not (name.endswith('.jpg.enc') or name.endswith('.mp4.enc')):
+                    continue
+                media_path = os.path.join(folder_path, name)
+                if not os.path.exists(thumbnail_path(media_path)):
+                    self.submit(media_path)
+                    count += 1
+        if count:
+            print(f"🖼️ Generando {count} miniaturas pendientes", flush=True)
+        return count
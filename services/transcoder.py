@@ -0,0 +1,218 @@
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class TranscoderBusy(Exception):
+    """La cola de conversiones está llena: el cliente debe reintentar más tarde"""
+
+
+class IncompleteUpload(Exception):
+    """La subida terminó antes de lo anunciado (el cliente se desconectó)"""
+
+
+def _copy_upload(stream, dest, length=None, chunk_size=64 * 1024):
+    """Copia la subida a dest; lanza IncompleteUpload si llegan menos de length bytes"""
+    received = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        received += len(chunk)
+        dest.write(chunk)
+    if length is not None and received < length:
+        raise IncompleteUpload(f"Subida incompleta: {received} de {length} bytes")
+
+
+class Transcoder:
+    """Convierte audios subidos a MP3 con como mucho workers ffmpeg a la vez.
+
+    Si hay un ffmpeg libre y ningún trabajo esperando en la cola, una subida en
+    streaming se le pasa directamente por stdin, sin guardar el original en
+    disco. Si no, o si la subida ya estaba guardada (multipart), se copia en
+    memoria (o en un temporal si supera spool_bytes) y la convierte un hilo
+    del pool en orden de llegada, sin bloquear la petición, hasta max_queue
+    trabajos en espera; por encima de eso submit() lanza TranscoderBusy. Si la subida llega incompleta el trabajo queda fallido.
+    """
+
+    def __init__(self, output_folder, workers=2, max_queue=8, spool_bytes=16 * 1024 * 1024, keep_jobs=200):
+        self.output_folder = output_folder
+        self.workers = workers
+        self.max_queue = max_queue
+        self.spool_bytes = spool_bytes
+        self.keep_jobs = keep_jobs
+        os.makedirs(output_folder, exist_ok=True)
+        self._slots = threading.Semaphore(workers)
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._spooled = 0  # trabajos copiados (o copiándose) que aún no tienen ffmpeg
+        self.rejected = 0
+        threading.Thread(target=self._dispatch, name='transcoder', daemon=True).start()
+
+    def submit(self, stream, length=None, buffered=False):
+        """Acepta el audio (un objeto con read()) y devuelve el trabajo; lanza TranscoderBusy si no cabe.
+
+        length es el tamaño anunciado de la subida (Content-Length) y buffered
+        indica que ya está entera en memoria o en disco.
+        """
+        with self._lock:
+            if self._inflight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise TranscoderBusy()
+            self._inflight += 1
+            job_id = uuid.uuid4().hex[:8]
+            name = f"audio_{time.strftime('%Y%m%d-%H%M%S')}-{job_id}.mp3"
+            job = {"id": job_id, "status": QUEUED, "output": os.path.join(self.output_folder, name),
+                   "error": None, "created_at": time.time(), "seconds": None}
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.keep_jobs:
+                self._jobs.popitem(last=False)
+            # Sin adelantar a la cola: si hay trabajos esperando, un ffmpeg que
+            # quede libre es para ellos y esta subida se pone detrás
+            direct = not buffered and self._spooled == 0 and self._slots.acquire(blocking=False)
+            if not direct:
+                self._spooled += 1
+
+        if direct:
+            # Hay un ffmpeg libre: la subida va directa a su stdin
+            try:
+                process, log = self._start(job)
+            except Exception as e:
+                self._slots.release()
+                self._fail(job, e)
+                return dict(job)
+            try:
+                self._feed(process, stream, length)
+            except Exception as e:
+                # Subida cortada: ffmpeg ya está parado y el trabajo no se da por bueno
+                self._finish(job, process, log, error=e)
+                raise
+            threading.Thread(target=self._finish, args=(job, process, log), daemon=True).start()
+        else:
+            try:
+                spool = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+                _copy_upload(stream, spool, length)
+                spool.seek(0)
+            except Exception as e:
+                with self._lock:
+                    self._spooled -= 1
+                self._fail(job, e)
+                raise
+            self._queue.put((job, spool))
+        return dict(job)
+
+    def _start(self, job):
+        job["status"] = RUNNING
+        job["started_at"] = time.time()
+        # stderr a un temporal: una tubería que nadie lee mientras se alimenta stdin podría llenarse y bloquear a ffmpeg
+        log = tempfile.TemporaryFile()
+        try:
+            process = subprocess.Popen(
+                ['ffmpeg', '-loglevel', 'error', '-y', '-i', 'pipe:0', '-vn',
+                 '-acodec', 'libmp3lame', '-q:a', '2', '-f', 'mp3', job["output"] + '.part'],
+                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=log
+            )
+        except Exception:
+            log.close()
+            raise
+        return process, log
+
+    def _feed(self, process, stream, length=None):
+        try:
+            _copy_upload(stream, process.stdin, length)
+        except BrokenPipeError:
+            pass  # ffmpeg terminó antes (entrada no válida): el error sale en _finish
+        except Exception:
+            # Error leyendo la subida: ffmpeg no debe cerrar un MP3 truncado
+            process.kill()
+            raise
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    def _finish(self, job, process, log, error=None):
+        try:
+            process.wait()
+            if error is not None:
+                raise error
+            if process.returncode != 0:
+                log.seek(0)
+                stderr = log.read().decode(errors='replace').strip()
+                raise RuntimeError(stderr or f"ffmpeg salió con {process.returncode}")
+            os.replace(job["output"] + '.part', job["output"])
+            job["status"] = DONE
+            job["seconds"] = round(time.time() - job["started_at"], 3)
+            print(f"✅ Audio convertido a MP3: {job['output']}", flush=True)
+        except Exception as e:
+            self._fail(job, e)
+            return
+        finally:
+            log.close()
+            self._slots.release()
+        with self._lock:
+            self._inflight -= 1
+
+    def _fail(self, job, error):
+        job["status"] = FAILED
+        job["error"] = str(error)
+        print(f"❌ Error al convertir audio {job['id']}: {error}", flush=True)
+        if os.path.exists(job["output"] + '.part'):
+            os.remove(job["output"] + '.part')
+        with self._lock:
+            self._inflight -= 1
+
+    def _dispatch(self):
+        while True:
+            job, spool = self._queue.get()
+            self._slots.acquire()
+            with self._lock:
+                self._spooled -= 1
+            threading.Thread(target=self._run_spooled, args=(job, spool), daemon=True).start()
+
+    def _run_spooled(self, job, spool):
+        try:
+            process, log = self._start(job)
+        except Exception as e:
+            spool.close()
+            self._slots.release()
+            self._fail(job, e)
+            return
+        error = None
+        with spool:
+            try:
+                self._feed(process, spool)
+            except Exception as e:
+                error = e
+        self._finish(job, process, log, error)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job["status"] == RUNNING)
+            queued = sum(1 for job in self._jobs.values() if job["status"] == QUEUED)
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": running,
+                "queued": queued,
+                "inflight": self._inflight,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,272 @@
+"""Cola de trabajos de transcripción por lotes sobre un pool de procesos.
+
+Cada proceso del pool carga su propio modelo Vosk una sola vez (al arrancar) y
+transcribe WAVs completos; así se aprovechan todos los núcleos, cosa que no
+permiten los hilos con el GIL. El estado de los trabajos se guarda en SQLite
+y los que quedaron a medias se vuelven a encolar al reiniciar.
+"""
+import io
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    transcript_path TEXT,
+    audio_seconds REAL,
+    processing_seconds REAL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+# Modelo del proceso trabajador (uno por proceso, cargado en _init_worker)
+_worker_model = None
+
+
+def _init_worker(model_path):
+    global _worker_model
+    from vosk import Model
+    _worker_model = Model(model_path)
+
+
+def _open_wav(path):
+    if not path.endswith('.enc'):
+        return wave.open(path, 'rb')
+    # WAV cifrado: se descifra en memoria dentro del proceso trabajador
+    from services.crypto_container import ChunkedCipher
+    reader = ChunkedCipher(os.environ["SECRET_KEY"]).open_reader(path)
+    return wave.open(io.BytesIO(b''.join(reader.iter_range())), 'rb')
+
+
+def _transcribe(path):
+    """Se ejecuta en el proceso trabajador: devuelve (texto, segundos de audio, segundos de cómputo)"""
+    from vosk import KaldiRecognizer
+    start = time.perf_counter()
+    with _open_wav(path) as wf:
+        audio_seconds = wf.getnframes() / wf.getframerate()
+        recognizer = KaldiRecognizer(_worker_model, wf.getframerate())
+        parts = []
+        while True:
+            data = wf.readframes(4000)
+            if not data:
+                break
+            if recognizer.AcceptWaveform(data):
+                parts.append(json.loads(recognizer.Result()).get("text", "").strip())
+        parts.append(json.loads(recognizer.FinalResult()).get("text", "").strip())
+    text = " ".join(part for part in parts if part)
+    return text, audio_seconds, time.perf_counter() - start
+
+
+def transcript_path_for(audio_path):
+    """audio_YYYYMMDD-HHMMSS.wav -> transcripcion_YYYYMMDD-HHMMSS.txt en la misma carpeta"""
+    folder, name = os.path.split(audio_path)
+    for extension in ('.enc', '.wav'):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    if name.startswith('audio_'):
+        name = 'transcripcion_' + name[len('audio_'):]
+    return os.path.join(folder, name + '.txt')
+
+
+class TranscriptionJobs:
+    """Reparte trabajos de transcripción entre procesos y guarda su estado"""
+
+    def __init__(self, base_folder, model_path, db_path=None, workers=None):
+        self.base_folder = base_folder
+        self.model_path = model_path
+        self.workers = workers or os.cpu_count() or 1
+        os.makedirs(base_folder, exist_ok=True)
+        self.db_path = db_path or os.path.join(base_folder, '.jobs.sqlite3')
+        self._pool = None
+        self._slots = threading.Semaphore(self.workers)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._started_at = time.time()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(_SCHEMA)
+        # Lo que estaba en marcha al apagarse se vuelve a hacer
+        self._db.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING))
+        self._db.commit()
+
+    def _create_pool(self):
+        # spawn: el servidor tiene hilos y hacer fork con ellos no es seguro.
+        # Cada proceso reimporta el script principal (app.py), que no arranca nada al importarse
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.model_path,),
+        )
+
+    def _replace_pool(self, broken):
+        """Sustituye el pool si un proceso murió (OOM, señal): si no, ningún trabajo más se ejecutaría"""
+        with self._lock:
+            if self._pool is not broken:
+                return self._pool  # ya lo sustituyó otro hilo
+            print("⚠️ Un proceso de transcripción terminó de forma inesperada; se recrea el pool", flush=True)
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._create_pool()
+            return self._pool
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._dispatcher is None:
+                self._pool = self._create_pool()
+                self._dispatcher = threading.Thread(target=self._dispatch, name='transcription-jobs', daemon=True)
+                self._dispatcher.start()
+
+    def _execute(self, query, params=()):
+        with self._lock:
+            self._db.execute(query, params)
+            self._db.commit()
+
+    def submit(self, paths):
+        """Encola la transcripción de cada audio (si no está ya en cola) y devuelve los ids"""
+        ids = []
+        now = time.time()
+        with self._lock:
+            for path in paths:
+                existing = self._db.execute("SELECT id FROM jobs WHERE path = ? AND status IN (?, ?)",
+                                            (path, QUEUED, RUNNING)).fetchone()
+                if existing is not None:
+                    ids.append(existing['id'])
+                    continue
+                job_id = uuid.uuid4().hex[:12]
+                self._db.execute("INSERT INTO jobs (id, path, status, created_at) VALUES (?, ?, ?, ?)",
+                                 (job_id, path, QUEUED, now))
+                ids.append(job_id)
+            self._db.commit()
+        self.resume()
+        return ids
+
+    def resume(self):
+        """Arranca el pool si hay trabajos en cola (también tras un reinicio)"""
+        with self._lock:
+            pending = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+        if pending:
+            self._ensure_started()
+            self._wakeup.set()
+        return pending
+
+    def find_untranscribed(self):
+        """Audios de todas las sesiones que todavía no tienen su transcripción"""
+        paths = []
+        for folder in sorted(os.listdir(self.base_folder)):
+            folder_path = os.path.join(self.base_folder, folder)
+            if folder.startswith('.') or not os.path.isdir(folder_path):
+                continue
+            for name in sorted(os.listdir(folder_path)):
+                if name.endswith('.wav') or name.endswith('.wav.enc'):
+                    path = os.path.join(folder_path, name)
+                    if not os.path.exists(transcript_path_for(path)):
+                        paths.append(path)
+        return paths
+
+    def _dispatch(self):
+        # No se encolan en el pool más trabajos que procesos: así "running" es real
+        while True:
+            self._slots.acquire()
+            with self._lock:
+                row = self._db.execute("SELECT id, path FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                                       (QUEUED,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                                     (RUNNING, time.time(), row['id']))
+                    self._db.commit()
+            if row is None:
+                self._slots.release()
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            try:
+                pool, future = self._submit(row['path'])
+            except Exception as e:
+                self._failed(row['id'], row['path'], e)
+                self._slots.release()
+                continue
+            future.add_done_callback(lambda f, job_id=row['id'], path=row['path'], pool=pool:
+                                     self._finished(job_id, path, f, pool))
+
+    def _submit(self, path):
+        pool = self._pool
+        try:
+            return pool, pool.submit(_transcribe, path)
+        except BrokenExecutor:
+            # El trabajo aún no empezó: se reintenta una vez en un pool nuevo
+            pool = self._replace_pool(pool)
+            return pool, pool.submit(_transcribe, path)
+
+    def _failed(self, job_id, path, error):
+        self._execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                      (FAILED, str(error) or type(error).__name__, time.time(), job_id))
+        print(f"❌ Error transcribiendo {path}: {error}", flush=True)
+
+    def _finished(self, job_id, path, future, pool):
+        try:
+            text, audio_seconds, processing_seconds = future.result()
+            transcript_path = transcript_path_for(path)
+            with open(transcript_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            self._execute("UPDATE jobs SET status = ?, transcript_path = ?, audio_seconds = ?, "
+                          "processing_seconds = ?, finished_at = ? WHERE id = ?",
+                          (DONE, transcript_path, audio_seconds, processing_seconds, time.time(), job_id))
+            print(f"✅ Transcrito {os.path.basename(path)}: {audio_seconds:.0f}s de audio "
+                  f"en {processing_seconds:.1f}s", flush=True)
+        except Exception as e:
+            self._failed(job_id, path, e)
+            if isinstance(e, BrokenExecutor):
+                self._replace_pool(pool)
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, limit=100):
+        with self._lock:
+            return [dict(row) for row in self._db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?",
+                                                          (limit,))]
+
+    def stats(self):
+        """Contadores por estado y rendimiento desde el arranque: segundos de audio por segundo real"""
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            row = self._db.execute(
+                "SELECT SUM(audio_seconds), SUM(processing_seconds), MIN(started_at), MAX(finished_at) "
+                "FROM jobs WHERE status = ? AND started_at >= ?", (DONE, self._started_at)).fetchone()
+        audio_seconds, processing_seconds, first_start, last_finish = row
+        wall_seconds = (last_finish - first_start) if first_start and last_finish else None
+        return {
+            "workers": self.workers,
+            "counts": {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+            "audio_seconds": round(audio_seconds or 0, 1),
+            # Por proceso (cuántas veces más rápido que tiempo real) y en conjunto
+            "realtime_factor_per_worker": round(audio_seconds / processing_seconds, 2) if processing_seconds else None,
+            "audio_seconds_per_wall_second": round(audio_seconds / wall_seconds, 2) if wall_seconds else None,
+        }
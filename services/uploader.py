@@ -0,0 +1,263 @@
+import json
+import mimetypes
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from services.crypto_container import plaintext_size
+
+load_dotenv()
+
+UPLOAD_URL = os.getenv("UPLOAD_URL", "https://69c7-187-189-148-91.ngrok-free.app/api/public-upload")
+UPLOAD_TOKEN = os.getenv("UPLOAD_TOKEN", "token-secreto-torre-medica")
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    response TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_batch ON uploads (batch);
+CREATE INDEX IF NOT EXISTS uploads_status ON uploads (status);
+"""
+
+
+def _quote(value):
+    """Escapa comillas y saltos de línea como los navegadores (HTML): si no, cortan la cabecera de la parte"""
+    return value.replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+
+class MultipartStream:
+    """Cuerpo multipart/form-data de varios archivos que se descifran mientras se envían.
+
+    parts es una lista de (campo, nombre, tipo, tamaño, abrir), donde abrir()
+    devuelve el lector del archivo. Cada lector se abre al llegar a su parte y
+    se suelta al terminarla; requests lo lee por partes con read() y len
+    permite mandar Content-Length sin usar chunked encoding.
+    """
+
+    def __init__(self, parts):
+        self.boundary = uuid.uuid4().hex
+        self._heads = [(f'--{self.boundary}\r\n'
+                        f'Content-Disposition: form-data; name="{field}"; filename="{_quote(filename)}"\r\n'
+                        f'Content-Type: {content_type}\r\n\r\n').encode()
+                       for field, filename, content_type, _, _ in parts]
+        self._tail = f'--{self.boundary}--\r\n'.encode()
+        self.len = sum(len(head) + part[3] + 2 for head, part in zip(self._heads, parts)) + len(self._tail)
+        self._parts = self._generate(parts)
+        self._pending = b''
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def _generate(self, parts):
+        for head, (_, _, _, _, open_reader) in zip(self._heads, parts):
+            yield head
+            for data in open_reader().iter_range():
+                yield bytes(data)
+            yield b'\r\n'
+        yield self._tail
+
+    def read(self, size=-1):
+        chunks = [self._pending]
+        available = len(self._pending)
+        while size < 0 or available < size:
+            data = next(self._parts, None)
+            if data is None:
+                break
+            chunks.append(data)
+            available += len(data)
+        data = b''.join(chunks)
+        if size < 0:
+            self._pending = b''
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+
+class Uploader:
+    """Envía archivos cifrados al servidor externo desde una bandeja de salida persistente.
+
+    Cada lote se sube en un único POST multipart con todos sus archivos en el
+    campo files, que es lo que espera el servidor. Por eso los reintentos son
+    por lote y no por archivo: si el POST falla se reenvía el lote entero y
+    todos sus archivos comparten intentos, error y respuesta. Los lotes usan
+    una sesión HTTP compartida (conexiones reutilizadas), van como mucho
+    workers a la vez y se reintentan con espera exponencial. La bandeja vive
+    en SQLite, así que lo que quede sin enviar se reanuda con resume() tras un
+    reinicio.
+    """
+
+    def __init__(self, media_handler, db_path, url=UPLOAD_URL, token=UPLOAD_TOKEN,
+                 workers=4, max_attempts=5, backoff=1.0, timeout=(5, 60)):
+        self.media_handler = media_handler
+        self.url = url
+        self.token = token
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Authorization'] = f'Bearer {token}'
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload')
+
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def _update(self, batch, **fields):
+        """Actualiza los archivos del lote que siguen pendientes"""
+        fields['updated_at'] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE uploads SET {columns} WHERE batch = ? AND status IN (?, ?)",
+                             (*fields.values(), batch, PENDING, SENDING))
+            self._db.commit()
+            if fields.get('status') in (SENT, FAILED):
+                self._done.notify_all()
+
+    def enqueue(self, files):
+        """Añade [(ruta .enc, nombre para el servidor), ...] a la bandeja como un lote y devuelve su id"""
+        batch = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO uploads (batch, path, name, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(batch, path, name, PENDING, now, now) for path, name in files])
+            self._db.commit()
+        self._executor.submit(self._send, batch)
+        return batch
+
+    def resume(self):
+        """Reencola los lotes que quedaron sin enviar (por ejemplo, tras un reinicio)"""
+        with self._lock:
+            batches = [row['batch'] for row in self._db.execute(
+                "SELECT batch FROM uploads WHERE status IN (?, ?) GROUP BY batch ORDER BY MIN(id)",
+                (PENDING, SENDING))]
+        for batch in batches:
+            self._executor.submit(self._send, batch)
+        if batches:
+            print(f"📤 Reanudando {len(batches)} envíos pendientes", flush=True)
+        return len(batches)
+
+    def _send(self, batch):
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM uploads WHERE batch = ? AND status IN (?, ?) ORDER BY id",
+                                    (batch, PENDING, SENDING)).fetchall()
+        if not rows:
+            return
+        attempts = max(row['attempts'] for row in rows) + 1
+        self._update(batch, status=SENDING, attempts=attempts)
+        label = rows[0]['name'] if len(rows) == 1 else f"lote {batch} ({len(rows)} archivos)"
+
+        retry = True
+        try:
+            parts = []
+            for row in rows:
+                if not os.path.exists(row['path']):
+                    retry = False
+                    raise FileNotFoundError(f"No existe {row['path']}")
+                content_type = mimetypes.guess_type(row['name'])[0] or 'application/octet-stream'
+                # El tamaño sale de la cabecera; el contenido se descifra al enviar su parte
+                size = plaintext_size(row['path'])
+                if size is not None:
+                    open_reader = lambda path=row['path']: self.media_handler.open_encrypted(path)
+                else:
+                    # .enc antiguo (Fernet): no hay tamaño sin descifrarlo, así que se descifra
+                    # una sola vez aquí y ese mismo lector se envía
+                    reader = self.media_handler.open_encrypted(row['path'])
+                    size, open_reader = reader.size, lambda reader=reader: reader
+                parts.append(('files', row['name'], content_type, size, open_reader))
+            body = MultipartStream(parts)
+            response = self.session.post(self.url, data=body, timeout=self.timeout, headers={
+                'Content-Type': body.content_type,
+                'Content-Length': str(body.len),
+            })
+            if response.status_code < 400:
+                self._update(batch, status=SENT, last_error=None, response=response.text[:2000])
+                print(f"📤 {label} enviado", flush=True)
+                return
+            # 4xx (salvo 408/429) no se arregla reintentando
+            retry = response.status_code >= 500 or response.status_code in (408, 429)
+            raise requests.HTTPError(f"HTTP {response.status_code}: {response.text[:200]}")
+        except Exception as e:
+            error = str(e)
+
+        if not retry or attempts >= self.max_attempts:
+            self._update(batch, status=FAILED, last_error=error)
+            print(f"❌ No se pudo enviar {label}: {error}", flush=True)
+            return
+
+        # Espera exponencial con algo de azar para no reintentar todos a la vez
+        delay = min(self.backoff * 2 ** (attempts - 1), 60) * random.uniform(0.8, 1.2)
+        self._update(batch, status=PENDING, last_error=error)
+        print(f"⚠️ Reintentando {label} en {delay:.1f}s ({error})", flush=True)
+        timer = threading.Timer(delay, self._executor.submit, (self._send, batch))
+        timer.daemon = True
+        timer.start()
+
+    def batch_status(self, batch):
+        with self._lock:
+            rows = [dict(row) for row in self._db.execute(
+                "SELECT id, name, status, attempts, last_error, response FROM uploads WHERE batch = ? ORDER BY id",
+                (batch,))]
+        if not rows:
+            return None
+        counts = {status: 0 for status in (PENDING, SENDING, SENT, FAILED)}
+        for row in rows:
+            counts[row['status']] += 1
+            if row['response']:
+                try:
+                    row['response'] = json.loads(row['response'])
+                except ValueError:
+                    pass
+        return {
+            "batch": batch,
+            "total": len(rows),
+            "counts": counts,
+            "done": counts[PENDING] + counts[SENDING] == 0,
+            # Un solo POST por lote: todos los archivos comparten la respuesta del servidor
+            "response": rows[0]['response'],
+            "files": rows,
+        }
+
+    def wait(self, batch, timeout):
+        """Espera a que termine el lote; devuelve su estado (done=False si venció el tiempo)"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                remaining = self._db.execute(
+                    "SELECT COUNT(*) FROM uploads WHERE batch = ? AND status IN (?, ?)",
+                    (batch, PENDING, SENDING)).fetchone()[0]
+                left = deadline - time.monotonic()
+                if remaining == 0 or left <= 0:
+                    break
+                self._done.wait(left)
+        return self.batch_status(batch)
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+
+@pytest.fixture(scope='session')
+def gallery_module(tmp_path_factory):
+    """routes.gallery importado sobre una carpeta PROCEDURES temporal.
+
+    La galería crea su manejador y su catálogo al importarse, a partir del
+    directorio actual y de SECRET_KEY, así que ambos se preparan antes.
+    """
+    pytest.importorskip('vosk')
+    pytest.importorskip('pyaudio')
+    os.environ.setdefault('SECRET_KEY', Fernet.generate_key().decode())
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('gallery'))
+    try:
+        from routes import gallery
+    finally:
+        os.chdir(cwd)
+    os.makedirs(gallery.IMAGE_BASE_FOLDER, exist_ok=True)
+    return gallery
+
+
+@pytest.fixture
+def gallery_client(gallery_module):
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.register_blueprint(gallery_module.gallery, url_prefix='/gallery')
+    return app.test_client()
@@ -0,0 +1,78 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+from cryptography.fernet import Fernet
+
+from services.archive_export import iter_tar, iter_zip, session_entries, tar_size
+from services.crypto_container import ChunkedCipher, LegacyFernetReader, is_chunked_file
+
+
+class FakeMediaHandler:
+    def __init__(self):
+        key = Fernet.generate_key()
+        self.cipher = Fernet(key)
+        self.chunked_cipher = ChunkedCipher(key.decode(), chunk_size=1024)
+        self.opened = []
+
+    def open_encrypted(self, path):
+        self.opened.append(os.path.basename(path))
+        if is_chunked_file(path):
+            return self.chunked_cipher.open_reader(path)
+        return LegacyFernetReader(self.cipher, path)
+
+
+@pytest.fixture
+def session(tmp_path):
+    """Una sesión con un .enc por bloques, uno antiguo en Fernet y un archivo sin cifrar"""
+    handler = FakeMediaHandler()
+    contents = {
+        'video_1.mp4': os.urandom(5000),
+        'foto_1.jpg': os.urandom(777),
+        'notas.txt': b'sin cifrar\n',
+    }
+    with open(tmp_path / 'video_1.mp4.enc', 'wb') as f:
+        handler.chunked_cipher.encrypt_bytes(contents['video_1.mp4'], f)
+    (tmp_path / 'foto_1.jpg.enc').write_bytes(handler.cipher.encrypt(contents['foto_1.jpg']))
+    (tmp_path / 'notas.txt').write_bytes(contents['notas.txt'])
+    names = ['video_1.mp4.enc', 'foto_1.jpg.enc', 'notas.txt']
+    return handler, str(tmp_path), names, contents
+
+
+def test_session_entries_opens_nothing_up_front(session):
+    handler, folder, names, _ = session
+    session_entries(handler, folder, names)
+    assert handler.opened == []
+
+
+def test_zip_round_trip(session):
+    handler, folder, names, contents = session
+    data = b''.join(iter_zip(session_entries(handler, folder, names)))
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert {name: archive.read(name) for name in archive.namelist()} == contents
+        assert all(info.flag_bits & 0x08 for info in archive.infolist())  # descriptor de datos
+
+
+def test_tar_round_trip_with_legacy_file(session):
+    handler, folder, names, contents = session
+    entries = session_entries(handler, folder, names)
+    # El .enc en Fernet no da su tamaño sin descifrar
+    assert tar_size(entries) is None
+    data = b''.join(iter_tar(entries))
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert {member.name: archive.extractfile(member).read() for member in archive} == contents
+    assert handler.opened == ['video_1.mp4.enc', 'foto_1.jpg.enc']
+
+
+def test_tar_size_matches_without_legacy_files(session):
+    handler, folder, names, contents = session
+    entries = session_entries(handler, folder, [name for name in names if name != 'foto_1.jpg.enc'])
+    size = tar_size(entries)
+    assert handler.opened == []  # el tamaño sale de la cabecera, sin descifrar
+    data = b''.join(iter_tar(entries))
+    assert size == len(data)
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert archive.extractfile('video_1.mp4').read() == contents['video_1.mp4']
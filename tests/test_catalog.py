@@ -0,0 +1,136 @@
+import os
+
+import pytest
+
+from services.catalog import ProcedureCatalog, mark_dirty, media_kind, parse_session_folder
+
+FOLDERS = [
+    'ana_20260101-090000',
+    'ana_20260103-090000',
+    'luis_20260102-120000',
+    '20260104-080000',
+    'otra_carpeta',
+]
+
+
+@pytest.fixture
+def base(tmp_path):
+    for folder in FOLDERS:
+        os.makedirs(tmp_path / folder)
+    (tmp_path / 'ana_20260101-090000' / 'foto_1.jpg.enc').write_bytes(b'1' * 10)
+    (tmp_path / 'ana_20260101-090000' / 'video_1.mp4.enc').write_bytes(b'2' * 20)
+    (tmp_path / 'ana_20260101-090000' / 'notas.tmp').write_bytes(b'3')
+    return tmp_path
+
+
+@pytest.fixture
+def catalog(base):
+    # Intervalo largo: solo se reindexa con force=True o con mark_dirty()
+    catalog = ProcedureCatalog(str(base), min_refresh_interval=3600)
+    catalog.refresh(force=True)
+    return catalog
+
+
+def folders(rows):
+    return [row['folder'] for row in rows]
+
+
+def test_parse_session_folder():
+    assert parse_session_folder('ana_maria_20260101-093000') == ('ana_maria', '20260101', '2026-01-01T09:30:00')
+    assert parse_session_folder('20260101-093000') == (None, '20260101', '2026-01-01T09:30:00')
+    assert parse_session_folder('otra_carpeta') == (None, None, None)
+
+
+def test_media_kind():
+    assert media_kind('foto.jpg.enc') == 'image'
+    assert media_kind('video.mp4.enc') == 'video'
+    assert media_kind('reporte.pdf') == media_kind('reporte.pdf.enc') == 'pdf'
+    assert media_kind('foto.jpg') is None
+
+
+def test_sessions_newest_first(catalog):
+    rows, total = catalog.list_sessions()
+    assert total == len(FOLDERS)
+    # Las carpetas sin fecha van al final
+    assert folders(rows) == ['20260104-080000', 'ana_20260103-090000', 'luis_20260102-120000',
+                             'ana_20260101-090000', 'otra_carpeta']
+
+
+def test_pagination(catalog):
+    pages = [catalog.list_sessions(page=page, per_page=2) for page in (1, 2, 3)]
+    assert [folders(rows) for rows, _ in pages] == [
+        ['20260104-080000', 'ana_20260103-090000'],
+        ['luis_20260102-120000', 'ana_20260101-090000'],
+        ['otra_carpeta'],
+    ]
+    assert all(total == len(FOLDERS) for _, total in pages)
+    rows, total = catalog.list_sessions(page=4, per_page=2)
+    assert (rows, total) == ([], len(FOLDERS))
+    # page < 1 se trata como la primera
+    assert folders(catalog.list_sessions(page=0, per_page=1)[0]) == ['20260104-080000']
+
+
+def test_filters(catalog):
+    rows, total = catalog.list_sessions(usuario='ana')
+    assert (folders(rows), total) == (['ana_20260103-090000', 'ana_20260101-090000'], 2)
+    rows, total = catalog.list_sessions(desde='2026-01-02', hasta='20260103')
+    assert (folders(rows), total) == (['ana_20260103-090000', 'luis_20260102-120000'], 2)
+    rows, total = catalog.list_sessions(page=1, per_page=1, usuario='ana')
+    assert (folders(rows), total) == (['ana_20260103-090000'], 2)
+
+
+def test_list_media(catalog):
+    media = catalog.list_media('ana_20260101-090000')
+    assert [(m['name'], m['kind'], m['size']) for m in media] == [
+        ('foto_1.jpg.enc', 'image', 10), ('video_1.mp4.enc', 'video', 20)]
+    assert [m['name'] for m in catalog.list_media('ana_20260101-090000', kind='video')] == ['video_1.mp4.enc']
+
+
+def test_dirty_folder_is_reindexed(base, catalog):
+    folder = base / 'ana_20260101-090000'
+    mtime = os.stat(folder).st_mtime_ns
+    # Reescribir un archivo existente no cambia el mtime de la carpeta
+    (folder / 'foto_1.jpg.enc').write_bytes(b'1' * 99)
+    os.utime(folder, ns=(mtime, mtime))
+    assert catalog.list_media('ana_20260101-090000')[0]['size'] == 10
+
+    mark_dirty(str(folder))
+    assert catalog.list_media('ana_20260101-090000')[0]['size'] == 99
+
+
+def test_refresh_is_incremental(base, catalog):
+    assert catalog.refresh(force=True) == 0
+    (base / 'luis_20260102-120000' / 'foto_1.jpg.enc').write_bytes(b'x')
+    os.makedirs(base / 'eva_20260105-100000')
+    os.rmdir(base / 'otra_carpeta')
+    # Una carpeta modificada, una nueva y una borrada
+    assert catalog.refresh(force=True) == 3
+    rows, total = catalog.list_sessions()
+    assert total == len(FOLDERS)
+    assert folders(rows)[0] == 'eva_20260105-100000'
+    assert not catalog.session_exists('otra_carpeta')
+    assert [m['name'] for m in catalog.list_media('luis_20260102-120000')] == ['foto_1.jpg.enc']
+
+
+def test_throttled_refresh(base, catalog):
+    os.makedirs(base / 'eva_20260105-100000')
+    # Dentro del intervalo mínimo no se vuelve a recorrer el disco
+    assert catalog.refresh() == 0
+    assert not catalog.session_exists('eva_20260105-100000')
+    assert catalog.refresh(force=True) == 1
+
+
+def test_index_persists_between_instances(base, catalog):
+    reopened = ProcedureCatalog(str(base), min_refresh_interval=3600)
+    reopened._last_refresh = float('inf')  # no toca el disco: solo lo guardado
+    rows, total = reopened.list_sessions(page=1, per_page=2)
+    assert total == len(FOLDERS)
+    assert reopened.refresh(force=True) == 0
+
+
+def test_formatter_receives_date_without_user(base):
+    seen = []
+    catalog = ProcedureCatalog(str(base), formatter=lambda value: seen.append(value) or value)
+    catalog.refresh(force=True)
+    assert '20260101-090000' in seen
+    assert 'ana_20260101-090000' not in seen
@@ -0,0 +1,168 @@
+import io
+import os
+
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet
+
+from services.crypto_container import (HEADER, TAG_SIZE, ChunkedCipher, LegacyFernetReader,
+                                       is_chunked_file, plaintext_size)
+
+CHUNK = 16
+RECORD = CHUNK + TAG_SIZE
+
+
+@pytest.fixture
+def key():
+    return Fernet.generate_key().decode()
+
+
+@pytest.fixture
+def cipher(key):
+    return ChunkedCipher(key, chunk_size=CHUNK)
+
+
+def encrypt(cipher, tmp_path, data, name='archivo.enc'):
+    path = tmp_path / name
+    with open(path, 'wb') as f:
+        cipher.encrypt_bytes(data, f)
+    return str(path)
+
+
+def read_all(reader, start=0, end=None):
+    return b''.join(reader.iter_range(start, end))
+
+
+@pytest.mark.parametrize('size', [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK, 3 * CHUNK + 5])
+def test_round_trip(cipher, tmp_path, size):
+    data = os.urandom(size)
+    path = encrypt(cipher, tmp_path, data)
+    assert is_chunked_file(path)
+    reader = cipher.open_reader(path)
+    assert reader.size == size
+    assert plaintext_size(path) == size
+    assert read_all(reader) == data
+    assert os.path.getsize(path) == HEADER.size + max(1, -(-size // CHUNK)) * TAG_SIZE + size
+
+
+def test_streaming_writer_matches_encrypt_bytes(cipher, tmp_path):
+    data = os.urandom(5 * CHUNK + 3)
+    path = tmp_path / 'stream.enc'
+    with open(path, 'wb') as f:
+        assert cipher.encrypt_stream(io.BytesIO(data), f) == len(data)
+    assert read_all(cipher.open_reader(str(path))) == data
+
+
+def test_iter_range_boundaries(cipher, tmp_path):
+    data = bytes(range(256))[:3 * CHUNK + 5]
+    reader = cipher.open_reader(encrypt(cipher, tmp_path, data))
+    cases = [
+        (0, CHUNK),                 # exactamente el primer bloque
+        (CHUNK, 2 * CHUNK),         # empieza justo en un bloque
+        (CHUNK - 1, CHUNK + 1),     # cruza el límite entre bloques
+        (5, 3 * CHUNK + 2),         # varios bloques, hasta el último
+        (3 * CHUNK, len(data)),     # solo el bloque final (corto)
+        (len(data) - 1, len(data)),
+        (0, len(data) + 100),       # end se recorta al tamaño
+    ]
+    for start, end in cases:
+        assert read_all(reader, start, end) == data[start:end], (start, end)
+    assert read_all(reader, 10, 10) == b''
+    assert read_all(reader, len(data), None) == b''
+    assert reader.read_range(CHUNK - 2, 4) == data[CHUNK - 2:CHUNK + 2]
+
+
+def test_iter_range_only_decrypts_needed_chunks(cipher, tmp_path):
+    data = os.urandom(4 * CHUNK)
+    path = encrypt(cipher, tmp_path, data)
+    # Se corrompe el primer bloque: un rango que no lo toca sigue descifrándose
+    with open(path, 'r+b') as f:
+        f.seek(HEADER.size)
+        f.write(b'\0' * 4)
+    reader = cipher.open_reader(path)
+    assert read_all(reader, 2 * CHUNK, 3 * CHUNK) == data[2 * CHUNK:3 * CHUNK]
+    with pytest.raises(InvalidTag):
+        read_all(reader, 0, CHUNK)
+
+
+def test_tampered_ciphertext_is_rejected(cipher, tmp_path):
+    path = encrypt(cipher, tmp_path, os.urandom(3 * CHUNK))
+    with open(path, 'r+b') as f:
+        f.seek(HEADER.size + RECORD + 3)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 1]))
+    with pytest.raises(InvalidTag):
+        read_all(cipher.open_reader(path))
+
+
+def test_tampered_header_is_rejected(cipher, tmp_path):
+    path = encrypt(cipher, tmp_path, os.urandom(2 * CHUNK))
+    with open(path, 'r+b') as f:
+        f.seek(HEADER.size - 1)  # último byte del prefijo de nonce
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 1]))
+    with pytest.raises(InvalidTag):
+        read_all(cipher.open_reader(path))
+
+
+@pytest.mark.parametrize('cut', [RECORD, 5])
+def test_truncated_file_is_rejected(cipher, tmp_path, cut):
+    # Cortando un bloque entero el penúltimo pasa a ser el último y su marca de final no coincide
+    path = encrypt(cipher, tmp_path, os.urandom(3 * CHUNK))
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - cut)
+    with pytest.raises(InvalidTag):
+        read_all(cipher.open_reader(path))
+
+
+def test_truncated_header_is_rejected(cipher, tmp_path):
+    path = tmp_path / 'corto.enc'
+    path.write_bytes(b'ECAM\x01')
+    with pytest.raises(ValueError):
+        cipher.open_reader(str(path))
+
+
+def test_reordered_chunks_are_rejected(cipher, tmp_path):
+    path = encrypt(cipher, tmp_path, os.urandom(3 * CHUNK + 1))
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        records = [f.read(RECORD) for _ in range(3)]
+        rest = f.read()
+    with open(path, 'wb') as f:
+        f.write(header + records[1] + records[0] + records[2] + rest)
+    with pytest.raises(InvalidTag):
+        read_all(cipher.open_reader(path))
+
+
+def test_chunks_from_another_file_are_rejected(cipher, tmp_path):
+    first = encrypt(cipher, tmp_path, os.urandom(2 * CHUNK + 1), 'a.enc')
+    second = encrypt(cipher, tmp_path, os.urandom(2 * CHUNK + 1), 'b.enc')
+    with open(first, 'rb') as f:
+        foreign = f.read()[HEADER.size:HEADER.size + RECORD]
+    with open(second, 'r+b') as f:
+        f.seek(HEADER.size)
+        f.write(foreign)
+    with pytest.raises(InvalidTag):
+        read_all(cipher.open_reader(second))
+
+
+def test_wrong_key_is_rejected(cipher, tmp_path):
+    path = encrypt(cipher, tmp_path, b'datos')
+    other = ChunkedCipher(Fernet.generate_key().decode(), chunk_size=CHUNK)
+    with pytest.raises(InvalidTag):
+        read_all(other.open_reader(path))
+
+
+def test_legacy_fernet_reader(key, tmp_path):
+    data = os.urandom(100)
+    path = tmp_path / 'antiguo.enc'
+    path.write_bytes(Fernet(key.encode()).encrypt(data))
+    assert not is_chunked_file(str(path))
+    assert plaintext_size(str(path)) is None
+    reader = LegacyFernetReader(Fernet(key.encode()), str(path))
+    assert reader.size == len(data)
+    assert read_all(reader) == data
+    assert read_all(reader, 10, 20) == data[10:20]
+    assert reader.read_range(95, 50) == data[95:]
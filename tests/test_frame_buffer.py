@@ -0,0 +1,116 @@
+import threading
+
+import numpy as np
+
+from services.frame_buffer import FrameRingBuffer
+
+
+def make_frame(value, width=8, height=6):
+    return np.full((height, width, 3), value, np.uint8)
+
+
+def test_latest_returns_last_written_frame():
+    buffer = FrameRingBuffer(8, 6, capacity=4)
+    assert buffer.latest() is None
+    for value in range(1, 4):
+        buffer.write(make_frame(value))
+    slot = buffer.latest()
+    assert slot.seq == 3
+    assert (slot.frame == 3).all()
+
+
+def test_ring_overwrites_oldest_slot():
+    buffer = FrameRingBuffer(8, 6, capacity=4)
+    buffer.write(make_frame(1))
+    first = buffer.latest()
+    assert buffer.is_valid(first)
+
+    for value in range(2, 6):
+        buffer.write(make_frame(value))
+    # El slot del frame 1 ya contiene el frame 5
+    assert not buffer.is_valid(first)
+    assert buffer.pin(first.seq) is None
+    assert (first.frame == 5).all()
+
+
+def test_write_resizes_to_buffer_size():
+    buffer = FrameRingBuffer(8, 6, capacity=2)
+    buffer.write(make_frame(7, width=16, height=12))
+    slot = buffer.latest()
+    assert slot.frame.shape == (6, 8, 3)
+    assert (slot.frame == 7).all()
+
+
+def test_pinned_frame_survives_wraparound():
+    buffer = FrameRingBuffer(8, 6, capacity=4)
+    buffer.write(make_frame(1))
+    frame_ref = buffer.pin_latest()
+    pinned = frame_ref.frame
+
+    for value in range(2, 12):
+        buffer.write(make_frame(value))
+    # La captura usó otro buffer del pool en vez de pisar el fijado
+    assert frame_ref.seq == 1
+    assert (pinned == 1).all()
+    assert not pinned.flags.writeable
+    assert buffer.latest().seq == 11
+    assert buffer.pool.allocated == 5
+
+    frame_ref.release()
+    # El buffer sustituido vuelve al pool y se reutiliza en vez de reservar otro
+    frame_ref = buffer.pin_latest()
+    for value in range(12, 20):
+        buffer.write(make_frame(value))
+    frame_ref.release()
+    assert buffer.pool.allocated == 5
+
+
+def test_pin_is_reference_counted():
+    buffer = FrameRingBuffer(8, 6, capacity=2)
+    buffer.write(make_frame(1))
+    first = buffer.pin_latest()
+    second = buffer.pin_latest()
+    first.release()
+    first.release()  # liberar dos veces no descuenta otro pin
+    for value in range(2, 6):
+        buffer.write(make_frame(value))
+    assert (second.frame == 1).all()
+    second.release()
+
+
+def test_wait_next_skips_frames_about_to_be_overwritten():
+    buffer = FrameRingBuffer(8, 6, capacity=4)
+    for value in range(1, 11):
+        buffer.write(make_frame(value))
+    slot = buffer.wait_next(1, timeout=0)
+    # Con capacidad 4 y el escritor en el 10, el más antiguo seguro es el 8
+    assert slot.seq == 8
+    assert buffer.wait_next(slot.seq, timeout=0).seq == 9
+
+
+def test_wait_latest_wakes_on_write_and_close():
+    buffer = FrameRingBuffer(8, 6, capacity=2)
+    timer = threading.Timer(0.05, buffer.write, args=(make_frame(4),))
+    timer.start()
+    slot = buffer.wait_latest(0, timeout=2)
+    timer.join()
+    assert slot.seq == 1
+
+    threading.Timer(0.05, buffer.close).start()
+    assert buffer.wait_latest(slot.seq, timeout=2) is None
+
+
+def test_jpeg_frames_are_decoded_once_on_demand():
+    import cv2
+
+    buffer = FrameRingBuffer(8, 6, capacity=2)
+    ok, data = cv2.imencode('.jpg', make_frame(200))
+    buffer.write_jpeg(data.tobytes())
+    slot = buffer.latest(decode=False)
+    assert slot.jpeg is not None
+    assert buffer.decoded_frames == 0
+
+    buffer.latest()
+    with buffer.pin_latest() as frame_ref:
+        assert np.abs(frame_ref.frame.astype(int) - 200).max() <= 2
+    assert buffer.decoded_frames == 1
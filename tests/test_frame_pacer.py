@@ -0,0 +1,90 @@
+import pytest
+
+from services import frame_pacer
+from services.frame_pacer import CFR, VFR, FramePacer
+
+
+def push_all(pacer, timestamps):
+    return [pacer.push(timestamp) for timestamp in timestamps]
+
+
+def test_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        FramePacer(24, 'auto')
+
+
+def test_cfr_passes_frames_at_target_rate():
+    pacer = FramePacer(10, CFR)
+    results = push_all(pacer, [0.0, 0.1, 0.2, 0.3])
+    assert results == [(0, True)] * 4
+    assert (pacer.duplicated, pacer.dropped) == (0, 0)
+
+
+def test_cfr_duplicates_previous_frame_to_fill_gap():
+    pacer = FramePacer(10, CFR)
+    # Falta la captura de 0.1 y 0.2: el frame de 0.0 se repite dos veces
+    assert push_all(pacer, [0.0, 0.3]) == [(0, True), (2, True)]
+    stats = pacer.stats()
+    assert (stats["frames_in"], stats["frames_out"], stats["duplicated"]) == (2, 4, 2)
+
+
+def test_cfr_drops_frames_faster_than_target():
+    pacer = FramePacer(10, CFR)
+    # Captura a 25 fps hacia un video de 10 fps: sobran los que caen en un frame ya escrito
+    results = push_all(pacer, [0.0, 0.04, 0.08, 0.12, 0.16, 0.2])
+    assert [keep for _, keep in results] == [True, False, True, False, True, False]
+    assert pacer.stats()["frames_out"] == 3
+    assert pacer.dropped == 3
+
+
+def test_cfr_rounds_to_nearest_output_frame():
+    pacer = FramePacer(10, CFR)
+    # 0.14 s cae más cerca del frame 1 (0.1) que del 2: no hay duplicado
+    assert push_all(pacer, [0.0, 0.14, 0.24]) == [(0, True), (0, True), (0, True)]
+
+
+def test_cfr_with_origin_repeats_first_frame():
+    pacer = FramePacer(10, CFR, origin=100.0)
+    assert pacer.origin == 100.0
+    # El primer frame llega 0.3 s después del origen: cubre los frames 0, 1 y 2
+    assert pacer.push(100.3) == (3, True)
+    assert pacer.push(100.4) == (0, True)
+    assert pacer.stats()["frames_out"] == 5
+
+
+def test_origin_defaults_to_first_frame():
+    pacer = FramePacer(10, CFR)
+    assert pacer.origin is None
+    pacer.push(5.0)
+    assert pacer.origin == 5.0
+
+
+def test_vfr_keeps_every_frame():
+    pacer = FramePacer(10, VFR)
+    results = push_all(pacer, [0.0, 0.01, 0.5, 0.51])
+    assert results == [(0, True)] * 4
+    assert (pacer.duplicated, pacer.dropped) == (0, 0)
+
+
+def test_stats_measure_capture_rate_and_jitter():
+    pacer = FramePacer(10, CFR)
+    push_all(pacer, [0.0, 0.1, 0.2, 0.3, 0.4])
+    stats = pacer.stats()
+    assert stats["capture_fps"] == pytest.approx(10.0)
+    assert stats["mean_interval_ms"] == pytest.approx(100.0)
+    assert stats["jitter_ms"] == pytest.approx(0.0, abs=0.01)
+    assert stats["max_interval_ms"] == pytest.approx(100.0)
+
+
+def test_ffmpeg_args(monkeypatch):
+    assert FramePacer(24, CFR).ffmpeg_input_args('640x480') == [
+        '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', '640x480', '-r', '24']
+    assert FramePacer(24, CFR).ffmpeg_output_args() == []
+    # vfr: los timestamps de captura van en el Matroska, no en el reloj de ffmpeg
+    assert FramePacer(24, VFR).ffmpeg_input_args('640x480') == ['-f', 'matroska']
+
+    monkeypatch.setattr(frame_pacer, '_fps_mode_supported', True)
+    assert FramePacer(24, VFR).ffmpeg_output_args() == ['-fps_mode', 'vfr', '-enc_time_base:v', '1:1000']
+    # ffmpeg anterior a 5.1
+    monkeypatch.setattr(frame_pacer, '_fps_mode_supported', False)
+    assert FramePacer(24, VFR).ffmpeg_output_args() == ['-vsync', 'vfr', '-enc_time_base:v', '1:1000']
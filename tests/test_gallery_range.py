@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from services.media_cache import media_cache
+
+DATA = bytes(range(256)) * 1024  # 256 KB: varios bloques del contenedor
+
+
+@pytest.fixture
+def session(gallery_module):
+    """Sesión con una foto y un video cifrados con el formato por bloques"""
+    folder = 'rango_20260101-100000'
+    folder_path = os.path.join(gallery_module.IMAGE_BASE_FOLDER, folder)
+    os.makedirs(folder_path, exist_ok=True)
+    for name in ('foto_1.jpg', 'video_1.mp4'):
+        with open(os.path.join(folder_path, name + '.enc'), 'wb') as f:
+            gallery_module.media_handler.chunked_cipher.encrypt_bytes(DATA, f)
+    return folder
+
+
+@pytest.fixture(params=['cache', 'stream'])
+def url(request, session, monkeypatch):
+    """La foto sale de la caché en memoria; el video, descifrado por rangos"""
+    if request.param == 'stream':
+        monkeypatch.setattr(media_cache, 'max_item_bytes', 1024)
+        return f'/gallery/procedures/{session}/video_1.mp4'
+    return f'/gallery/procedures/{session}/foto_1.jpg'
+
+
+def test_full_content_without_range(gallery_client, url):
+    response = gallery_client.get(url)
+    assert response.status_code == 200
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Length'] == str(len(DATA))
+    assert 'Content-Range' not in response.headers
+    assert response.data == DATA
+
+
+@pytest.mark.parametrize('header, start, end', [
+    ('bytes=0-99', 0, 100),
+    ('bytes=65530-65545', 65530, 65546),    # cruza el límite entre bloques
+    ('bytes=100000-', 100000, len(DATA)),
+    ('bytes=-500', len(DATA) - 500, len(DATA)),
+    ('bytes=200000-999999', 200000, len(DATA)),  # el final se recorta al tamaño
+])
+def test_partial_content(gallery_client, url, header, start, end):
+    response = gallery_client.get(url, headers={'Range': header})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes {start}-{end - 1}/{len(DATA)}'
+    assert response.headers['Content-Length'] == str(end - start)
+    assert response.data == DATA[start:end]
+
+
+@pytest.mark.parametrize('header', [f'bytes={len(DATA)}-', f'bytes={len(DATA) + 10}-{len(DATA) + 20}'])
+def test_unsatisfiable_range(gallery_client, url, header):
+    response = gallery_client.get(url, headers={'Range': header})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(DATA)}'
+    assert response.data == b''
+
+
+def test_multiple_ranges_fall_back_to_full_content(gallery_client, url):
+    response = gallery_client.get(url, headers={'Range': 'bytes=0-9,20-29'})
+    assert response.status_code == 200
+    assert response.data == DATA
+
+
+def test_missing_file(gallery_client, session):
+    assert gallery_client.get(f'/gallery/procedures/{session}/foto_9.jpg').status_code == 404
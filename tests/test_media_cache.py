@@ -0,0 +1,160 @@
+import os
+
+import pytest
+
+from services.media_cache import DecryptedMediaCache, media_cache
+
+
+def make_files(tmp_path, *sizes):
+    paths = []
+    for index, size in enumerate(sizes):
+        path = tmp_path / f'archivo_{index}.enc'
+        path.write_bytes(b'x' * size)
+        paths.append(str(path))
+    return paths
+
+
+class Loader:
+    """Simula el descifrado: devuelve un buffer del tamaño del archivo y cuenta las llamadas"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        return bytearray(os.path.getsize(path))
+
+
+def test_hit_does_not_reload(tmp_path):
+    cache, loader = DecryptedMediaCache(max_bytes=1000), Loader()
+    path, = make_files(tmp_path, 100)
+    cache.acquire(path, loader).release()
+    cache.acquire(path, loader).release()
+    assert loader.calls == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["bytes"]) == (1, 1, 100)
+
+
+def test_lru_eviction_respects_byte_budget(tmp_path):
+    cache, loader = DecryptedMediaCache(max_bytes=250), Loader()
+    first, second, third = make_files(tmp_path, 100, 100, 100)
+    cache.acquire(first, loader).release()
+    cache.acquire(second, loader).release()
+    # Se usa el primero: el menos reciente pasa a ser el segundo
+    cache.acquire(first, loader).release()
+    cache.acquire(third, loader).release()
+
+    stats = cache.stats()
+    assert stats["bytes"] == 200
+    assert stats["evictions"] == 1
+    calls = loader.calls
+    cache.acquire(first, loader).release()
+    assert loader.calls == calls
+    cache.acquire(second, loader).release()
+    assert loader.calls == calls + 1
+
+
+def test_items_over_limit_are_not_cached(tmp_path):
+    cache, loader = DecryptedMediaCache(max_bytes=1000, max_item_bytes=50), Loader()
+    small, large = make_files(tmp_path, 50, 51)
+    assert cache.fits(small)
+    assert not cache.fits(large)
+    entry = cache.acquire(large, loader)
+    assert entry.size == 51
+    entry.release()
+    assert entry.data is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicted_entry_survives_until_released(tmp_path):
+    cache, loader = DecryptedMediaCache(max_bytes=150, zero_on_evict=True), Loader()
+    first, second = make_files(tmp_path, 100, 100)
+    entry = cache.acquire(first, lambda path: bytearray(b'\x07' * 100))
+    cache.acquire(second, loader).release()
+
+    # Expulsado, pero todavía se está sirviendo: los datos siguen intactos
+    assert entry.evicted
+    assert bytes(entry.data) == b'\x07' * 100
+    data = entry.data
+    entry.release()
+    assert entry.data is None
+    assert bytes(data) == b'\0' * 100
+
+
+def test_refcount_with_several_readers(tmp_path):
+    cache, loader = DecryptedMediaCache(max_bytes=1000), Loader()
+    path, = make_files(tmp_path, 10)
+    first = cache.acquire(path, loader)
+    second = cache.acquire(path, loader)
+    assert first is second
+    assert first.readers == 2
+    cache.invalidate(path)
+    first.release()
+    assert first.data is not None
+    second.release()
+    assert first.data is None
+
+
+def test_rewritten_file_is_a_new_entry(tmp_path):
+    cache, loader = DecryptedMediaCache(max_bytes=1000), Loader()
+    path, = make_files(tmp_path, 10)
+    old = cache.acquire(path, loader)
+    old.release()
+    with open(path, 'wb') as f:
+        f.write(b'y' * 20)
+    new = cache.acquire(path, loader)
+    new.release()
+    assert new.size == 20
+    assert old.data is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_iter_range_and_read_range(tmp_path):
+    cache = DecryptedMediaCache()
+    path, = make_files(tmp_path, 10)
+    entry = cache.acquire(path, lambda path: bytearray(b'0123456789'))
+    assert b''.join(entry.iter_range(2, 5)) == b'234'
+    assert b''.join(entry.iter_range(8, 100)) == b'89'
+    assert b''.join(entry.iter_range(10)) == b''
+    assert entry.read_range(7, 10) == b'789'
+    entry.release()
+
+
+@pytest.fixture
+def cached_photo(gallery_module):
+    folder = 'cache_20260101-100000'
+    folder_path = os.path.join(gallery_module.IMAGE_BASE_FOLDER, folder)
+    os.makedirs(folder_path, exist_ok=True)
+    path = os.path.join(folder_path, 'foto_1.jpg.enc')
+    with open(path, 'wb') as f:
+        gallery_module.media_handler.chunked_cipher.encrypt_bytes(b'0123456789', f)
+    yield f'/gallery/procedures/{folder}/foto_1.jpg', path
+    media_cache.invalidate(path)
+
+
+def readers(path):
+    key = next(key for key in media_cache._entries if key[0] == os.path.abspath(path))
+    return media_cache._entries[key].readers
+
+
+def test_gallery_releases_reader_after_sending(gallery_client, cached_photo):
+    url, path = cached_photo
+    response = gallery_client.get(url, headers={'Range': 'bytes=2-4'})
+    assert response.data == b'234'
+    response.close()
+    assert readers(path) == 0
+
+
+def test_gallery_releases_reader_on_416(gallery_client, cached_photo):
+    url, path = cached_photo
+    response = gallery_client.get(url, headers={'Range': 'bytes=50-60'})
+    assert response.status_code == 416
+    assert readers(path) == 0
+
+
+def test_gallery_releases_reader_on_head(gallery_client, cached_photo):
+    url, path = cached_photo
+    response = gallery_client.head(url)
+    assert response.status_code == 200
+    response.close()
+    assert readers(path) == 0
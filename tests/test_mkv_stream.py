@@ -0,0 +1,45 @@
+import io
+import re
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from services.mkv_stream import CLUSTER, MatroskaFrameWriter, _size
+
+
+def test_size_uses_shortest_vint():
+    assert _size(0) == b'\x80'
+    assert _size(126) == b'\xfe'
+    # 127 (todo unos) está reservado: pasa a dos bytes
+    assert _size(127) == b'\x40\x7f'
+    assert _size(9220) == b'\x64\x04'
+
+
+def test_new_cluster_when_block_offset_overflows():
+    out = io.BytesIO()
+    writer = MatroskaFrameWriter(out, 4, 4)
+    frame = np.zeros((4, 4, 3), np.uint8)
+    for timestamp in (0.0, 1.0, 32.0, 33.0):
+        writer.write(frame.data, timestamp)
+    assert out.getvalue().count(CLUSTER) == 2
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg no instalado")
+def test_ffmpeg_keeps_capture_timestamps(tmp_path):
+    output = str(tmp_path / 'video.mp4')
+    timestamps = [0.0, 0.04, 0.1, 0.5, 0.52, 1.3, 40.0, 40.05]
+    process = subprocess.Popen(['ffmpeg', '-y', '-f', 'matroska', '-i', '-', '-c:v', 'libx264',
+                                '-pix_fmt', 'yuv420p', '-fps_mode', 'vfr', '-enc_time_base:v', '1:1000',
+                                '-loglevel', 'error', output], stdin=subprocess.PIPE)
+    writer = MatroskaFrameWriter(process.stdin, 64, 48)
+    for i, timestamp in enumerate(timestamps):
+        writer.write(np.full((48, 64, 3), i * 20, np.uint8).data, timestamp)
+    process.stdin.close()
+    assert process.wait(timeout=30) == 0
+
+    result = subprocess.run(['ffmpeg', '-i', output, '-vf', 'showinfo', '-f', 'null', '-'],
+                            capture_output=True, text=True, timeout=30)
+    pts = [float(value) for value in re.findall(r'pts_time:([\d.]+)', result.stderr)]
+    assert pts == pytest.approx(timestamps)
@@ -0,0 +1,104 @@
+import threading
+
+import numpy as np
+import pytest
+
+from services.record_queue import BLOCK, DROP_NEWEST, DROP_OLDEST, RecordQueue
+
+
+def make_frame(value):
+    return np.full((4, 6, 3), value, np.uint8)
+
+
+def fill(queue, count):
+    for value in range(count):
+        queue.put(make_frame(value), float(value))
+
+
+def drain(queue):
+    timestamps = []
+    while queue.pending():
+        index, frame, timestamp = queue.get(timeout=0)
+        assert (frame == int(timestamp)).all()
+        timestamps.append(timestamp)
+        queue.release(index)
+    return timestamps
+
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        RecordQueue(6, 4, policy='random')
+
+
+def test_only_accepts_frames_while_active():
+    queue = RecordQueue(6, 4, capacity=2)
+    assert not queue.put(make_frame(1), 1.0)
+    queue.start()
+    assert queue.put(make_frame(1), 1.0)
+    queue.stop()
+    assert not queue.put(make_frame(2), 2.0)
+    # Lo pendiente se puede seguir leyendo tras stop()
+    assert drain(queue) == [1.0]
+    assert queue.get(timeout=0) is None
+
+
+def test_drop_oldest_keeps_most_recent_frames():
+    queue = RecordQueue(6, 4, capacity=3, policy=DROP_OLDEST)
+    queue.start()
+    fill(queue, 5)
+    stats = queue.stats()
+    assert (stats["accepted"], stats["dropped"], stats["high_water"]) == (5, 2, 3)
+    assert drain(queue) == [2.0, 3.0, 4.0]
+
+
+def test_drop_newest_keeps_queued_frames():
+    queue = RecordQueue(6, 4, capacity=3, policy=DROP_NEWEST)
+    queue.start()
+    fill(queue, 5)
+    stats = queue.stats()
+    assert (stats["accepted"], stats["dropped"]) == (3, 2)
+    assert drain(queue) == [0.0, 1.0, 2.0]
+
+
+def test_drop_oldest_drops_new_frame_when_all_buffers_are_held():
+    # Todos los buffers están en manos del grabador: no hay pendiente que descartar
+    queue = RecordQueue(6, 4, capacity=2, policy=DROP_OLDEST)
+    queue.start()
+    fill(queue, 2)
+    held = [queue.get(timeout=0)[0] for _ in range(2)]
+    assert not queue.put(make_frame(9), 9.0)
+    assert queue.dropped == 1
+    for index in held:
+        queue.release(index)
+
+
+def test_block_waits_for_a_free_buffer():
+    queue = RecordQueue(6, 4, capacity=1, policy=BLOCK, block_timeout=2)
+    queue.start()
+    queue.put(make_frame(0), 0.0)
+    index, _, _ = queue.get(timeout=0)
+    threading.Timer(0.05, queue.release, args=(index,)).start()
+    assert queue.put(make_frame(1), 1.0)
+    assert queue.dropped == 0
+    assert drain(queue) == [1.0]
+
+
+def test_block_drops_after_timeout():
+    queue = RecordQueue(6, 4, capacity=1, policy=BLOCK, block_timeout=0.05)
+    queue.start()
+    queue.put(make_frame(0), 0.0)
+    assert not queue.put(make_frame(1), 1.0)
+    assert queue.dropped == 1
+    assert drain(queue) == [0.0]
+
+
+def test_start_resets_buffers_and_counters():
+    queue = RecordQueue(6, 4, capacity=2, policy=DROP_OLDEST)
+    queue.start()
+    fill(queue, 4)
+    queue.stop()
+    queue.start()
+    assert queue.stats()["pending"] == 0
+    assert (queue.accepted, queue.dropped, queue.high_water) == (0, 0, 0)
+    fill(queue, 2)
+    assert drain(queue) == [0.0, 1.0]
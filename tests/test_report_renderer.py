@@ -0,0 +1,62 @@
+import os
+import signal
+import time
+
+import pytest
+from cryptography.fernet import Fernet
+
+pytest.importorskip('xhtml2pdf')
+
+from services.report_renderer import DONE, FAILED, ReportRenderer
+
+HTML = '<html><body><h1>Reporte {}</h1></body></html>'
+
+
+@pytest.fixture
+def renderer(tmp_path, monkeypatch):
+    # Los procesos trabajadores cifran el PDF con la clave del entorno
+    monkeypatch.setenv('SECRET_KEY', Fernet.generate_key().decode())
+    (tmp_path / 'sesion').mkdir()
+    renderer = ReportRenderer(str(tmp_path), workers=1)
+    yield renderer
+    if renderer._pool is not None:
+        renderer._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def test_renders_and_then_serves_from_cache(renderer):
+    job = renderer.submit(HTML.format(1), 'sesion')
+    assert renderer.wait(job['id'], 60)['status'] == DONE
+    again = renderer.submit(HTML.format(1), 'sesion')
+    assert (again['status'], again['cached']) == (DONE, True)
+
+
+def test_recovers_after_worker_is_killed(renderer):
+    job = renderer.submit(HTML.format(1), 'sesion')
+    assert renderer.wait(job['id'], 60)['status'] == DONE
+
+    broken = renderer._pool
+    for pid in list(broken._processes):
+        os.kill(pid, signal.SIGKILL)
+    deadline = time.monotonic() + 10
+    while not broken._broken and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert broken._broken
+
+    job = renderer.submit(HTML.format(2), 'sesion')
+    assert renderer.wait(job['id'], 60)['status'] == DONE
+    assert renderer._pool is not broken
+
+
+def test_submit_error_fails_job_and_frees_session(renderer, monkeypatch):
+    class RefusingPool:
+        def submit(self, *args):
+            raise RuntimeError("pool cerrado")
+
+    monkeypatch.setattr(renderer, '_pool', RefusingPool())
+    job = renderer.submit(HTML.format(1), 'sesion')
+    assert (job['status'], job['error']) == (FAILED, "pool cerrado")
+    assert renderer.stats()['running'] == 0
+
+    monkeypatch.setattr(renderer, '_pool', None)
+    job = renderer.submit(HTML.format(2), 'sesion')
+    assert renderer.wait(job['id'], 60)['status'] == DONE
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from services.catalog import mark_dirty
+from services.latest_capture import LatestCapture, latest_capture
+
+
+def new_session(gallery_module, folder, photos=()):
+    folder_path = os.path.join(gallery_module.IMAGE_BASE_FOLDER, folder)
+    os.makedirs(folder_path, exist_ok=True)
+    for name, data in photos:
+        with open(os.path.join(folder_path, name + '.enc'), 'wb') as f:
+            gallery_module.media_handler.chunked_cipher.encrypt_bytes(data, f)
+    mark_dirty(folder_path)
+    return folder
+
+
+@pytest.fixture(autouse=True)
+def no_capture():
+    latest_capture.clear()
+    yield
+    latest_capture.clear()
+
+
+def test_serves_capture_of_newest_session(gallery_module, gallery_client):
+    folder = new_session(gallery_module, 'ana_20300101-090000', [('foto_1.jpg', b'disco')])
+    latest_capture.publish(folder, 'foto_2.jpg', b'memoria')
+    response = gallery_client.get('/gallery/take-photo')
+    assert response.status_code == 200
+    assert response.data == b'memoria'
+    assert (response.headers['X-Folder-Name'], response.headers['X-File-Name']) == (folder, 'foto_2.jpg')
+
+
+def test_ignores_capture_from_previous_session(gallery_module, gallery_client):
+    previous = new_session(gallery_module, 'ana_20300102-090000', [('foto_1.jpg', b'anterior')])
+    latest_capture.publish(previous, 'foto_1.jpg', b'anterior')
+    # Empieza la sesión de otro paciente y aún no tiene fotos
+    new_session(gallery_module, 'ben_20300102-100000')
+    response = gallery_client.get('/gallery/take-photo')
+    assert response.status_code == 404
+
+
+def test_falls_back_to_newest_photo_on_disk(gallery_module, gallery_client):
+    folder = new_session(gallery_module, 'ana_20300103-090000', [('foto_1.jpg', b'uno'), ('foto_2.jpg', b'dos')])
+    response = gallery_client.get('/gallery/take-photo')
+    assert response.status_code == 200
+    assert response.data == b'dos'
+    assert (response.headers['X-Folder-Name'], response.headers['X-File-Name']) == (folder, 'foto_2.jpg')
+
+
+def test_clear_keeps_sequence():
+    captures = LatestCapture()
+    first = captures.publish('sesion', 'foto_1.jpg', b'x')
+    captures.clear()
+    assert captures.latest() is None
+    assert captures.publish('otra', 'foto_1.jpg', b'y').seq == first.seq + 1
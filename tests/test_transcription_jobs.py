@@ -0,0 +1,66 @@
+import os
+import signal
+import time
+import wave
+
+import pytest
+
+pytest.importorskip('vosk')
+
+from services.transcription_jobs import DONE, FAILED, TranscriptionJobs, transcript_path_for
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'vosk-model-small-es-0.42')
+
+
+def write_silence(path, seconds=1, rate=16000):
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(b'\x00\x00' * rate * seconds)
+    return path
+
+
+def wait_status(jobs, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job['status'] in (DONE, FAILED):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"el trabajo {job_id} sigue en {job['status']}")
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    jobs = TranscriptionJobs(str(tmp_path), MODEL_PATH, workers=1)
+    yield jobs
+    jobs.shutdown()
+
+
+def test_transcribes_and_writes_transcript(jobs, tmp_path):
+    audio = write_silence(str(tmp_path / 'audio_20240101-120000.wav'))
+    [job_id] = jobs.submit([audio])
+    job = wait_status(jobs, job_id)
+    assert job['status'] == DONE
+    assert os.path.exists(transcript_path_for(audio))
+    assert jobs.stats()['counts'][DONE] == 1
+
+
+def test_recovers_after_worker_is_killed(jobs, tmp_path):
+    first = write_silence(str(tmp_path / 'audio_20240101-120000.wav'))
+    [job_id] = jobs.submit([first])
+    assert wait_status(jobs, job_id)['status'] == DONE
+
+    broken = jobs._pool
+    for pid in list(broken._processes):
+        os.kill(pid, signal.SIGKILL)
+    deadline = time.monotonic() + 10
+    while not broken._broken and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert broken._broken
+
+    second = write_silence(str(tmp_path / 'audio_20240101-120500.wav'))
+    [job_id] = jobs.submit([second])
+    assert wait_status(jobs, job_id)['status'] == DONE
+    assert jobs._pool is not broken
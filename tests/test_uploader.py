@@ -0,0 +1,185 @@
+import threading
+
+import pytest
+from cryptography.fernet import Fernet
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from services.crypto_container import ChunkedCipher, LegacyFernetReader, is_chunked_file
+from services.uploader import FAILED, PENDING, SENT, MultipartStream, Uploader
+
+
+class FakeMediaHandler:
+    def __init__(self):
+        key = Fernet.generate_key()
+        self.cipher = Fernet(key)
+        self.chunked_cipher = ChunkedCipher(key.decode())
+
+    def open_encrypted(self, path):
+        if is_chunked_file(path):
+            return self.chunked_cipher.open_reader(path)
+        return LegacyFernetReader(self.cipher, path)
+
+
+class Receiver:
+    """Servidor de subida local: responde con los códigos de statuses y guarda cada POST"""
+
+    def __init__(self):
+        self.statuses = []
+        self.posts = []
+        app = Flask(__name__)
+
+        @app.route('/api/public-upload', methods=['POST'])
+        def upload():
+            files = [(f.filename, f.mimetype, f.read()) for f in request.files.getlist('files')]
+            self.posts.append({"auth": request.headers.get('Authorization'), "files": files})
+            status = self.statuses.pop(0) if self.statuses else 200
+            return jsonify({"received": [name for name, _, _ in files]}), status
+
+        self._server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.url = f'http://127.0.0.1:{self._server.server_port}/api/public-upload'
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+
+
+@pytest.fixture
+def receiver():
+    receiver = Receiver()
+    yield receiver
+    receiver.close()
+
+
+@pytest.fixture
+def media_handler():
+    return FakeMediaHandler()
+
+
+@pytest.fixture
+def photos(tmp_path, media_handler):
+    """Tres fotos cifradas: dos en el formato por bloques y una en Fernet antiguo"""
+    files = []
+    for index in range(3):
+        data = bytes([index]) * (70000 + index)
+        path = tmp_path / f'foto_{index}.jpg.enc'
+        if index == 2:
+            path.write_bytes(media_handler.cipher.encrypt(data))
+        else:
+            with open(path, 'wb') as f:
+                media_handler.chunked_cipher.encrypt_bytes(data, f)
+        files.append((str(path), f'foto_{index}.jpg', data))
+    return files
+
+
+def make_uploader(tmp_path, media_handler, receiver, **kwargs):
+    kwargs.setdefault('backoff', 0.01)
+    return Uploader(media_handler, str(tmp_path / 'outbox.sqlite3'), url=receiver.url, token='token', **kwargs)
+
+
+def test_multipart_stream_length_matches_body(photos, media_handler):
+    parts = [('files', name, 'image/jpeg', len(data), lambda path=path: media_handler.open_encrypted(path))
+             for path, name, data in photos]
+    body = MultipartStream(parts)
+    content = b''
+    while True:
+        chunk = body.read(8192)
+        if not chunk:
+            break
+        content += chunk
+    assert len(content) == body.len
+    assert content.endswith(f'--{body.boundary}--\r\n'.encode())
+
+
+def test_multipart_stream_escapes_filename():
+    class Reader:
+        size = 3
+
+        def iter_range(self):
+            yield b'abc'
+
+    body = MultipartStream([('files', 'a"b\r\nX-Evil: 1.jpg', 'image/jpeg', 3, Reader)])
+    content = body.read()
+    assert b'filename="a%22b%0D%0AX-Evil: 1.jpg"\r\n' in content
+    assert b'\r\nX-Evil' not in content
+    assert len(content) == body.len
+
+
+def test_batch_is_sent_in_one_post(tmp_path, media_handler, receiver, photos):
+    uploader = make_uploader(tmp_path, media_handler, receiver)
+    batch = uploader.enqueue([(path, name) for path, name, _ in photos])
+    status = uploader.wait(batch, 10)
+
+    assert status["done"]
+    assert status["counts"][SENT] == 3
+    assert len(receiver.posts) == 1
+    post = receiver.posts[0]
+    assert post["auth"] == 'Bearer token'
+    assert post["files"] == [(name, 'image/jpeg', data) for _, name, data in photos]
+    assert status["response"] == {"received": [name for _, name, _ in photos]}
+
+
+def test_server_errors_are_retried(tmp_path, media_handler, receiver, photos):
+    receiver.statuses = [500, 503]
+    uploader = make_uploader(tmp_path, media_handler, receiver)
+    batch = uploader.enqueue([(path, name) for path, name, _ in photos[:2]])
+    status = uploader.wait(batch, 10)
+
+    assert status["counts"][SENT] == 2
+    assert len(receiver.posts) == 3
+    assert {row["attempts"] for row in status["files"]} == {3}
+    assert all(row["last_error"] is None for row in status["files"])
+
+
+def test_client_errors_are_not_retried(tmp_path, media_handler, receiver, photos):
+    receiver.statuses = [400]
+    uploader = make_uploader(tmp_path, media_handler, receiver)
+    batch = uploader.enqueue([(photos[0][0], photos[0][1])])
+    status = uploader.wait(batch, 10)
+
+    assert status["counts"][FAILED] == 1
+    assert len(receiver.posts) == 1
+    assert 'HTTP 400' in status["files"][0]["last_error"]
+
+
+def test_gives_up_after_max_attempts(tmp_path, media_handler, receiver, photos):
+    receiver.statuses = [500] * 5
+    uploader = make_uploader(tmp_path, media_handler, receiver, max_attempts=3)
+    batch = uploader.enqueue([(photos[0][0], photos[0][1])])
+    status = uploader.wait(batch, 10)
+
+    assert status["counts"][FAILED] == 1
+    assert len(receiver.posts) == 3
+
+
+def test_missing_file_fails_the_batch_without_sending(tmp_path, media_handler, receiver, photos):
+    uploader = make_uploader(tmp_path, media_handler, receiver)
+    batch = uploader.enqueue([(photos[0][0], photos[0][1]), (str(tmp_path / 'borrada.jpg.enc'), 'borrada.jpg')])
+    status = uploader.wait(batch, 10)
+
+    assert status["counts"][FAILED] == 2
+    assert receiver.posts == []
+    assert status["files"][0]["attempts"] == 1
+
+
+def test_resume_sends_what_was_left_pending(tmp_path, media_handler, receiver, photos):
+    files = [(path, name) for path, name, _ in photos]
+    # Un servidor que no responde: el lote queda pendiente en la bandeja
+    stalled = Uploader(media_handler, str(tmp_path / 'outbox.sqlite3'), url='http://127.0.0.1:9/', token='token',
+                       max_attempts=100, backoff=60, timeout=(0.2, 0.2))
+    batch = stalled.enqueue(files)
+    status = stalled.wait(batch, 0.5)
+    assert not status["done"]
+    assert status["counts"][PENDING] + status["counts"]["sending"] == 3
+
+    # "Reinicio": otra instancia sobre la misma base de datos
+    uploader = make_uploader(tmp_path, media_handler, receiver)
+    assert uploader.resume() == 1
+    status = uploader.wait(batch, 10)
+    assert status["counts"][SENT] == 3
+    assert [name for name, _, _ in receiver.posts[0]["files"]] == [name for _, name in files]
+
+
+def test_unknown_batch(tmp_path, media_handler, receiver):
+    uploader = make_uploader(tmp_path, media_handler, receiver)
+    assert uploader.batch_status('no-existe') is None